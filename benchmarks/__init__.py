@@ -0,0 +1,73 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Offline microbenchmarks of hot paths. Run all of them and compare with stored baseline by "python -m benchmarks",
+# single suite by e.g. "python -m benchmarks.bench_fcu_state".
+
+from __future__ import annotations
+
+import asyncio
+import time
+import timeit
+import typing as t
+from dataclasses import dataclass
+
+
+@dataclass
+class Benchmark:
+    name: str
+    func: t.Callable[[], t.Any]
+    # Coroutine functions are awaited one after another in single event loop run
+    is_async: bool = False
+    # Number of calls per measurement, by default picked so that single measurement takes at least MIN_TIME_S
+    number: t.Optional[int] = None
+
+
+MIN_TIME_S = 0.1
+
+
+def measure(benchmark: Benchmark, repeat: int = 7) -> float:
+    # Best time of single call in us
+    loop = asyncio.new_event_loop()
+
+    def timer(number: int) -> float:
+        if not benchmark.is_async:
+            return timeit.timeit(benchmark.func, number=number)
+
+        func = t.cast(t.Callable[[], t.Awaitable[t.Any]], benchmark.func)
+
+        async def run() -> float:
+            start = time.perf_counter()
+            for _ in range(number):
+                await func()
+            return time.perf_counter() - start
+
+        return loop.run_until_complete(run())
+
+    try:
+        number = benchmark.number or 1
+
+        while not benchmark.number and timer(number) < MIN_TIME_S:
+            number *= 2
+
+        best = min(timer(number) for _ in range(repeat))
+    finally:
+        loop.close()
+
+    return best / number * 1e6
+
+
+def run_suite(benchmarks: t.Iterable[Benchmark]) -> None:
+    for benchmark in benchmarks:
+        print(f"{benchmark.name:<50} {measure(benchmark):8.3f} us")
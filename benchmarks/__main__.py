@@ -0,0 +1,96 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import json
+import os
+import platform
+import sys
+import typing as t
+
+from benchmarks import Benchmark, bench_callback, bench_device, bench_features, bench_fcu_state, measure
+
+SUITES = (bench_fcu_state, bench_features, bench_device, bench_callback)
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Plain interpreter work measured with every run. Results are compared relative to it,
+# so baseline still applies when whole machine is faster or slower than when it was recorded.
+REFERENCE = Benchmark("reference", lambda: sorted(str(i) for i in range(32)))
+
+
+def load_baseline(path: str) -> t.Dict[str, float]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return t.cast(t.Dict[str, float], json.load(f)["results"])
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path: str, results: t.Dict[str, float]) -> None:
+    data = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {name: round(result, 4) for name, result in results.items()},
+    }
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+        f.write("\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run toshiba_ac microbenchmarks and compare them with baseline")
+    parser.add_argument("-k", "--filter", default="", help="run only benchmarks with this text in the name")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline results file")
+    parser.add_argument("--save", action="store_true", help="store results as new baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.3, help="allowed slowdown against baseline, 0.3 means 30%%"
+    )
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    results: t.Dict[str, float] = {REFERENCE.name: measure(REFERENCE)}
+    regressions = []
+    speed = results[REFERENCE.name] / baseline[REFERENCE.name] if REFERENCE.name in baseline else 1.0
+
+    print(f"{REFERENCE.name:<50} {results[REFERENCE.name]:8.3f} us {speed:6.2f}x")
+
+    benchmarks: t.List[Benchmark] = [
+        benchmark for suite in SUITES for benchmark in suite.benchmarks() if args.filter in benchmark.name
+    ]
+
+    for benchmark in benchmarks:
+        result = measure(benchmark)
+        results[benchmark.name] = result
+        line = f"{benchmark.name:<50} {result:8.3f} us"
+
+        if benchmark.name in baseline:
+            ratio = result / baseline[benchmark.name] / speed
+            line += f" {ratio:6.2f}x"
+
+            if ratio > 1 + args.tolerance:
+                line += " REGRESSION"
+                regressions.append(benchmark.name)
+
+        print(line)
+
+    if args.save:
+        save_baseline(args.baseline, {**baseline, **results} if args.filter else results)
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} benchmarks slower than baseline by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import asyncio
+import collections
+import time
+import typing as t
+
+from toshiba_ac.device import ToshibaAcDevice
+from toshiba_ac.device_manager import ToshibaAcDeviceManager
+from toshiba_ac.testing.fake_cloud import ToshibaAcFakeCloud
+from toshiba_ac.testing.loopback_transport import ToshibaAcLoopbackAmqpTransport, create_fcu_from_ac
+from toshiba_ac.utils.http_api import ToshibaAcHttpApi
+from toshiba_ac.utils.rate_limiter import ToshibaAcRateLimiter
+
+# End-to-end receive path of device manager: CMD_FCU_FROM_AC method requests are injected through loopback
+# transport and latency is measured until device state changed callback is called. HTTP part is served by
+# local fake cloud. Run "python -m benchmarks.bench_amqp_loopback --help" for load options.
+
+HEX_STATES = ("3042164131640010160effffffff10ffffffff", "3141184131640010140effffffff10ffffffff")
+
+
+def percentile(sorted_values: t.Sequence[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    cloud = ToshibaAcFakeCloud(latency_s=0)
+    cloud.add_account("user", "password", ac_count=args.acs)
+    transports: t.List[ToshibaAcLoopbackAmqpTransport] = []
+
+    def create_transport(sas_token: str) -> ToshibaAcLoopbackAmqpTransport:
+        transports.append(ToshibaAcLoopbackAmqpTransport(sas_token))
+        return transports[-1]
+
+    async with cloud:
+        # Fake cloud does not need pacing, startup of many ACs would take minutes with library defaults
+        rate_limiter = ToshibaAcRateLimiter(rate=1000, max_concurrency=ToshibaAcHttpApi.REQUEST_MAX_CONCURRENCY)
+        manager = ToshibaAcDeviceManager(
+            "user",
+            "password",
+            rate_limiter=rate_limiter,
+            http_base_url=cloud.base_url,
+            amqp_transport_factory=create_transport,
+        )
+
+        try:
+            await manager.connect()
+            devices = await manager.get_devices()
+            transport = transports[-1]
+            # Additional info carries AC state as well, it must not race with injected messages
+            await asyncio.gather(*(t.cast(t.Any, device.load_additional_device_info_task) for device in devices))
+
+            # Every AC gets the same state first, from now on every message toggles the state and fires callback
+            await transport.inject_method_requests(
+                create_fcu_from_ac(device.ac_unique_id, HEX_STATES[0]) for device in devices
+            )
+            await asyncio.sleep(0.1)
+
+            window = asyncio.Semaphore(args.window)
+            sent_at: t.Dict[ToshibaAcDevice, t.Deque[float]] = {device: collections.deque() for device in devices}
+            latencies: t.List[float] = []
+            done = asyncio.Event()
+
+            def on_state_changed(device: ToshibaAcDevice) -> None:
+                latencies.append(time.perf_counter() - sent_at[device].popleft())
+                window.release()
+
+                if len(latencies) == args.messages:
+                    done.set()
+
+            for device in devices:
+                device.on_state_changed_callback.add(on_state_changed)
+
+            # Requests are built upfront so that only the receive path is measured
+            requests = [
+                create_fcu_from_ac(devices[i % len(devices)].ac_unique_id, HEX_STATES[(i // len(devices) + 1) % 2])
+                for i in range(args.messages)
+            ]
+
+            start = time.perf_counter()
+
+            for i, request in enumerate(requests):
+                await window.acquire()
+                sent_at[devices[i % len(devices)]].append(time.perf_counter())
+                await transport.inject_method_request(request)
+
+            await done.wait()
+            elapsed = time.perf_counter() - start
+        finally:
+            await manager.shutdown()
+
+    latencies.sort()
+
+    print(f"ACs:               {len(devices)}")
+    print(f"Messages:          {args.messages} (window {args.window})")
+    print(f"Throughput:        {args.messages / elapsed:.0f} messages/s")
+    print(
+        "Latency:           "
+        + ", ".join(f"p{int(p * 100)} {percentile(latencies, p) * 1e6:.0f} us" for p in (0.5, 0.9, 0.99))
+        + f", max {latencies[-1] * 1e6:.0f} us"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure message to callback latency over loopback AMQP transport")
+    parser.add_argument("--acs", type=int, default=100, help="number of ACs on the account")
+    parser.add_argument("--messages", type=int, default=50000, help="number of injected CMD_FCU_FROM_AC messages")
+    parser.add_argument("--window", type=int, default=100, help="max number of messages waiting for callback")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
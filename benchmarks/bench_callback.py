@@ -0,0 +1,48 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import typing as t
+
+from benchmarks import Benchmark, run_suite
+from toshiba_ac.utils import ToshibaAcCallback
+
+
+def callback_with(count: int, is_async: bool) -> ToshibaAcCallback[int]:
+    callback: ToshibaAcCallback[int] = ToshibaAcCallback()
+
+    # Each callback has to be distinct function, same one is registered only once
+    for _ in range(count):
+
+        def sync_callback(value: int) -> None:
+            pass
+
+        async def async_callback(value: int) -> None:
+            pass
+
+        callback.add(async_callback if is_async else sync_callback)
+
+    return callback
+
+
+def benchmarks() -> t.Iterator[Benchmark]:
+    for count in (0, 1, 10):
+        yield Benchmark(f"callback: {count} sync", functools.partial(callback_with(count, False), 1), is_async=True)
+
+    for count in (1, 10):
+        yield Benchmark(f"callback: {count} async", functools.partial(callback_with(count, True), 1), is_async=True)
+
+
+if __name__ == "__main__":
+    run_suite(benchmarks())
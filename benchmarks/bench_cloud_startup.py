@@ -0,0 +1,84 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import asyncio
+import time
+
+from toshiba_ac.testing.fake_cloud import ToshibaAcFakeCloud
+from toshiba_ac.utils.http_api import ToshibaAcHttpApi
+from toshiba_ac.utils.rate_limiter import ToshibaAcRateLimiter
+
+# HTTP part of device manager startup against local fake cloud: login, client registration, AC mapping
+# and additional info of every AC. Run "python -m benchmarks.bench_cloud_startup --help" for load options.
+
+
+async def run(args: argparse.Namespace) -> None:
+    cloud = ToshibaAcFakeCloud(
+        latency_s=args.latency,
+        latency_jitter_s=args.latency_jitter,
+        unauthorized_rate=args.unauthorized_rate,
+        rate_limited_rate=args.rate_limited_rate,
+        max_requests_per_second=args.max_requests_per_second,
+        seed=0,
+    )
+    cloud.add_account("user", "password", ac_count=args.acs)
+
+    async with cloud:
+        rate_limiter = None
+
+        if args.rate:
+            rate_limiter = ToshibaAcRateLimiter(
+                rate=args.rate,
+                max_concurrency=ToshibaAcHttpApi.REQUEST_MAX_CONCURRENCY,
+                min_rate=ToshibaAcHttpApi.REQUEST_MIN_RATE,
+            )
+
+        api = ToshibaAcHttpApi("user", "password", rate_limiter=rate_limiter, base_url=cloud.base_url)
+
+        try:
+            start = time.perf_counter()
+            await api.connect()
+            await api.register_client("benchmark")
+            devices = await api.get_devices()
+            mapping_done = time.perf_counter()
+            await asyncio.gather(*(api.get_device_additional_info(device.ac_id) for device in devices))
+            done = time.perf_counter()
+        finally:
+            await api.shutdown()
+
+    print(f"ACs:                    {len(devices)}")
+    print(f"Devices known after:    {mapping_done - start:.3f} s")
+    print(f"Additional info after:  {done - start:.3f} s")
+    print(f"Rate limiter:           {api.rate_limiter.stats}")
+    print(f"Max requests in flight: {cloud.stats.max_in_flight}")
+
+    for (path, status), count in sorted(cloud.stats.responses.items()):
+        print(f"  {path:<45} {status} x{count}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure HTTP startup against local fake Toshiba cloud")
+    parser.add_argument("--acs", type=int, default=100, help="number of ACs on the account")
+    parser.add_argument("--rate", type=float, default=None, help="client request rate, library default if not set")
+    parser.add_argument("--latency", type=float, default=0.05, help="server response delay in seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.02)
+    parser.add_argument("--unauthorized-rate", type=float, default=0.0, help="probability of 401 response")
+    parser.add_argument("--rate-limited-rate", type=float, default=0.0, help="probability of 403 response")
+    parser.add_argument("--max-requests-per-second", type=float, default=None, help="server side 403 threshold")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import typing as t
+
+from benchmarks import Benchmark, run_suite
+from toshiba_ac.device import ToshibaAcDevice
+from toshiba_ac.device.fcu_state import ToshibaAcFcuState
+from toshiba_ac.device.heartbeat import ToshibaAcHeartbeat
+from toshiba_ac.device.properties import ToshibaAcFanMode, ToshibaAcMeritA, ToshibaAcMode, ToshibaAcStatus
+
+HEX_STATE = "3042164131640010160effffffff10ffffffff"
+OTHER_HEX_STATE = "3141184131640010140effffffff10ffffffff"
+# Heartbeat carries hex encoded single byte values, temperatures are signed
+HEARTBEAT = {
+    "iTemp": "14",
+    "oTemp": "0a",
+    "fcuTcTemp": "1c",
+    "fcuTcjTemp": "1b",
+    "fcuFanRpm": "00",
+    "cduTdTemp": "fe",
+    "cduTsTemp": "08",
+    "cduTeTemp": "07",
+    "cduCompHz": "00",
+    "cduFanRpm": "00",
+    "cduPmvPulse": "00",
+    "cduIac": "00",
+}
+OTHER_HEARTBEAT = {**HEARTBEAT, "iTemp": "15"}
+
+
+class FakeAmqpApi:
+    async def send_message(self, message: str) -> None:
+        pass
+
+
+def create_device() -> ToshibaAcDevice:
+    return ToshibaAcDevice(
+        "Benchmark",
+        "device_id",
+        "ac_id",
+        "ac_unique_id",
+        HEX_STATE,
+        "fw",
+        "a0ff",
+        "3",
+        t.cast(t.Any, FakeAmqpApi()),
+        t.cast(t.Any, None),
+    )
+
+
+def benchmarks() -> t.Iterator[Benchmark]:
+    device = create_device()
+
+    async def send_state_to_ac() -> None:
+        state = ToshibaAcFcuState()
+        state.ac_status = ToshibaAcStatus.ON
+        state.ac_mode = ToshibaAcMode.HEAT
+        state.ac_temperature = 22
+        state.ac_fan_mode = ToshibaAcFanMode.AUTO
+        state.ac_merit_a = ToshibaAcMeritA.OFF
+        await device.send_state_to_ac(state)
+
+    yield Benchmark("device: send_state_to_ac", send_state_to_ac, is_async=True)
+
+    payloads = [{"data": HEX_STATE}, {"data": OTHER_HEX_STATE}]
+
+    async def handle_cmd_fcu_from_ac() -> None:
+        payloads.reverse()
+        await device.handle_cmd_fcu_from_ac(t.cast(t.Any, payloads[0]))
+
+    yield Benchmark("device: handle_cmd_fcu_from_ac with change", handle_cmd_fcu_from_ac, is_async=True)
+
+    yield Benchmark(
+        "device: handle_cmd_heartbeat without change",
+        lambda: device.handle_cmd_heartbeat(HEARTBEAT),
+        is_async=True,
+    )
+
+    heartbeats = [HEARTBEAT, OTHER_HEARTBEAT]
+
+    async def handle_cmd_heartbeat() -> None:
+        heartbeats.reverse()
+        await device.handle_cmd_heartbeat(heartbeats[0])
+
+    yield Benchmark("device: handle_cmd_heartbeat with change", handle_cmd_heartbeat, is_async=True)
+
+    yield Benchmark("heartbeat: decode temperatures", lambda: ToshibaAcHeartbeat(HEARTBEAT))
+    yield Benchmark("heartbeat: decode all fields", lambda: ToshibaAcHeartbeat(HEARTBEAT).as_dict())
+
+
+if __name__ == "__main__":
+    run_suite(benchmarks())
@@ -0,0 +1,69 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import typing as t
+
+from benchmarks import Benchmark, run_suite
+from toshiba_ac.device.fcu_state import ToshibaAcFcuState
+from toshiba_ac.device.properties import ToshibaAcFanMode, ToshibaAcMode
+
+HEX_STATE = "3042164131640010160effffffff10ffffffff"
+OTHER_HEX_STATE = "3141184131640010140effffffff10ffffffff"
+PROPERTIES = (
+    "ac_status",
+    "ac_mode",
+    "ac_temperature",
+    "ac_fan_mode",
+    "ac_swing_mode",
+    "ac_power_selection",
+    "ac_merit_b",
+    "ac_merit_a",
+    "ac_air_pure_ion",
+    "ac_indoor_temperature",
+    "ac_outdoor_temperature",
+    "ac_self_cleaning",
+)
+
+
+def benchmarks() -> t.Iterator[Benchmark]:
+    state = ToshibaAcFcuState.from_hex_state(HEX_STATE)
+
+    for prop in PROPERTIES:
+        yield Benchmark(f"fcu_state: get {prop}", functools.partial(getattr, state, prop))
+
+    def set_all() -> None:
+        state.ac_mode = ToshibaAcMode.HEAT
+        state.ac_temperature = 21
+        state.ac_fan_mode = ToshibaAcFanMode.AUTO
+
+    yield Benchmark("fcu_state: set mode, temperature and fan mode", set_all)
+    yield Benchmark("fcu_state: str", lambda: str(state))
+    yield Benchmark("fcu_state: decode", lambda: ToshibaAcFcuState.from_hex_state(HEX_STATE))
+    yield Benchmark("fcu_state: encode", state.encode)
+    yield Benchmark("fcu_state: update without change", lambda: state.update(HEX_STATE))
+
+    changing_state = ToshibaAcFcuState.from_hex_state(HEX_STATE)
+    states = [HEX_STATE, OTHER_HEX_STATE]
+
+    def update_with_change() -> None:
+        states.reverse()
+        changing_state.update(states[0])
+
+    yield Benchmark("fcu_state: update with change", update_with_change)
+    yield Benchmark("fcu_state: update from heartbeat", lambda: state.update_from_hbt({"iTemp": 21, "oTemp": 10}))
+
+
+if __name__ == "__main__":
+    run_suite(benchmarks())
@@ -0,0 +1,50 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import typing as t
+
+from benchmarks import Benchmark, run_suite
+from toshiba_ac.device.features import ToshibaAcFeatures
+from toshiba_ac.device.properties import ToshibaAcMeritA, ToshibaAcMode
+
+# Merit feature strings and model ids as reported by AC mapping
+MERIT_FEATURES = (("0b71", "3"), ("a0ff", "3"), ("0000", "2"), ("00", "1"))
+
+
+def benchmarks() -> t.Iterator[Benchmark]:
+    for merit_feature, ac_model_id in MERIT_FEATURES:
+        yield Benchmark(
+            f"features: from merit {merit_feature!r} model {ac_model_id!r}",
+            functools.partial(ToshibaAcFeatures.from_merit_string_and_model, merit_feature, ac_model_id),
+        )
+
+    # Parsing done once per distinct merit feature and model, results above come from the interned instances
+    for merit_feature, ac_model_id in MERIT_FEATURES:
+        yield Benchmark(
+            f"features: parse merit {merit_feature!r} model {ac_model_id!r}",
+            functools.partial(ToshibaAcFeatures._parse_merit_string_and_model, merit_feature, ac_model_id),
+        )
+
+    features = ToshibaAcFeatures.from_merit_string_and_model("a0ff", "3")
+
+    for ac_mode in (ToshibaAcMode.HEAT, ToshibaAcMode.DRY):
+        yield Benchmark(f"features: for {ac_mode.name} mode", functools.partial(features.for_ac_mode, ac_mode))
+
+    yield Benchmark("features: contains", lambda: ToshibaAcMeritA.ECO in features.ac_merit_a)
+    yield Benchmark("features: as list", features.ac_swing_mode.as_list)
+
+
+if __name__ == "__main__":
+    run_suite(benchmarks())
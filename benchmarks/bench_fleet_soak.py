@@ -0,0 +1,160 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import collections
+import asyncio
+import random
+import time
+import typing as t
+
+from toshiba_ac.device import ToshibaAcDevice
+from toshiba_ac.device.fcu_state import ToshibaAcFcuState
+from toshiba_ac.device_manager import ToshibaAcDeviceManager
+from toshiba_ac.testing.fake_cloud import ToshibaAcFakeCloud
+from toshiba_ac.testing.fleet_simulator import ToshibaAcFleetSimulator
+from toshiba_ac.utils.http_api import ToshibaAcHttpApi
+from toshiba_ac.utils.rate_limiter import ToshibaAcRateLimiter
+
+# Soak test of a single device manager against simulated fleet: ACs report state and heartbeats on their own,
+# and random setpoint changes are sent at --command-rate. Throughput and message to callback latency are
+# reported every --report-interval. Run "python -m benchmarks.bench_fleet_soak --help" for load options.
+
+
+def format_latency(latency: t.Optional[float]) -> str:
+    return "-" if latency is None else f"{latency * 1000:.2f} ms"
+
+
+class CommandStats:
+    def __init__(self) -> None:
+        self.round_trips_s: t.Deque[float] = collections.deque(maxlen=100000)
+        self.timeouts = 0
+
+    def on_confirmed(self, confirmed: asyncio.Future[float]) -> None:
+        if confirmed.cancelled():
+            return
+
+        if confirmed.exception():
+            self.timeouts += 1
+        else:
+            self.round_trips_s.append(confirmed.result())
+
+    def percentile(self, p: float) -> t.Optional[float]:
+        if not self.round_trips_s:
+            return None
+
+        round_trips = sorted(self.round_trips_s)
+        return round_trips[min(len(round_trips) - 1, int(p * len(round_trips)))]
+
+
+async def send_commands(devices: t.List[ToshibaAcDevice], rate: float, seed: int, stats: CommandStats) -> None:
+    rng = random.Random(seed)
+
+    while True:
+        await asyncio.sleep(rng.expovariate(rate))
+        device = rng.choice(devices)
+        state = ToshibaAcFcuState()
+        state.ac_temperature = rng.randint(18, 28)
+
+        try:
+            command = await device.send_state_to_ac(state)
+        except Exception as e:
+            print(f"Command to {device.name} failed: {e}")
+        else:
+            command.confirmed.add_done_callback(stats.on_confirmed)
+
+
+async def run(args: argparse.Namespace) -> None:
+    cloud = ToshibaAcFakeCloud(seed=0)
+    account = cloud.add_account("user", "password", ac_count=args.acs, group_size=50)
+    simulator = ToshibaAcFleetSimulator(
+        account,
+        state_interval_s=args.state_interval,
+        heartbeat_interval_s=args.heartbeat_interval,
+        response_delay_s=args.response_delay,
+        time_scale=args.time_scale,
+        seed=0,
+    )
+
+    async with cloud:
+        # Fake cloud does not need pacing, startup of many ACs would take minutes with library defaults
+        rate_limiter = ToshibaAcRateLimiter(rate=1000, max_concurrency=ToshibaAcHttpApi.REQUEST_MAX_CONCURRENCY)
+        manager = ToshibaAcDeviceManager(
+            "user",
+            "password",
+            rate_limiter=rate_limiter,
+            http_base_url=cloud.base_url,
+            amqp_transport_factory=simulator.create_transport,
+        )
+        commands: t.Optional[asyncio.Task[None]] = None
+        command_stats = CommandStats()
+
+        try:
+            start = time.perf_counter()
+            await manager.connect()
+            devices = await manager.get_devices()
+            await asyncio.gather(*(t.cast(t.Any, device.load_additional_device_info_task) for device in devices))
+            print(f"{len(devices)} ACs ready after {time.perf_counter() - start:.1f} s")
+
+            simulator.watch(devices)
+            simulator.start()
+
+            if args.command_rate:
+                commands = asyncio.create_task(send_commands(devices, args.command_rate, seed=0, stats=command_stats))
+
+            start = time.perf_counter()
+            injected = 0
+
+            while time.perf_counter() - start < args.duration:
+                await asyncio.sleep(args.report_interval)
+                total = sum(simulator.stats.injected.values())
+                stats = simulator.stats
+                print(
+                    f"t={time.perf_counter() - start:6.1f} s"
+                    f"  {(total - injected) / args.report_interval:8.0f} messages/s"
+                    f"  commands {stats.commands_received}"
+                    f" (round trip p50 {format_latency(command_stats.percentile(0.5))}"
+                    f", timeouts {command_stats.timeouts})"
+                    f"  latency p50 {format_latency(stats.latency_percentile(0.5))}"
+                    f"  p99 {format_latency(stats.latency_percentile(0.99))}"
+                    f"  max lag {stats.max_schedule_lag_s * 1000:.1f} ms"
+                )
+                injected = total
+        finally:
+            if commands:
+                commands.cancel()
+                await asyncio.gather(commands, return_exceptions=True)
+
+            await simulator.stop()
+            await manager.shutdown()
+
+    for command, count in sorted(simulator.stats.injected.items()):
+        print(f"  {command:<20} x{count}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Soak test device manager against simulated AC fleet")
+    parser.add_argument("--acs", type=int, default=10000, help="number of simulated ACs")
+    parser.add_argument("--duration", type=float, default=60, help="test duration in seconds")
+    parser.add_argument("--state-interval", type=float, default=60, help="CMD_FCU_FROM_AC period of every AC")
+    parser.add_argument("--heartbeat-interval", type=float, default=30, help="CMD_HEARTBEAT period of every AC")
+    parser.add_argument("--response-delay", type=float, default=0.2, help="AC response delay to CMD_FCU_TO_AC")
+    parser.add_argument("--command-rate", type=float, default=10, help="CMD_FCU_TO_AC commands per second")
+    parser.add_argument("--time-scale", type=float, default=60, help="simulated seconds per real second")
+    parser.add_argument("--report-interval", type=float, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
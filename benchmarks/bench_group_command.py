@@ -0,0 +1,98 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import asyncio
+import time
+import typing as t
+
+from toshiba_ac.device import ToshibaAcDevice
+from toshiba_ac.device.command_tracker import ToshibaAcCommand
+from toshiba_ac.device.fcu_state import ToshibaAcFcuState
+from toshiba_ac.device.properties import ToshibaAcStatus
+from toshiba_ac.device_manager import ToshibaAcDeviceManager
+from toshiba_ac.testing.fake_cloud import ToshibaAcFakeCloud
+from toshiba_ac.testing.fleet_simulator import ToshibaAcFleetSimulator
+from toshiba_ac.utils.http_api import ToshibaAcHttpApi
+from toshiba_ac.utils.rate_limiter import ToshibaAcRateLimiter
+
+# Fleet-wide command (switching every AC on or off) sent one message per AC and as multicast group command.
+# Simulated ACs answer every command, time is measured until all of them confirmed it. Run
+# "python -m benchmarks.bench_group_command --help" for load options.
+
+
+async def per_device(
+    manager: ToshibaAcDeviceManager, devices: t.List[ToshibaAcDevice], state: ToshibaAcFcuState
+) -> t.List[ToshibaAcCommand]:
+    return await asyncio.gather(*(device.send_state_to_ac(state) for device in devices))
+
+
+async def group(
+    manager: ToshibaAcDeviceManager, devices: t.List[ToshibaAcDevice], state: ToshibaAcFcuState
+) -> t.List[ToshibaAcCommand]:
+    return list((await manager.send_state_to_devices(devices, state)).values())
+
+
+async def run(args: argparse.Namespace) -> None:
+    cloud = ToshibaAcFakeCloud(seed=0)
+    account = cloud.add_account("user", "password", ac_count=args.acs, group_size=50)
+    simulator = ToshibaAcFleetSimulator(account, response_delay_s=args.response_delay, seed=0)
+
+    async with cloud:
+        # Fake cloud does not need pacing, startup of many ACs would take minutes with library defaults
+        rate_limiter = ToshibaAcRateLimiter(rate=1000, max_concurrency=ToshibaAcHttpApi.REQUEST_MAX_CONCURRENCY)
+        manager = ToshibaAcDeviceManager(
+            "user",
+            "password",
+            rate_limiter=rate_limiter,
+            http_base_url=cloud.base_url,
+            amqp_transport_factory=simulator.create_transport,
+        )
+
+        try:
+            await manager.connect()
+            devices = await manager.get_devices()
+            await asyncio.gather(*(t.cast(t.Any, device.load_additional_device_info_task) for device in devices))
+            assert simulator.transport
+
+            for name, send in (("per device", per_device), ("group", group)):
+                for status in (ToshibaAcStatus.OFF, ToshibaAcStatus.ON):
+                    state = ToshibaAcFcuState()
+                    state.ac_status = status
+                    messages_sent = simulator.transport.messages_sent
+
+                    start = time.perf_counter()
+                    commands = await send(manager, devices, state)
+                    sent_s = time.perf_counter() - start
+                    await asyncio.gather(*(command.confirmed for command in commands))
+                    confirmed_s = time.perf_counter() - start
+
+                    print(
+                        f"{name:<12} {status.name:<4} {simulator.transport.messages_sent - messages_sent:6} messages"
+                        f"  sent in {sent_s * 1000:8.1f} ms  all confirmed in {confirmed_s * 1000:8.1f} ms"
+                    )
+        finally:
+            await simulator.stop()
+            await manager.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare per device and group commands sent to AC fleet")
+    parser.add_argument("--acs", type=int, default=1000, help="number of simulated ACs")
+    parser.add_argument("--response-delay", type=float, default=0.05, help="AC response delay to CMD_FCU_TO_AC")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import subprocess
+import sys
+import typing as t
+
+# Importing any of these modules must not pull in transports or run version lookup
+MODULES = (
+    "toshiba_ac",
+    "toshiba_ac.device.fcu_state",
+    "toshiba_ac.device",
+    "toshiba_ac.device_manager",
+)
+FORBIDDEN_PREFIXES = ("azure", "aiohttp", "toshiba_ac._version")
+
+
+def import_times(module: str) -> t.Dict[str, int]:
+    # Fresh interpreter for every measurement, "-X importtime" reports cumulative time of each import in us
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure import time of toshiba_ac modules")
+    parser.add_argument("--repeat", type=int, default=5, help="number of measurements, best one is reported")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if any module takes longer to import")
+    args = parser.parse_args()
+
+    failed = False
+
+    for module in MODULES:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        best_ms = min(run[module] for run in runs) / 1000
+        forbidden = [
+            prefix
+            for prefix in FORBIDDEN_PREFIXES
+            if any(name == prefix or name.startswith(prefix + ".") for name in runs[0])
+        ]
+
+        print(f"{module:<40} {best_ms:8.2f} ms")
+
+        if forbidden:
+            print(f"  imports {', '.join(forbidden)}")
+            failed = True
+
+        if args.max_ms is not None and best_ms > args.max_ms:
+            print(f"  exceeds {args.max_ms} ms")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,33 @@ toshiba_logger.setLevel(logging.DEBUG)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+ENUM_ENTRY_TITLES = {
+    "ac_status": "Power",
+    "ac_mode": "Mode",
+    "ac_fan_mode": "Fan mode",
+    "ac_swing_mode": "Swing mode",
+    "ac_power_selection": "Power selection",
+    "ac_merit_b": "Merit B feature",
+    "ac_merit_a": "Merit A feature",
+    "ac_air_pure_ion": "Pure ion",
+    "ac_self_cleaning": "Self cleaning",
+}
+
+STATE_FIELDS = (
+    "ac_status",
+    "ac_mode",
+    "ac_temperature",
+    "ac_fan_mode",
+    "ac_swing_mode",
+    "ac_power_selection",
+    "ac_merit_b",
+    "ac_merit_a",
+    "ac_air_pure_ion",
+    "ac_indoor_temperature",
+    "ac_outdoor_temperature",
+    "ac_self_cleaning",
+)
+
 
 class DeviceTab:
     def __init__(self, device, tab):
@@ -138,30 +165,43 @@ class App(tk.Tk):
             f'{title}: {getattr(dev_tab.device, entry_name).name.title().replace("_", " ")}'
         )
 
-    def update_ac_state(self, dev_tab):
-        self.update_ac_state_entry(dev_tab, "ac_status", "Power")
-        self.update_ac_state_entry(dev_tab, "ac_mode", "Mode")
-        dev_tab.ac_temperature.set(f"Temperature: {dev_tab.device.ac_temperature}")
-        self.update_ac_state_entry(dev_tab, "ac_fan_mode", "Fan mode")
-        self.update_ac_state_entry(dev_tab, "ac_swing_mode", "Swing mode")
-        self.update_ac_state_entry(dev_tab, "ac_power_selection", "Power selection")
-        self.update_ac_state_entry(dev_tab, "ac_merit_b", "Merit B feature")
-        self.update_ac_state_entry(dev_tab, "ac_merit_a", "Merit A feature")
-        self.update_ac_state_entry(dev_tab, "ac_air_pure_ion", "Pure ion")
-        dev_tab.ac_indoor_temperature.set(f"Indoor temperature: {dev_tab.device.ac_indoor_temperature}")
-        dev_tab.ac_outdoor_temperature.set(f"Outdoor temperature: {dev_tab.device.ac_outdoor_temperature}")
-        self.update_ac_state_entry(dev_tab, "ac_self_cleaning", "Self cleaning")
+    def update_ac_state_field(self, dev_tab, field):
+        if field in ENUM_ENTRY_TITLES:
+            self.update_ac_state_entry(dev_tab, field, ENUM_ENTRY_TITLES[field])
+        elif field == "ac_temperature":
+            dev_tab.ac_temperature.set(f"Temperature: {dev_tab.device.ac_temperature}")
+        elif field == "ac_indoor_temperature":
+            dev_tab.ac_indoor_temperature.set(f"Indoor temperature: {dev_tab.device.ac_indoor_temperature}")
+        elif field == "ac_outdoor_temperature":
+            dev_tab.ac_outdoor_temperature.set(f"Outdoor temperature: {dev_tab.device.ac_outdoor_temperature}")
+
+    def update_ac_energy_consumption(self, dev_tab):
         if dev_tab.device.ac_energy_consumption:
             dev_tab.ac_energy_consumption.set(
                 f"Energy used {dev_tab.device.ac_energy_consumption.energy_wh}Wh since {dev_tab.device.ac_energy_consumption.since.isoformat()}"
             )
 
-    def dev_state_changed(self, dev):
-        self.update_ac_state(self.devices[dev])
+    def update_ac_state(self, dev_tab):
+        for field in STATE_FIELDS:
+            self.update_ac_state_field(dev_tab, field)
+        self.update_ac_energy_consumption(dev_tab)
+
+    def dev_state_change_set(self, change):
+        dev_tab = self.devices[change.device]
+        for field in change.fields:
+            self.update_ac_state_field(dev_tab, field)
+
+    def dev_energy_consumption_changed(self, dev):
+        self.update_ac_energy_consumption(self.devices[dev])
 
     async def init(self):
         self.device_manager = ToshibaAcDeviceManager(
-            self.user, self.password, "3e6e4eb5f0e5aa40", brand_id=self.brand_id
+            self.user,
+            self.password,
+            "3e6e4eb5f0e5aa40",
+            brand_id=self.brand_id,
+            # Spinbox sends command on every click, merge quick clicks into one
+            command_coalescing_window_s=0.3,
         )
         await self.device_manager.connect()
 
@@ -173,8 +213,8 @@ class App(tk.Tk):
             self.populate_device_tab(dev_tab)
             self.devices[device] = dev_tab
 
-            device.on_state_changed_callback.add(self.dev_state_changed)
-            device.on_energy_consumption_changed_callback.add(self.dev_state_changed)
+            device.on_state_change_set_callback.add(self.dev_state_change_set)
+            device.on_energy_consumption_changed_callback.add(self.dev_energy_consumption_changed)
 
             self.tab_control.add(tab, text=f"{device.name}")
 
@@ -1,3 +1,13 @@
-from . import _version
+import typing as t
 
-__version__ = _version.get_versions()["version"]
+
+def __getattr__(name: str) -> t.Any:
+    # Version is resolved on first use, in source checkouts it may need to run git
+    if name == "__version__":
+        from . import _version
+
+        version = _version.get_versions()["version"]
+        globals()["__version__"] = version
+        return version
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
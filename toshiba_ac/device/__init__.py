@@ -15,13 +15,16 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import contextvars
 import logging
-import struct
 import typing as t
 from dataclasses import dataclass
 
+from toshiba_ac.device.command_tracker import ToshibaAcCommand, ToshibaAcCommandTracker
 from toshiba_ac.device.fcu_state import ToshibaAcFcuState
-from toshiba_ac.device.features import ToshibaAcFeatures
+from toshiba_ac.device.features import ToshibaAcFeatures, ToshibaAcFeatureSet
+from toshiba_ac.device.heartbeat import ToshibaAcHeartbeat
 from toshiba_ac.device.properties import (
     ToshibaAcAirPureIon,
     ToshibaAcDeviceEnergyConsumption,
@@ -34,9 +37,14 @@ from toshiba_ac.device.properties import (
     ToshibaAcStatus,
     ToshibaAcSwingMode,
 )
-from toshiba_ac.utils import async_sleep_until_next_multiply_of_minutes, pretty_enum_name, ToshibaAcCallback
-from toshiba_ac.utils.amqp_api import ToshibaAcAmqpApi, JSONSerializable
-from toshiba_ac.utils.http_api import ToshibaAcHttpApi
+from toshiba_ac.utils import pretty_enum_name, ToshibaAcCallback
+from toshiba_ac.utils.json_codec import ToshibaAcMessageTemplate
+from toshiba_ac.utils.metrics import get_metrics
+from toshiba_ac.utils.tracing import span
+
+if t.TYPE_CHECKING:
+    from toshiba_ac.utils.amqp_api import ToshibaAcAmqpApi, JSONSerializable
+    from toshiba_ac.utils.http_api import ToshibaAcHttpApi
 
 logger = logging.getLogger(__name__)
 
@@ -45,13 +53,38 @@ class ToshibaAcDeviceError(Exception):
     pass
 
 
+# Batches opened by the current task by device, tasks started inside a batch share it with the task opening it
+_BATCH_STATES: contextvars.ContextVar[t.Optional[t.Dict[ToshibaAcDevice, ToshibaAcFcuState]]] = contextvars.ContextVar(
+    "toshiba_ac_batch_states", default=None
+)
+
+
 class ToshibaAcDeviceCallback(ToshibaAcCallback["ToshibaAcDevice"]):
     pass
 
 
-class ToshibaAcDevice:
-    STATE_RELOAD_PERIOD_MINUTES = 30
+@dataclass(frozen=True)
+class ToshibaAcDeviceStateChange:
+    device: ToshibaAcDevice
+    # Changed property name -> (old value, new value)
+    changes: t.Dict[str, t.Tuple[t.Any, t.Any]]
+
+    @property
+    def fields(self) -> t.KeysView[str]:
+        return self.changes.keys()
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.changes
+
+    def __str__(self) -> str:
+        return ", ".join(f"{field}: {old} -> {new}" for field, (old, new) in self.changes.items())
 
+
+class ToshibaAcDeviceStateChangeCallback(ToshibaAcCallback[ToshibaAcDeviceStateChange]):
+    pass
+
+
+class ToshibaAcDevice:
     def __init__(
         self,
         name: str,
@@ -64,6 +97,8 @@ class ToshibaAcDevice:
         ac_model_id: str,
         amqp_api: ToshibaAcAmqpApi,
         http_api: ToshibaAcHttpApi,
+        supported: t.Optional[ToshibaAcFeatures] = None,
+        command_coalescing_window_s: float = 0.0,
     ) -> None:
         self.name = name
         self.device_id = device_id
@@ -77,27 +112,40 @@ class ToshibaAcDevice:
 
         self.cdu: t.Optional[str] = None
         self.fcu: t.Optional[str] = None
-        self._supported = ToshibaAcFeatures.from_merit_string_and_model(merit_feature, ac_model_id)
+        self._supported = supported or ToshibaAcFeatures.from_merit_string_and_model(merit_feature, ac_model_id)
         self._on_state_changed_callback = ToshibaAcDeviceCallback()
+        self._on_state_change_set_callback = ToshibaAcDeviceStateChangeCallback()
         self._on_energy_consumption_changed_callback = ToshibaAcDeviceCallback()
         self._ac_energy_consumption: t.Optional[ToshibaAcDeviceEnergyConsumption] = None
-        self.periodic_reload_state_task: t.Optional[asyncio.Task[None]] = None
+        self._last_heartbeat: t.Optional[ToshibaAcHeartbeat] = None
+        # Setter calls made within this time from the first one are merged and sent as single command, 0 disables it
+        self.command_coalescing_window_s = command_coalescing_window_s
+        self._pending_state: t.Optional[ToshibaAcFcuState] = None
+        self._pending_state_sent: t.Optional[asyncio.Future[None]] = None
+        self._pending_state_task: t.Optional[asyncio.Task[None]] = None
+        self.command_tracker = ToshibaAcCommandTracker(name)
+        self._fcu_to_ac_template = ToshibaAcMessageTemplate(device_id, [ac_unique_id], "CMD_FCU_TO_AC")
         self.load_additional_device_info_task: t.Optional[asyncio.Task[None]] = None
 
         logger.debug(f"[{self.name}] {self.supported}")
 
     async def connect(self) -> None:
         self.load_additional_device_info_task = asyncio.create_task(self._load_additional_device_info_deferred())
-        self.periodic_reload_state_task = asyncio.create_task(self.periodic_state_reload())
 
     async def shutdown(self) -> None:
         if self.load_additional_device_info_task:
             self.load_additional_device_info_task.cancel()
             await self.load_additional_device_info_task
 
-        if self.periodic_reload_state_task:
-            self.periodic_reload_state_task.cancel()
-            await self.periodic_reload_state_task
+        # Do not drop commands still waiting in coalescing window, command already being sent is not interrupted
+        if self._pending_state_task:
+            if self._pending_state is not None:
+                self._pending_state_task.cancel()
+                await self._send_pending_state()
+            else:
+                await asyncio.wait([self._pending_state_task])
+
+        self.command_tracker.cancel_all()
 
     async def _load_additional_device_info_deferred(self) -> None:
         try:
@@ -109,46 +157,95 @@ class ToshibaAcDevice:
 
     async def load_additional_device_info(self) -> None:
         additional_info = await self.http_api.get_device_additional_info(self.ac_id)
+        changes = {}
+        if additional_info.cdu != self.cdu:
+            changes["cdu"] = (self.cdu, additional_info.cdu)
+        if additional_info.fcu != self.fcu:
+            changes["fcu"] = (self.fcu, additional_info.fcu)
         self.cdu = additional_info.cdu
         self.fcu = additional_info.fcu
         await self.on_state_changed_callback(self)
+        if changes:
+            await self.on_state_change_set_callback(ToshibaAcDeviceStateChange(self, changes))
+
+        # Same response carries current AC state, no need to request it separately
+        if additional_info.ac_state:
+            await self.handle_state_from_http(additional_info.ac_state)
 
     async def state_reload(self) -> None:
         hex_state = await self.http_api.get_device_state(self.ac_id)
-        logger.debug(f"[{self.name}] AC state from HTTP: {hex_state}")
-        if self.fcu_state.update(hex_state):
-            await self.state_changed()
+        await self.handle_state_from_http(hex_state)
 
-    async def state_changed(self) -> None:
+    async def handle_state_from_http(self, hex_state: str) -> None:
+        logger.debug(f"[{self.name}] AC state from HTTP: {hex_state}")
+        old_state = self._old_state_for_change_set()
+        changed_fields = self.fcu_state.update(hex_state)
+        if changed_fields:
+            await self.state_changed(self._state_change(old_state, changed_fields))
+
+    def _old_state_for_change_set(self) -> t.Optional[ToshibaAcFcuState]:
+        # Old values are needed only by change set callbacks, do not copy state for every message without them
+        return self.fcu_state.copy() if self._on_state_change_set_callback.callbacks else None
+
+    def _state_change(
+        self, old_state: t.Optional[ToshibaAcFcuState], changed_fields: t.AbstractSet[str]
+    ) -> t.Optional[ToshibaAcDeviceStateChange]:
+        if old_state is None:
+            return None
+
+        changes = {field: (getattr(old_state, field), getattr(self.fcu_state, field)) for field in changed_fields}
+
+        # Reported setpoint depends on mode and merit A, see ac_temperature
+        if changed_fields & {"ac_temperature", "ac_mode", "ac_merit_a"}:
+            old_temperature = self.ac_temperature_from_fcu_state(old_state)
+            new_temperature = self.ac_temperature_from_fcu_state(self.fcu_state)
+            if old_temperature != new_temperature:
+                changes["ac_temperature"] = (old_temperature, new_temperature)
+            else:
+                changes.pop("ac_temperature", None)
+
+        return ToshibaAcDeviceStateChange(self, changes)
+
+    async def state_changed(self, change: t.Optional[ToshibaAcDeviceStateChange] = None) -> None:
         logger.info(f"[{self.name}] Current state: {self.fcu_state}")
-        await self.on_state_changed_callback(self)
 
-    async def periodic_state_reload(self) -> None:
-        while True:
-            await async_sleep_until_next_multiply_of_minutes(self.STATE_RELOAD_PERIOD_MINUTES)
-            try:
-                await self.state_reload()
-            except asyncio.CancelledError:
-                raise
-            except Exception as e:
-                logger.error(f"State reload failed: {e}")
-                pass
+        metrics = get_metrics()
+        if metrics:
+            metrics.device_state_changes.labels(self.ac_unique_id).inc()
+
+        await self.on_state_changed_callback(self)
+        if change and change.changes:
+            logger.debug(f"[{self.name}] State change: {change}")
+            await self.on_state_change_set_callback(change)
 
     async def handle_cmd_fcu_from_ac(self, payload: dict[str, JSONSerializable]) -> None:
-        if not isinstance(payload["data"], str):
-            logger.error(f'[{self.name}] malformed AC state from AMQP: {payload["data"]}')
-            return
-        logger.debug(f'[{self.name}] AC state from AMQP: {payload["data"]}')
-        if self.fcu_state.update(payload["data"]):
-            await self.state_changed()
+        with span("ToshibaAcDevice.handle_cmd_fcu_from_ac", device=self.ac_unique_id):
+            if not isinstance(payload["data"], str):
+                logger.error(f'[{self.name}] malformed AC state from AMQP: {payload["data"]}')
+                return
+            logger.debug(f'[{self.name}] AC state from AMQP: {payload["data"]}')
+            old_state = self._old_state_for_change_set()
+            with span("ToshibaAcFcuState.update"):
+                changed_fields = self.fcu_state.update(payload["data"])
+            self.command_tracker.handle_state(payload["data"])
+            if changed_fields:
+                await self.state_changed(self._state_change(old_state, changed_fields))
 
     async def handle_cmd_heartbeat(self, payload: dict[str, t.Any]) -> None:
-        # Use signed conversion for temperatures, unsigned otherwise.
-        hb_data = {k: struct.unpack("b" if "Temp" in k else "B", bytes.fromhex(v))[0] for k, v in payload.items()}
-        logger.debug(f"[{self.name}] AC heartbeat from AMQP: {hb_data}")
+        with span("ToshibaAcDevice.handle_cmd_heartbeat", device=self.ac_unique_id):
+            # Only temperatures are decoded here, the rest of heartbeat is decoded when accessed
+            heartbeat = ToshibaAcHeartbeat(payload)
+            self._last_heartbeat = heartbeat
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"[{self.name}] AC heartbeat from AMQP: {heartbeat.as_dict()}")
 
-        if self.fcu_state.update_from_hbt(hb_data):
-            await self.state_changed()
+            old_state = self._old_state_for_change_set()
+            changed_fields = self.fcu_state.update_temperatures(
+                heartbeat.indoor_temperature, heartbeat.outdoor_temperature
+            )
+            if changed_fields:
+                await self.state_changed(self._state_change(old_state, changed_fields))
 
     async def handle_update_ac_energy_consumption(self, val: ToshibaAcDeviceEnergyConsumption) -> None:
         if self._ac_energy_consumption != val:
@@ -158,74 +255,187 @@ class ToshibaAcDevice:
 
             await self.on_energy_consumption_changed_callback(self)
 
-    async def send_state_to_ac(self, state: ToshibaAcFcuState) -> None:
-        future_state = ToshibaAcFcuState.from_hex_state(self.fcu_state.encode())
-        future_state.update(state.encode())
+    async def send_state_to_ac(self, state: ToshibaAcFcuState) -> ToshibaAcCommand:
+        # Returned command can be awaited for confirmation from the AC:
+        #   round_trip_s = await (await device.send_state_to_ac(state)).confirmed
+        with span("ToshibaAcDevice.send_state_to_ac", device=self.ac_unique_id) as send_span:
+            command = await self._send_state_to_ac(state)
+            send_span.set_attribute("message_id", command.message_id)
+            return command
+
+    async def _set_state(self, state: ToshibaAcFcuState) -> None:
+        # Used by setters, state is merged into batch opened by the caller or coalescing window if there is one
+        batch_states = _BATCH_STATES.get()
+        batch_state = batch_states.get(self) if batch_states else None
+
+        if batch_state is not None:
+            batch_state.update(state.encode())
+            return
 
-        if future_state.ac_status not in self.supported.ac_status:
-            raise ToshibaAcDeviceError(
-                f"[{self.name}] Trying to set unsupported ac status: {pretty_enum_name(future_state.ac_status)}"
-            )
+        if self.command_coalescing_window_s <= 0:
+            await self.send_state_to_ac(state)
+            return
 
-        if future_state.ac_mode not in self.supported.ac_mode:
-            raise ToshibaAcDeviceError(
-                f"[{self.name}] Trying to set unsupported ac mode: {pretty_enum_name(future_state.ac_mode)}"
-            )
+        if self._pending_state is None:
+            self._pending_state = state
+            self._pending_state_sent = asyncio.get_running_loop().create_future()
+            self._pending_state_task = asyncio.create_task(self._send_pending_state_later())
+        else:
+            self._pending_state.update(state.encode())
+
+        assert self._pending_state_sent
+        # Shielded, so cancelling one setter does not cancel command shared with others
+        await asyncio.shield(self._pending_state_sent)
+
+    async def _send_pending_state_later(self) -> None:
+        try:
+            await asyncio.sleep(self.command_coalescing_window_s)
+            await self._send_pending_state()
+        finally:
+            # Setters called meanwhile may have started next window with its own task
+            if self._pending_state_task is asyncio.current_task():
+                self._pending_state_task = None
+
+    async def _send_pending_state(self) -> None:
+        # Pending state is taken before sending, so setters called during send start new window
+        state, sent = self._pending_state, self._pending_state_sent
+        self._pending_state = self._pending_state_sent = None
+
+        if state is None or sent is None:
+            return
+
+        try:
+            await self.send_state_to_ac(state)
+        except Exception as e:
+            sent.set_exception(e)
+        else:
+            sent.set_result(None)
+        finally:
+            # Cancelled send must not leave merged setters waiting forever
+            if not sent.done():
+                sent.set_exception(ToshibaAcDeviceError(f"[{self.name}] Sending of merged command was cancelled"))
+
+    @contextlib.asynccontextmanager
+    async def batch(self) -> t.AsyncIterator[None]:
+        # Setters called inside are applied together as single command when the block exits without error:
+        #   async with device.batch():
+        #       await device.set_ac_mode(ToshibaAcMode.COOL)
+        #       await device.set_ac_temperature(22)
+        # Batch belongs to the task opening it, setters called by other tasks are sent as usual.
+        batch_states = _BATCH_STATES.get()
+
+        if batch_states is not None and self in batch_states:
+            # Nested batch is part of the outer one
+            yield
+            return
+
+        token = None
+
+        if batch_states is None:
+            batch_states = {}
+            token = _BATCH_STATES.set(batch_states)
+
+        state = batch_states[self] = ToshibaAcFcuState()
+
+        try:
+            yield
+        finally:
+            del batch_states[self]
+
+            if token:
+                _BATCH_STATES.reset(token)
+
+        # Nothing to send if no setter was called
+        if ToshibaAcFcuState().update(state.encode()):
+            await self._set_state(state)
+
+    def prepare_state_to_ac(self, state: ToshibaAcFcuState) -> ToshibaAcFcuState:
+        # Validates requested state against supported features and returns state to be sent to the AC,
+        # unsupported optional fields are cleared and temperature adjusted the way the AC expects
+        state = state.copy()
+        future_state = self.fcu_state.copy()
+        future_state.update(state.encode())
+
+        # Values are checked field by field only when some of them is not supported
+        state_bits = ToshibaAcFeatureSet.bits(
+            future_state.ac_status,
+            future_state.ac_mode,
+            future_state.ac_fan_mode,
+            future_state.ac_swing_mode,
+            future_state.ac_power_selection,
+            future_state.ac_merit_b,
+            future_state.ac_merit_a,
+            future_state.ac_air_pure_ion,
+            future_state.ac_self_cleaning,
+        )
+
+        if state_bits & ~self.supported.mask:
+            if future_state.ac_status not in self.supported.ac_status:
+                raise ToshibaAcDeviceError(
+                    f"[{self.name}] Trying to set unsupported ac status: {pretty_enum_name(future_state.ac_status)}"
+                )
+
+            if future_state.ac_mode not in self.supported.ac_mode:
+                raise ToshibaAcDeviceError(
+                    f"[{self.name}] Trying to set unsupported ac mode: {pretty_enum_name(future_state.ac_mode)}"
+                )
 
         supported_for_mode = self.supported.for_ac_mode(future_state.ac_mode)
 
-        def warn_if_same_mode(msg: str) -> None:
-            if future_state.ac_mode == self.ac_mode:
-                logger.warning(msg)
+        if state_bits & ~supported_for_mode.mask:
 
-        if future_state.ac_fan_mode not in supported_for_mode.ac_fan_mode:
-            warn_if_same_mode(
-                f"[{self.name}] Trying to set unsupported ac fan mode: {pretty_enum_name(future_state.ac_fan_mode)}"
-            )
+            def warn_if_same_mode(msg: str) -> None:
+                if future_state.ac_mode == self.ac_mode:
+                    logger.warning(msg)
 
-            state.ac_fan_mode = ToshibaAcFanMode.NONE
+            if future_state.ac_fan_mode not in supported_for_mode.ac_fan_mode:
+                warn_if_same_mode(
+                    f"[{self.name}] Trying to set unsupported ac fan mode: {pretty_enum_name(future_state.ac_fan_mode)}"
+                )
 
-        if future_state.ac_swing_mode not in supported_for_mode.ac_swing_mode:
-            warn_if_same_mode(
-                f"[{self.name}] Trying to set unsupported ac swing mode: {pretty_enum_name(future_state.ac_swing_mode)}"
-            )
+                state.ac_fan_mode = ToshibaAcFanMode.NONE
 
-            state.ac_swing_mode = ToshibaAcSwingMode.NONE
+            if future_state.ac_swing_mode not in supported_for_mode.ac_swing_mode:
+                warn_if_same_mode(
+                    f"[{self.name}] Trying to set unsupported ac swing mode: {pretty_enum_name(future_state.ac_swing_mode)}"
+                )
 
-        if future_state.ac_power_selection not in supported_for_mode.ac_power_selection:
-            warn_if_same_mode(
-                f"[{self.name}] Trying to set unsupported ac power selection: {pretty_enum_name(future_state.ac_power_selection)}"
-            )
+                state.ac_swing_mode = ToshibaAcSwingMode.NONE
 
-            state.ac_power_selection = ToshibaAcPowerSelection.NONE
+            if future_state.ac_power_selection not in supported_for_mode.ac_power_selection:
+                warn_if_same_mode(
+                    f"[{self.name}] Trying to set unsupported ac power selection: {pretty_enum_name(future_state.ac_power_selection)}"
+                )
 
-        if future_state.ac_merit_b not in supported_for_mode.ac_merit_b:
-            warn_if_same_mode(
-                f"[{self.name}] Trying to set unsupported ac merit b: {pretty_enum_name(future_state.ac_merit_b)}"
-            )
+                state.ac_power_selection = ToshibaAcPowerSelection.NONE
 
-            state.ac_merit_b = ToshibaAcMeritB.OFF
+            if future_state.ac_merit_b not in supported_for_mode.ac_merit_b:
+                warn_if_same_mode(
+                    f"[{self.name}] Trying to set unsupported ac merit b: {pretty_enum_name(future_state.ac_merit_b)}"
+                )
 
-        if future_state.ac_merit_a not in supported_for_mode.ac_merit_a:
-            warn_if_same_mode(
-                f"[{self.name}] Trying to set unsupported ac merit a: {pretty_enum_name(future_state.ac_merit_a)}"
-            )
+                state.ac_merit_b = ToshibaAcMeritB.OFF
 
-            state.ac_merit_a = ToshibaAcMeritA.OFF
+            if future_state.ac_merit_a not in supported_for_mode.ac_merit_a:
+                warn_if_same_mode(
+                    f"[{self.name}] Trying to set unsupported ac merit a: {pretty_enum_name(future_state.ac_merit_a)}"
+                )
 
-        if future_state.ac_air_pure_ion not in supported_for_mode.ac_air_pure_ion:
-            warn_if_same_mode(
-                f"[{self.name}] Trying to set unsupported ac merit a: {pretty_enum_name(future_state.ac_air_pure_ion)}"
-            )
+                state.ac_merit_a = ToshibaAcMeritA.OFF
 
-            state.ac_air_pure_ion = ToshibaAcAirPureIon.NONE
+            if future_state.ac_air_pure_ion not in supported_for_mode.ac_air_pure_ion:
+                warn_if_same_mode(
+                    f"[{self.name}] Trying to set unsupported ac merit a: {pretty_enum_name(future_state.ac_air_pure_ion)}"
+                )
 
-        if future_state.ac_self_cleaning not in supported_for_mode.ac_self_cleaning:
-            warn_if_same_mode(
-                f"[{self.name}] Trying to set unsupported ac self cleaning: {pretty_enum_name(future_state.ac_self_cleaning)}"
-            )
+                state.ac_air_pure_ion = ToshibaAcAirPureIon.NONE
+
+            if future_state.ac_self_cleaning not in supported_for_mode.ac_self_cleaning:
+                warn_if_same_mode(
+                    f"[{self.name}] Trying to set unsupported ac self cleaning: {pretty_enum_name(future_state.ac_self_cleaning)}"
+                )
 
-            state.ac_self_cleaning = ToshibaAcSelfCleaning.NONE
+                state.ac_self_cleaning = ToshibaAcSelfCleaning.NONE
 
         # If we are requesting to turn on, we have to clear self cleaning flag
         if state.ac_status == ToshibaAcStatus.ON and self.ac_self_cleaning == ToshibaAcSelfCleaning.ON:
@@ -237,18 +447,31 @@ class ToshibaAcDevice:
                 if future_state.ac_merit_a == ToshibaAcMeritA.HEATING_8C:
                     state.ac_temperature = state.ac_temperature + 16
 
-        logger.debug(f"[{self.name}] Sending command: {state}")
+        return state
+
+    async def _send_state_to_ac(self, state: ToshibaAcFcuState) -> ToshibaAcCommand:
+        requested_hex_state = state.encode()
+        state = self.prepare_state_to_ac(state)
+        hex_state = state.encode()
+        # Only fields set by the caller are waited for, not the ones prepare_state_to_ac() added or cleared
+        command = self.command_tracker.track(hex_state, requested_hex_state=requested_hex_state)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[{self.name}] Sending command {command.message_id}: {state}")
+
+        fcu_to_ac = self._fcu_to_ac_template.render(command.message_id, hex_state)
+
+        try:
+            await self.amqp_api.send_message(fcu_to_ac)
+        except BaseException:
+            self.command_tracker.discard(command)
+            raise
 
-        fcu_to_ac = {
-            "sourceId": self.device_id,
-            "messageId": "0000000",
-            "targetId": [self.ac_unique_id],
-            "cmd": "CMD_FCU_TO_AC",
-            "payload": {"data": state.encode()},
-            "timeStamp": "0000000",
-        }
+        return command
 
-        await self.amqp_api.send_message(str(fcu_to_ac))
+    @property
+    def last_heartbeat(self) -> t.Optional[ToshibaAcHeartbeat]:
+        return self._last_heartbeat
 
     @property
     def ac_status(self) -> ToshibaAcStatus:
@@ -258,7 +481,7 @@ class ToshibaAcDevice:
         state = ToshibaAcFcuState()
         state.ac_status = val
 
-        await self.send_state_to_ac(state)
+        await self._set_state(state)
 
     @property
     def ac_mode(self) -> ToshibaAcMode:
@@ -268,26 +491,30 @@ class ToshibaAcDevice:
         state = ToshibaAcFcuState()
         state.ac_mode = val
 
-        await self.send_state_to_ac(state)
+        await self._set_state(state)
 
-    @property
-    def ac_temperature(self) -> t.Optional[int]:
+    @staticmethod
+    def ac_temperature_from_fcu_state(fcu_state: ToshibaAcFcuState) -> t.Optional[int]:
         # In HEATING_8C mode reported temperatures are 16 degrees higher than actual setpoint (only when heating)
 
-        ret = self.fcu_state.ac_temperature
+        ret = fcu_state.ac_temperature
 
-        if self.fcu_state.ac_mode == ToshibaAcMode.HEAT:
-            if self.fcu_state.ac_merit_a == ToshibaAcMeritA.HEATING_8C:
+        if fcu_state.ac_mode == ToshibaAcMode.HEAT:
+            if fcu_state.ac_merit_a == ToshibaAcMeritA.HEATING_8C:
                 if isinstance(ret, int):
                     ret = ret - 16
 
         return ret
 
+    @property
+    def ac_temperature(self) -> t.Optional[int]:
+        return self.ac_temperature_from_fcu_state(self.fcu_state)
+
     async def set_ac_temperature(self, val: t.Optional[int]) -> None:
         state = ToshibaAcFcuState()
         state.ac_temperature = val
 
-        await self.send_state_to_ac(state)
+        await self._set_state(state)
 
     @property
     def ac_fan_mode(self) -> ToshibaAcFanMode:
@@ -297,7 +524,7 @@ class ToshibaAcDevice:
         state = ToshibaAcFcuState()
         state.ac_fan_mode = val
 
-        await self.send_state_to_ac(state)
+        await self._set_state(state)
 
     @property
     def ac_swing_mode(self) -> ToshibaAcSwingMode:
@@ -307,7 +534,7 @@ class ToshibaAcDevice:
         state = ToshibaAcFcuState()
         state.ac_swing_mode = val
 
-        await self.send_state_to_ac(state)
+        await self._set_state(state)
 
     @property
     def ac_power_selection(self) -> ToshibaAcPowerSelection:
@@ -317,7 +544,7 @@ class ToshibaAcDevice:
         state = ToshibaAcFcuState()
         state.ac_power_selection = val
 
-        await self.send_state_to_ac(state)
+        await self._set_state(state)
 
     @property
     def ac_merit_b(self) -> ToshibaAcMeritB:
@@ -327,7 +554,7 @@ class ToshibaAcDevice:
         state = ToshibaAcFcuState()
         state.ac_merit_b = val
 
-        await self.send_state_to_ac(state)
+        await self._set_state(state)
 
     @property
     def ac_merit_a(self) -> ToshibaAcMeritA:
@@ -337,7 +564,7 @@ class ToshibaAcDevice:
         state = ToshibaAcFcuState()
         state.ac_merit_a = val
 
-        await self.send_state_to_ac(state)
+        await self._set_state(state)
 
     @property
     def ac_air_pure_ion(self) -> ToshibaAcAirPureIon:
@@ -347,7 +574,7 @@ class ToshibaAcDevice:
         state = ToshibaAcFcuState()
         state.ac_air_pure_ion = val
 
-        await self.send_state_to_ac(state)
+        await self._set_state(state)
 
     @property
     def ac_indoor_temperature(self) -> t.Optional[int]:
@@ -369,6 +596,10 @@ class ToshibaAcDevice:
     def on_state_changed_callback(self) -> ToshibaAcDeviceCallback:
         return self._on_state_changed_callback
 
+    @property
+    def on_state_change_set_callback(self) -> ToshibaAcDeviceStateChangeCallback:
+        return self._on_state_change_set_callback
+
     @property
     def on_energy_consumption_changed_callback(self) -> ToshibaAcDeviceCallback:
         return self._on_energy_consumption_changed_callback
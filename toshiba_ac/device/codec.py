@@ -0,0 +1,88 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import typing as t
+from enum import Enum
+
+E = t.TypeVar("E", bound=Enum)
+
+
+class ToshibaAcEnumCodec(t.Generic[E]):
+    # Lookup tables are built once, raw values are used directly as an index into 256 slot tuple.
+    # Unknown raw values are kept as None slots and reported as KeyError, same as plain dict lookup.
+
+    def __init__(self, raw_to_value: t.Mapping[int, E], value_to_raw: t.Mapping[E, int]) -> None:
+        table: t.List[t.Optional[E]] = [None] * 256
+
+        for raw, value in raw_to_value.items():
+            table[raw & 0xFF] = value
+
+        self._from_raw: t.Tuple[t.Optional[E], ...] = tuple(table)
+        self._to_raw: t.Dict[E, int] = dict(value_to_raw)
+
+    def from_raw(self, raw: int) -> E:
+        value = self._from_raw[raw]
+
+        if value is None:
+            raise KeyError(raw)
+
+        return value
+
+    def to_raw(self, value: E) -> int:
+        return self._to_raw[value]
+
+
+class ToshibaAcTemperatureCodec:
+    # Temperatures are signed bytes. Negative raw values index the table from the end,
+    # so both signed (-128..127) and unsigned (0..255) raw values resolve to the same slot.
+
+    def __init__(self, raw_to_value: t.Mapping[int, t.Optional[int]], value_to_raw: t.Mapping[t.Optional[int], int]):
+        table: t.List[t.Optional[int]] = [raw - 256 if raw > 127 else raw for raw in range(256)]
+
+        for raw, value in raw_to_value.items():
+            table[raw & 0xFF] = value
+
+        self._from_raw: t.Tuple[t.Optional[int], ...] = tuple(table)
+        self._to_raw: t.Dict[t.Optional[int], int] = {i: i for i in range(-128, 128)}
+        self._to_raw.update(value_to_raw)
+
+    def from_raw(self, raw: int) -> t.Optional[int]:
+        return self._from_raw[raw]
+
+    def to_raw(self, value: t.Optional[int]) -> int:
+        return self._to_raw[value]
+
+
+# Merit bits of each byte, most significant bit first
+_MERIT_BYTE_BITS: t.Tuple[t.Tuple[bool, ...], ...] = tuple(
+    tuple(bool(byte & (0x80 >> bit)) for bit in range(8)) for byte in range(256)
+)
+
+
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+
+def merit_bits_from_hexstring(merit_feature_hexstring: str) -> t.Tuple[bool, ...]:
+    # Make sure merit feature string has 4 characters
+    merit_feature_hexstring = f"{merit_feature_hexstring:<04.4}"
+
+    # int() alone would accept signs, whitespace and underscores and produce wrong bits
+    if not _HEX_DIGITS.issuperset(merit_feature_hexstring):
+        raise ValueError(f"Invalid merit feature: {merit_feature_hexstring!r}")
+
+    merit_feature = int(merit_feature_hexstring, base=16)
+
+    return _MERIT_BYTE_BITS[merit_feature >> 8] + _MERIT_BYTE_BITS[merit_feature & 0xFF]
@@ -0,0 +1,250 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+import typing as t
+import uuid
+
+from toshiba_ac.device.fcu_state import ToshibaAcFcuState
+from toshiba_ac.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Message ids are unique per process run and differ between processes, without paying for uuid4() per command
+_MESSAGE_ID_PREFIX = uuid.uuid4().hex[:16]
+_message_ids = itertools.count()
+
+
+def _canonical_raw_table(name: str, offset: int, mask: int) -> t.Tuple[int, ...]:
+    first_raw_by_value: t.Dict[t.Any, int] = {}
+    table = list(range(256))
+
+    for raw in range(256):
+        if raw & ~mask:
+            continue
+
+        state = bytearray(ToshibaAcFcuState.STATE_SIZE)
+        state[offset] = raw
+
+        try:
+            value = getattr(ToshibaAcFcuState.from_raw(bytes(state)), name)
+        except KeyError:
+            continue
+
+        table[raw] = first_raw_by_value.setdefault(value, raw)
+
+    return tuple(table)
+
+
+# Raw (masked) values of every field mapped to the first raw value decoding to the same value, so that equal values
+# compare equal as raw bytes, e.g. Merit B OFF is reported as 0x00 or 0x01. Unknown raw values map to themselves.
+# Built on first use, it takes several milliseconds and would be paid on every import
+_CANONICAL_RAW: t.List[t.Tuple[int, ...]] = []
+
+
+def _canonical_raw_tables() -> t.List[t.Tuple[int, ...]]:
+    if not _CANONICAL_RAW:
+        _CANONICAL_RAW.extend(
+            _canonical_raw_table(name, offset, mask) for name, offset, mask, _ in ToshibaAcFcuState.FIELDS
+        )
+
+    return _CANONICAL_RAW
+
+
+# Bits of fields carried by a state and their canonical values by hex state. Commands and reported states repeat
+# a lot, setters send only a handful of distinct states and the AC reports its full state.
+_CANONICAL_STATES: t.Dict[str, t.Tuple[int, int]] = {}
+_MAX_CANONICAL_STATES = 1024
+
+
+def _canonical_state(hex_state: str) -> t.Tuple[int, int]:
+    try:
+        return _CANONICAL_STATES[hex_state]
+    except KeyError:
+        raw = bytes.fromhex(hex_state[: ToshibaAcFcuState.STATE_SIZE * 2])
+        carried = bytearray(len(raw))
+        canonical = bytearray(len(raw))
+
+        for (_, offset, mask, is_none), canonical_raw in zip(ToshibaAcFcuState.FIELDS, _canonical_raw_tables()):
+            if not is_none[raw[offset] & mask]:
+                carried[offset] |= mask
+                canonical[offset] |= canonical_raw[raw[offset] & mask]
+
+        state = (int.from_bytes(carried, "big"), int.from_bytes(canonical, "big"))
+
+        if len(_CANONICAL_STATES) < _MAX_CANONICAL_STATES:
+            _CANONICAL_STATES[hex_state] = state
+
+        return state
+
+
+class ToshibaAcCommandTimeoutError(Exception):
+    pass
+
+
+class ToshibaAcCommand:
+    # Command sent to the AC. confirmed future resolves with round trip time in seconds once the AC reported all
+    # requested fields with requested values, or fails with ToshibaAcCommandTimeoutError.
+    #
+    # Sent state may carry fields the caller did not set (e.g. cleared unsupported features), AC does not have
+    # to echo them. requested_hex_state limits the fields waited for to the ones set by the caller.
+    def __init__(
+        self,
+        message_id: str,
+        hex_state: str,
+        confirmed: asyncio.Future[float],
+        requested_hex_state: t.Optional[str] = None,
+    ) -> None:
+        self.message_id = message_id
+        self.hex_state = hex_state
+        self.sent_at = time.perf_counter()
+        self.confirmed = confirmed
+        self.timeout_handle: t.Optional[asyncio.TimerHandle] = None
+
+        # Bits of requested fields and their canonical values as sent, states are compared as single integers
+        sent_mask, sent_value = _canonical_state(hex_state)
+        self.requested_mask = sent_mask
+
+        if requested_hex_state is not None:
+            self.requested_mask &= _canonical_state(requested_hex_state)[0]
+
+        self.requested_value = sent_value & self.requested_mask
+        # Bits of requested fields last reported by the AC with requested value
+        self.reported_mask = 0
+
+    def update(self, carried_mask: int, value: int) -> bool:
+        # Takes state reported by the AC as returned by _canonical_state(), only fields it carries are compared.
+        # Returns True once all requested fields were reported with requested values.
+        compared = carried_mask & self.requested_mask
+        self.reported_mask = self.reported_mask & ~compared | compared & ~(value ^ self.requested_value)
+        return self.reported_mask == self.requested_mask
+
+
+class ToshibaAcCommandTracker:
+    # AC handles commands in order, so state reflecting a command confirms all commands sent before it too (their
+    # fields may have been overwritten by it). Oldest commands are failed when AC does not confirm anything for
+    # so long that MAX_PENDING commands are waiting.
+    DEFAULT_TIMEOUT_S = 30.0
+    MAX_PENDING = 32
+
+    def __init__(self, name: str, timeout_s: float = DEFAULT_TIMEOUT_S) -> None:
+        self.name = name
+        self.timeout_s = timeout_s
+        # Commands waiting for confirmation in sending order
+        self.pending: t.Dict[str, ToshibaAcCommand] = {}
+
+    @staticmethod
+    def new_message_id() -> str:
+        return f"{_MESSAGE_ID_PREFIX}{next(_message_ids):08x}"
+
+    def track(
+        self, hex_state: str, message_id: t.Optional[str] = None, requested_hex_state: t.Optional[str] = None
+    ) -> ToshibaAcCommand:
+        # Commands sent to many ACs in one message share message id, each AC confirms its own command
+        loop = asyncio.get_running_loop()
+        command = ToshibaAcCommand(
+            message_id or self.new_message_id(), hex_state, loop.create_future(), requested_hex_state
+        )
+        command.timeout_handle = loop.call_later(self.timeout_s, self._time_out, command)
+        # Nobody has to await confirmation, do not let asyncio complain about never retrieved timeout errors
+        command.confirmed.add_done_callback(self._retrieve_exception)
+        self.pending[command.message_id] = command
+
+        if len(self.pending) > self.MAX_PENDING:
+            self._fail(next(iter(self.pending.values())), "dropped, too many commands waiting for confirmation")
+
+        return command
+
+    def discard(self, command: ToshibaAcCommand) -> None:
+        # Used when command could not be sent
+        if self.pending.pop(command.message_id, None) and command.timeout_handle:
+            command.timeout_handle.cancel()
+
+    def handle_state(self, hex_state: str) -> None:
+        # Called with state carried by every CMD_FCU_FROM_AC, not with merged device state, so fields which already
+        # had requested value before the command do not confirm it
+        if not self.pending:
+            return
+
+        carried_mask, value = _canonical_state(hex_state)
+        last_confirmed = None
+
+        for command in self.pending.values():
+            if command.update(carried_mask, value):
+                last_confirmed = command
+
+        if last_confirmed is None:
+            return
+
+        now = time.perf_counter()
+        metrics = get_metrics()
+
+        for command in list(self.pending.values()):
+            del self.pending[command.message_id]
+
+            if command.timeout_handle:
+                command.timeout_handle.cancel()
+
+            round_trip_s = now - command.sent_at
+
+            if metrics:
+                metrics.command_round_trip.observe(round_trip_s)
+
+            if not command.confirmed.done():
+                command.confirmed.set_result(round_trip_s)
+
+            logger.debug(f"[{self.name}] Command {command.message_id} confirmed after {round_trip_s * 1000:.1f} ms")
+
+            if command is last_confirmed:
+                break
+
+    def cancel_all(self) -> None:
+        for command in self.pending.values():
+            if command.timeout_handle:
+                command.timeout_handle.cancel()
+
+            command.confirmed.cancel()
+
+        self.pending.clear()
+
+    def _time_out(self, command: ToshibaAcCommand) -> None:
+        self._fail(command, f"not confirmed within {self.timeout_s} s")
+
+    def _fail(self, command: ToshibaAcCommand, reason: str) -> None:
+        if self.pending.pop(command.message_id, None) is None:
+            return
+
+        if command.timeout_handle:
+            command.timeout_handle.cancel()
+
+        metrics = get_metrics()
+        if metrics:
+            metrics.command_timeouts.inc()
+
+        logger.info(f"[{self.name}] Command {command.message_id} {reason}")
+
+        if not command.confirmed.done():
+            command.confirmed.set_exception(
+                ToshibaAcCommandTimeoutError(f"[{self.name}] Command {command.message_id} {reason}")
+            )
+
+    @staticmethod
+    def _retrieve_exception(confirmed: asyncio.Future[float]) -> None:
+        if not confirmed.cancelled():
+            confirmed.exception()
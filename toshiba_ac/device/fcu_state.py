@@ -14,9 +14,9 @@
 
 from __future__ import annotations
 
-import struct
 import typing as t
 
+from toshiba_ac.device.codec import ToshibaAcEnumCodec, ToshibaAcTemperatureCodec
 from toshiba_ac.device.properties import (
     ToshibaAcAirPureIon,
     ToshibaAcFanMode,
@@ -29,233 +29,231 @@ from toshiba_ac.device.properties import (
     ToshibaAcSwingMode,
 )
 
+_UNKNOWN_BYTES = b"\xff" * 4
+
+# Raw values which mean "no information" and are never merged into current state, indexed by raw (masked) value
+_IS_NONE_ENUM = tuple(raw in (0xFF, 0x0F) for raw in range(256))
+_IS_NONE_TEMPERATURE = tuple(raw == 0xFF for raw in range(256))
+_IS_NONE_MERIT_B = tuple(raw == 0xF0 for raw in range(256))
+_IS_NONE_MERIT_A = tuple(raw == 0x0F for raw in range(256))
+
 
 class ToshibaAcFcuState:
     NONE_VAL = 0xFF
     NONE_VAL_HALF = 0x0F
     NONE_VAL_SIGNED = -1
-    ENCODING_STRUCT = struct.Struct("BBbBBBBBBbbBBBBBBBBB")
-
-    class AcTemperature:
-        @staticmethod
-        def from_raw(raw: int) -> t.Optional[int]:
-            raw_to_temp: t.Dict[int, t.Optional[int]] = {i: i for i in range(-128, 128)}
-            raw_to_temp.update({127: None, -128: None, ToshibaAcFcuState.NONE_VAL_SIGNED: None, 126: -1})
-            return raw_to_temp[raw]
-
-        @staticmethod
-        def to_raw(temperature: t.Optional[int]) -> int:
-            temp_to_raw: t.Dict[t.Optional[int], int] = {i: i for i in range(-128, 128)}
-            temp_to_raw.update({None: ToshibaAcFcuState.NONE_VAL_SIGNED, -1: 126})
-            return temp_to_raw[temperature]
-
-    class AcStatus:
-        @staticmethod
-        def from_raw(raw: int) -> ToshibaAcStatus:
-            return {
-                0x30: ToshibaAcStatus.ON,
-                0x31: ToshibaAcStatus.OFF,
-                0x02: ToshibaAcStatus.NONE,
-                ToshibaAcFcuState.NONE_VAL: ToshibaAcStatus.NONE,
-            }[raw]
-
-        @staticmethod
-        def to_raw(status: ToshibaAcStatus) -> int:
-            return {
-                ToshibaAcStatus.ON: 0x30,
-                ToshibaAcStatus.OFF: 0x31,
-                ToshibaAcStatus.NONE: ToshibaAcFcuState.NONE_VAL,
-            }[status]
-
-    class AcMode:
-        @staticmethod
-        def from_raw(raw: int) -> ToshibaAcMode:
-            return {
-                0x41: ToshibaAcMode.AUTO,
-                0x42: ToshibaAcMode.COOL,
-                0x43: ToshibaAcMode.HEAT,
-                0x44: ToshibaAcMode.DRY,
-                0x45: ToshibaAcMode.FAN,
-                0x00: ToshibaAcMode.NONE,
-                ToshibaAcFcuState.NONE_VAL: ToshibaAcMode.NONE,
-            }[raw]
-
-        @staticmethod
-        def to_raw(mode: ToshibaAcMode) -> int:
-            return {
-                ToshibaAcMode.AUTO: 0x41,
-                ToshibaAcMode.COOL: 0x42,
-                ToshibaAcMode.HEAT: 0x43,
-                ToshibaAcMode.DRY: 0x44,
-                ToshibaAcMode.FAN: 0x45,
-                ToshibaAcMode.NONE: ToshibaAcFcuState.NONE_VAL,
-            }[mode]
-
-    class AcFanMode:
-        @staticmethod
-        def from_raw(raw: int) -> ToshibaAcFanMode:
-            return {
-                0x41: ToshibaAcFanMode.AUTO,
-                0x31: ToshibaAcFanMode.QUIET,
-                0x32: ToshibaAcFanMode.LOW,
-                0x33: ToshibaAcFanMode.MEDIUM_LOW,
-                0x34: ToshibaAcFanMode.MEDIUM,
-                0x35: ToshibaAcFanMode.MEDIUM_HIGH,
-                0x36: ToshibaAcFanMode.HIGH,
-                0x00: ToshibaAcFanMode.NONE,
-                ToshibaAcFcuState.NONE_VAL: ToshibaAcFanMode.NONE,
-            }[raw]
-
-        @staticmethod
-        def to_raw(fan_mode: ToshibaAcFanMode) -> int:
-            return {
-                ToshibaAcFanMode.AUTO: 0x41,
-                ToshibaAcFanMode.QUIET: 0x31,
-                ToshibaAcFanMode.LOW: 0x32,
-                ToshibaAcFanMode.MEDIUM_LOW: 0x33,
-                ToshibaAcFanMode.MEDIUM: 0x34,
-                ToshibaAcFanMode.MEDIUM_HIGH: 0x35,
-                ToshibaAcFanMode.HIGH: 0x36,
-                ToshibaAcFanMode.NONE: ToshibaAcFcuState.NONE_VAL,
-            }[fan_mode]
-
-    class AcSwingMode:
-        @staticmethod
-        def from_raw(raw: int) -> ToshibaAcSwingMode:
-            return {
-                0x31: ToshibaAcSwingMode.OFF,
-                0x41: ToshibaAcSwingMode.SWING_VERTICAL,
-                0x42: ToshibaAcSwingMode.SWING_HORIZONTAL,
-                0x43: ToshibaAcSwingMode.SWING_VERTICAL_AND_HORIZONTAL,
-                0x50: ToshibaAcSwingMode.FIXED_1,
-                0x51: ToshibaAcSwingMode.FIXED_2,
-                0x52: ToshibaAcSwingMode.FIXED_3,
-                0x53: ToshibaAcSwingMode.FIXED_4,
-                0x54: ToshibaAcSwingMode.FIXED_5,
-                0x00: ToshibaAcSwingMode.NONE,
-                ToshibaAcFcuState.NONE_VAL: ToshibaAcSwingMode.NONE,
-            }[raw]
-
-        @staticmethod
-        def to_raw(swing_mode: ToshibaAcSwingMode) -> int:
-            return {
-                ToshibaAcSwingMode.OFF: 0x31,
-                ToshibaAcSwingMode.SWING_VERTICAL: 0x41,
-                ToshibaAcSwingMode.SWING_HORIZONTAL: 0x42,
-                ToshibaAcSwingMode.SWING_VERTICAL_AND_HORIZONTAL: 0x43,
-                ToshibaAcSwingMode.FIXED_1: 0x50,
-                ToshibaAcSwingMode.FIXED_2: 0x51,
-                ToshibaAcSwingMode.FIXED_3: 0x52,
-                ToshibaAcSwingMode.FIXED_4: 0x53,
-                ToshibaAcSwingMode.FIXED_5: 0x54,
-                ToshibaAcSwingMode.NONE: ToshibaAcFcuState.NONE_VAL,
-            }[swing_mode]
-
-    class AcPowerSelection:
-        @staticmethod
-        def from_raw(raw: int) -> ToshibaAcPowerSelection:
-            return {
-                0x32: ToshibaAcPowerSelection.POWER_50,
-                0x4B: ToshibaAcPowerSelection.POWER_75,
-                0x64: ToshibaAcPowerSelection.POWER_100,
-                ToshibaAcFcuState.NONE_VAL: ToshibaAcPowerSelection.NONE,
-            }[raw]
-
-        @staticmethod
-        def to_raw(power_selection: ToshibaAcPowerSelection) -> int:
-            return {
-                ToshibaAcPowerSelection.POWER_50: 0x32,
-                ToshibaAcPowerSelection.POWER_75: 0x4B,
-                ToshibaAcPowerSelection.POWER_100: 0x64,
-                ToshibaAcPowerSelection.NONE: ToshibaAcFcuState.NONE_VAL,
-            }[power_selection]
-
-    class AcMeritB:
-        @staticmethod
-        def from_raw(raw: int) -> ToshibaAcMeritB:
-            return {
-                0x02: ToshibaAcMeritB.FIREPLACE_1,
-                0x03: ToshibaAcMeritB.FIREPLACE_2,
-                0x01: ToshibaAcMeritB.OFF,  # New value reported after update, nothing found in 3.4.0 APK version
-                0x00: ToshibaAcMeritB.OFF,
-                ToshibaAcFcuState.NONE_VAL: ToshibaAcMeritB.NONE,
-                ToshibaAcFcuState.NONE_VAL_HALF: ToshibaAcMeritB.NONE,
-            }[raw]
-
-        @staticmethod
-        def to_raw(merit_b: ToshibaAcMeritB) -> int:
-            return {
-                ToshibaAcMeritB.FIREPLACE_1: 0x02,
-                ToshibaAcMeritB.FIREPLACE_2: 0x03,
-                ToshibaAcMeritB.OFF: 0x00,
-                ToshibaAcMeritB.NONE: ToshibaAcFcuState.NONE_VAL,
-            }[merit_b]
-
-    class AcMeritA:
-        @staticmethod
-        def from_raw(raw: int) -> ToshibaAcMeritA:
-            return {
-                0x01: ToshibaAcMeritA.HIGH_POWER,
-                0x02: ToshibaAcMeritA.CDU_SILENT_1,
-                0x03: ToshibaAcMeritA.ECO,
-                0x04: ToshibaAcMeritA.HEATING_8C,
-                0x05: ToshibaAcMeritA.SLEEP_CARE,
-                0x06: ToshibaAcMeritA.FLOOR,
-                0x07: ToshibaAcMeritA.COMFORT,
-                0x0A: ToshibaAcMeritA.CDU_SILENT_2,
-                0x00: ToshibaAcMeritA.OFF,
-                ToshibaAcFcuState.NONE_VAL: ToshibaAcMeritA.NONE,
-                ToshibaAcFcuState.NONE_VAL_HALF: ToshibaAcMeritA.NONE,
-            }[raw]
-
-        @staticmethod
-        def to_raw(merit_a: ToshibaAcMeritA) -> int:
-            return {
-                ToshibaAcMeritA.HIGH_POWER: 0x01,
-                ToshibaAcMeritA.CDU_SILENT_1: 0x02,
-                ToshibaAcMeritA.ECO: 0x03,
-                ToshibaAcMeritA.HEATING_8C: 0x04,
-                ToshibaAcMeritA.SLEEP_CARE: 0x05,
-                ToshibaAcMeritA.FLOOR: 0x06,
-                ToshibaAcMeritA.COMFORT: 0x07,
-                ToshibaAcMeritA.CDU_SILENT_2: 0x0A,
-                ToshibaAcMeritA.OFF: 0x00,
-                ToshibaAcMeritA.NONE: ToshibaAcFcuState.NONE_VAL,
-            }[merit_a]
-
-    class AcAirPureIon:
-        @staticmethod
-        def from_raw(raw: int) -> ToshibaAcAirPureIon:
-            return {
-                0x18: ToshibaAcAirPureIon.ON,
-                0x10: ToshibaAcAirPureIon.OFF,
-                ToshibaAcFcuState.NONE_VAL: ToshibaAcAirPureIon.NONE,
-            }[raw]
-
-        @staticmethod
-        def to_raw(air_pure_ion: ToshibaAcAirPureIon) -> int:
-            return {
-                ToshibaAcAirPureIon.ON: 0x18,
-                ToshibaAcAirPureIon.OFF: 0x10,
-                ToshibaAcAirPureIon.NONE: ToshibaAcFcuState.NONE_VAL,
-            }[air_pure_ion]
-
-    class AcSelfCleaning:
-        @staticmethod
-        def from_raw(raw: int) -> ToshibaAcSelfCleaning:
-            return {
-                0x18: ToshibaAcSelfCleaning.ON,
-                0x10: ToshibaAcSelfCleaning.OFF,
-                ToshibaAcFcuState.NONE_VAL: ToshibaAcSelfCleaning.NONE,
-            }[raw]
-
-        @staticmethod
-        def to_raw(self_cleaning: ToshibaAcSelfCleaning) -> int:
-            return {
-                ToshibaAcSelfCleaning.ON: 0x18,
-                ToshibaAcSelfCleaning.OFF: 0x10,
-                ToshibaAcSelfCleaning.NONE: ToshibaAcFcuState.NONE_VAL,
-            }[self_cleaning]
+
+    # State is kept exactly as it is sent over the wire, one byte per field except Merit B/A
+    # which share a single byte (Merit B in the high nibble, Merit A in the low nibble).
+    STATE_SIZE = 19
+    STATUS_OFFSET = 0
+    MODE_OFFSET = 1
+    TEMPERATURE_OFFSET = 2
+    FAN_MODE_OFFSET = 3
+    SWING_MODE_OFFSET = 4
+    POWER_SELECTION_OFFSET = 5
+    MERIT_OFFSET = 6
+    AIR_PURE_ION_OFFSET = 7
+    INDOOR_TEMPERATURE_OFFSET = 8
+    OUTDOOR_TEMPERATURE_OFFSET = 9
+    SELF_CLEANING_OFFSET = 14
+
+    # (field name, byte offset, bit mask within byte, NONE sentinel table) in field bit order
+    FIELDS: t.Tuple[t.Tuple[str, int, int, t.Tuple[bool, ...]], ...] = (
+        ("ac_status", STATUS_OFFSET, 0xFF, _IS_NONE_ENUM),
+        ("ac_mode", MODE_OFFSET, 0xFF, _IS_NONE_ENUM),
+        ("ac_temperature", TEMPERATURE_OFFSET, 0xFF, _IS_NONE_TEMPERATURE),
+        ("ac_fan_mode", FAN_MODE_OFFSET, 0xFF, _IS_NONE_ENUM),
+        ("ac_swing_mode", SWING_MODE_OFFSET, 0xFF, _IS_NONE_ENUM),
+        ("ac_power_selection", POWER_SELECTION_OFFSET, 0xFF, _IS_NONE_ENUM),
+        ("ac_merit_b", MERIT_OFFSET, 0xF0, _IS_NONE_MERIT_B),
+        ("ac_merit_a", MERIT_OFFSET, 0x0F, _IS_NONE_MERIT_A),
+        ("ac_air_pure_ion", AIR_PURE_ION_OFFSET, 0xFF, _IS_NONE_ENUM),
+        ("ac_indoor_temperature", INDOOR_TEMPERATURE_OFFSET, 0xFF, _IS_NONE_TEMPERATURE),
+        ("ac_outdoor_temperature", OUTDOOR_TEMPERATURE_OFFSET, 0xFF, _IS_NONE_TEMPERATURE),
+        ("ac_self_cleaning", SELF_CLEANING_OFFSET, 0xFF, _IS_NONE_ENUM),
+    )
+    INDOOR_TEMPERATURE_BIT = 1 << 9
+    OUTDOOR_TEMPERATURE_BIT = 1 << 10
+
+    AcTemperature = ToshibaAcTemperatureCodec(
+        {127: None, -128: None, NONE_VAL_SIGNED: None, 126: -1},
+        {None: NONE_VAL_SIGNED, -1: 126},
+    )
+
+    AcStatus = ToshibaAcEnumCodec(
+        {
+            0x30: ToshibaAcStatus.ON,
+            0x31: ToshibaAcStatus.OFF,
+            0x02: ToshibaAcStatus.NONE,
+            NONE_VAL: ToshibaAcStatus.NONE,
+        },
+        {
+            ToshibaAcStatus.ON: 0x30,
+            ToshibaAcStatus.OFF: 0x31,
+            ToshibaAcStatus.NONE: NONE_VAL,
+        },
+    )
+
+    AcMode = ToshibaAcEnumCodec(
+        {
+            0x41: ToshibaAcMode.AUTO,
+            0x42: ToshibaAcMode.COOL,
+            0x43: ToshibaAcMode.HEAT,
+            0x44: ToshibaAcMode.DRY,
+            0x45: ToshibaAcMode.FAN,
+            0x00: ToshibaAcMode.NONE,
+            NONE_VAL: ToshibaAcMode.NONE,
+        },
+        {
+            ToshibaAcMode.AUTO: 0x41,
+            ToshibaAcMode.COOL: 0x42,
+            ToshibaAcMode.HEAT: 0x43,
+            ToshibaAcMode.DRY: 0x44,
+            ToshibaAcMode.FAN: 0x45,
+            ToshibaAcMode.NONE: NONE_VAL,
+        },
+    )
+
+    AcFanMode = ToshibaAcEnumCodec(
+        {
+            0x41: ToshibaAcFanMode.AUTO,
+            0x31: ToshibaAcFanMode.QUIET,
+            0x32: ToshibaAcFanMode.LOW,
+            0x33: ToshibaAcFanMode.MEDIUM_LOW,
+            0x34: ToshibaAcFanMode.MEDIUM,
+            0x35: ToshibaAcFanMode.MEDIUM_HIGH,
+            0x36: ToshibaAcFanMode.HIGH,
+            0x00: ToshibaAcFanMode.NONE,
+            NONE_VAL: ToshibaAcFanMode.NONE,
+        },
+        {
+            ToshibaAcFanMode.AUTO: 0x41,
+            ToshibaAcFanMode.QUIET: 0x31,
+            ToshibaAcFanMode.LOW: 0x32,
+            ToshibaAcFanMode.MEDIUM_LOW: 0x33,
+            ToshibaAcFanMode.MEDIUM: 0x34,
+            ToshibaAcFanMode.MEDIUM_HIGH: 0x35,
+            ToshibaAcFanMode.HIGH: 0x36,
+            ToshibaAcFanMode.NONE: NONE_VAL,
+        },
+    )
+
+    AcSwingMode = ToshibaAcEnumCodec(
+        {
+            0x31: ToshibaAcSwingMode.OFF,
+            0x41: ToshibaAcSwingMode.SWING_VERTICAL,
+            0x42: ToshibaAcSwingMode.SWING_HORIZONTAL,
+            0x43: ToshibaAcSwingMode.SWING_VERTICAL_AND_HORIZONTAL,
+            0x50: ToshibaAcSwingMode.FIXED_1,
+            0x51: ToshibaAcSwingMode.FIXED_2,
+            0x52: ToshibaAcSwingMode.FIXED_3,
+            0x53: ToshibaAcSwingMode.FIXED_4,
+            0x54: ToshibaAcSwingMode.FIXED_5,
+            0x00: ToshibaAcSwingMode.NONE,
+            NONE_VAL: ToshibaAcSwingMode.NONE,
+        },
+        {
+            ToshibaAcSwingMode.OFF: 0x31,
+            ToshibaAcSwingMode.SWING_VERTICAL: 0x41,
+            ToshibaAcSwingMode.SWING_HORIZONTAL: 0x42,
+            ToshibaAcSwingMode.SWING_VERTICAL_AND_HORIZONTAL: 0x43,
+            ToshibaAcSwingMode.FIXED_1: 0x50,
+            ToshibaAcSwingMode.FIXED_2: 0x51,
+            ToshibaAcSwingMode.FIXED_3: 0x52,
+            ToshibaAcSwingMode.FIXED_4: 0x53,
+            ToshibaAcSwingMode.FIXED_5: 0x54,
+            ToshibaAcSwingMode.NONE: NONE_VAL,
+        },
+    )
+
+    AcPowerSelection = ToshibaAcEnumCodec(
+        {
+            0x32: ToshibaAcPowerSelection.POWER_50,
+            0x4B: ToshibaAcPowerSelection.POWER_75,
+            0x64: ToshibaAcPowerSelection.POWER_100,
+            NONE_VAL: ToshibaAcPowerSelection.NONE,
+        },
+        {
+            ToshibaAcPowerSelection.POWER_50: 0x32,
+            ToshibaAcPowerSelection.POWER_75: 0x4B,
+            ToshibaAcPowerSelection.POWER_100: 0x64,
+            ToshibaAcPowerSelection.NONE: NONE_VAL,
+        },
+    )
+
+    AcMeritB = ToshibaAcEnumCodec(
+        {
+            0x02: ToshibaAcMeritB.FIREPLACE_1,
+            0x03: ToshibaAcMeritB.FIREPLACE_2,
+            0x01: ToshibaAcMeritB.OFF,  # New value reported after update, nothing found in 3.4.0 APK version
+            0x00: ToshibaAcMeritB.OFF,
+            NONE_VAL: ToshibaAcMeritB.NONE,
+            NONE_VAL_HALF: ToshibaAcMeritB.NONE,
+        },
+        {
+            ToshibaAcMeritB.FIREPLACE_1: 0x02,
+            ToshibaAcMeritB.FIREPLACE_2: 0x03,
+            ToshibaAcMeritB.OFF: 0x00,
+            ToshibaAcMeritB.NONE: NONE_VAL,
+        },
+    )
+
+    AcMeritA = ToshibaAcEnumCodec(
+        {
+            0x01: ToshibaAcMeritA.HIGH_POWER,
+            0x02: ToshibaAcMeritA.CDU_SILENT_1,
+            0x03: ToshibaAcMeritA.ECO,
+            0x04: ToshibaAcMeritA.HEATING_8C,
+            0x05: ToshibaAcMeritA.SLEEP_CARE,
+            0x06: ToshibaAcMeritA.FLOOR,
+            0x07: ToshibaAcMeritA.COMFORT,
+            0x0A: ToshibaAcMeritA.CDU_SILENT_2,
+            0x00: ToshibaAcMeritA.OFF,
+            NONE_VAL: ToshibaAcMeritA.NONE,
+            NONE_VAL_HALF: ToshibaAcMeritA.NONE,
+        },
+        {
+            ToshibaAcMeritA.HIGH_POWER: 0x01,
+            ToshibaAcMeritA.CDU_SILENT_1: 0x02,
+            ToshibaAcMeritA.ECO: 0x03,
+            ToshibaAcMeritA.HEATING_8C: 0x04,
+            ToshibaAcMeritA.SLEEP_CARE: 0x05,
+            ToshibaAcMeritA.FLOOR: 0x06,
+            ToshibaAcMeritA.COMFORT: 0x07,
+            ToshibaAcMeritA.CDU_SILENT_2: 0x0A,
+            ToshibaAcMeritA.OFF: 0x00,
+            ToshibaAcMeritA.NONE: NONE_VAL,
+        },
+    )
+
+    AcAirPureIon = ToshibaAcEnumCodec(
+        {
+            0x18: ToshibaAcAirPureIon.ON,
+            0x10: ToshibaAcAirPureIon.OFF,
+            NONE_VAL: ToshibaAcAirPureIon.NONE,
+        },
+        {
+            ToshibaAcAirPureIon.ON: 0x18,
+            ToshibaAcAirPureIon.OFF: 0x10,
+            ToshibaAcAirPureIon.NONE: NONE_VAL,
+        },
+    )
+
+    AcSelfCleaning = ToshibaAcEnumCodec(
+        {
+            0x18: ToshibaAcSelfCleaning.ON,
+            0x10: ToshibaAcSelfCleaning.OFF,
+            NONE_VAL: ToshibaAcSelfCleaning.NONE,
+        },
+        {
+            ToshibaAcSelfCleaning.ON: 0x18,
+            ToshibaAcSelfCleaning.OFF: 0x10,
+            ToshibaAcSelfCleaning.NONE: NONE_VAL,
+        },
+    )
+
+    __slots__ = ("_data",)
 
     @classmethod
     def from_hex_state(cls, hex_state: str) -> ToshibaAcFcuState:
@@ -263,220 +261,189 @@ class ToshibaAcFcuState:
         state.decode(hex_state)
         return state
 
+    @classmethod
+    def from_raw(cls, raw: bytes) -> ToshibaAcFcuState:
+        if len(raw) != cls.STATE_SIZE:
+            raise ValueError(f"AC state has to be {cls.STATE_SIZE} bytes long, got {len(raw)}")
+
+        state = cls()
+        state._data[:] = raw
+        return state
+
     def __init__(self) -> None:
-        self._ac_status = ToshibaAcFcuState.NONE_VAL
-        self._ac_mode = ToshibaAcFcuState.NONE_VAL
-        self._ac_temperature = ToshibaAcFcuState.NONE_VAL_SIGNED
-        self._ac_fan_mode = ToshibaAcFcuState.NONE_VAL
-        self._ac_swing_mode = ToshibaAcFcuState.NONE_VAL
-        self._ac_power_selection = ToshibaAcFcuState.NONE_VAL
-        self._ac_merit_b = ToshibaAcFcuState.NONE_VAL
-        self._ac_merit_a = ToshibaAcFcuState.NONE_VAL
-        self._ac_air_pure_ion = ToshibaAcFcuState.NONE_VAL
-        self._ac_indoor_temperature = ToshibaAcFcuState.NONE_VAL_SIGNED
-        self._ac_outdoor_temperature = ToshibaAcFcuState.NONE_VAL_SIGNED
-        self._ac_self_cleaning = ToshibaAcFcuState.NONE_VAL
+        self._data = bytearray(b"\xff" * self.STATE_SIZE)
+
+    def copy(self) -> ToshibaAcFcuState:
+        state = ToshibaAcFcuState()
+        state._data[:] = self._data
+        return state
+
+    @property
+    def raw(self) -> memoryview:
+        return memoryview(self._data).toreadonly()
 
     def encode(self) -> str:
-        encoded = self.ENCODING_STRUCT.pack(
-            self._ac_status,
-            self._ac_mode,
-            self._ac_temperature,
-            self._ac_fan_mode,
-            self._ac_swing_mode,
-            self._ac_power_selection,
-            self._ac_merit_b,
-            self._ac_merit_a,
-            self._ac_air_pure_ion,
-            self._ac_indoor_temperature,
-            self._ac_outdoor_temperature,
-            ToshibaAcFcuState.NONE_VAL,
-            ToshibaAcFcuState.NONE_VAL,
-            ToshibaAcFcuState.NONE_VAL,
-            ToshibaAcFcuState.NONE_VAL,
-            self._ac_self_cleaning,
-            ToshibaAcFcuState.NONE_VAL,
-            ToshibaAcFcuState.NONE_VAL,
-            ToshibaAcFcuState.NONE_VAL,
-            ToshibaAcFcuState.NONE_VAL,
-        ).hex()
-        return (
-            encoded[:12] + encoded[13] + encoded[15] + encoded[16:]
-        )  # Merit A/B features are encoded using half bytes but our packing added them as bytes
+        return self._data.hex()
 
     def decode(self, hex_state: str) -> None:
-        extended_hex_state = (
-            hex_state[:12] + "0" + hex_state[12] + "0" + hex_state[13:38]
-        )  # Merit A/B features are encoded using half bytes but our unpacking expect them as bytes.
-        # We also ignore any extra bytes if present.
-        data = self.ENCODING_STRUCT.unpack(bytes.fromhex(extended_hex_state))
-        (
-            self._ac_status,
-            self._ac_mode,
-            self._ac_temperature,
-            self._ac_fan_mode,
-            self._ac_swing_mode,
-            self._ac_power_selection,
-            self._ac_merit_b,
-            self._ac_merit_a,
-            self._ac_air_pure_ion,
-            self._ac_indoor_temperature,
-            self._ac_outdoor_temperature,
-            _,
-            _,
-            _,
-            _,
-            self._ac_self_cleaning,
-            *_,
-        ) = data
-
-    def update(self, hex_state: str) -> bool:
-        state_update = ToshibaAcFcuState.from_hex_state(hex_state)
-
-        changed = False
-
-        enum_states = [
-            "_ac_status",
-            "_ac_mode",
-            "_ac_fan_mode",
-            "_ac_swing_mode",
-            "_ac_power_selection",
-            "_ac_merit_b",
-            "_ac_merit_a",
-            "_ac_air_pure_ion",
-            "_ac_self_cleaning",
-        ]
-
-        temperature_states = [
-            "_ac_temperature",
-            "_ac_indoor_temperature",
-            "_ac_outdoor_temperature",
-        ]
-
-        for enum_state in enum_states:
-            updated_state = getattr(state_update, enum_state)
-            current_state = getattr(self, enum_state)
-            if updated_state not in [ToshibaAcFcuState.NONE_VAL, ToshibaAcFcuState.NONE_VAL_HALF, current_state]:
-                setattr(self, enum_state, updated_state)
-                changed = True
-
-        for temperature_state in temperature_states:
-            updated_state = getattr(state_update, temperature_state)
-            current_state = getattr(self, temperature_state)
-            if updated_state not in [ToshibaAcFcuState.NONE_VAL_SIGNED, current_state]:
-                setattr(self, temperature_state, updated_state)
-                changed = True
-
-        return changed
-
-    def update_from_hbt(self, hb_data: t.Any) -> bool:
-        changed = False
-
-        if "iTemp" in hb_data and hb_data["iTemp"] != self._ac_indoor_temperature:
-            self._ac_indoor_temperature = hb_data["iTemp"]
-            changed = True
-
-        if "oTemp" in hb_data and hb_data["oTemp"] != self._ac_outdoor_temperature:
-            self._ac_outdoor_temperature = hb_data["oTemp"]
-            changed = True
-
-        return changed
+        # We ignore any extra bytes if present. Bytes 10-13 and 15-18 have unknown meaning,
+        # they are never kept from received state so we never send them back to the AC.
+        data = bytes.fromhex(hex_state[: self.STATE_SIZE * 2])
+
+        if len(data) != self.STATE_SIZE:
+            raise ValueError(f"AC state too short: {hex_state}")
+
+        self._data[:] = data
+        self._data[10:14] = self._data[15:19] = _UNKNOWN_BYTES
+
+    @staticmethod
+    def changed_fields(changed_mask: int) -> t.FrozenSet[str]:
+        try:
+            return _CHANGED_FIELDS[changed_mask]
+        except KeyError:
+            fields = frozenset(
+                field[0] for bit, field in enumerate(ToshibaAcFcuState.FIELDS) if changed_mask & (1 << bit)
+            )
+            _CHANGED_FIELDS[changed_mask] = fields
+            return fields
+
+    def update_mask(self, hex_state: str) -> int:
+        update = bytes.fromhex(hex_state[: self.STATE_SIZE * 2])
+
+        if len(update) != self.STATE_SIZE:
+            raise ValueError(f"AC state too short: {hex_state}")
+
+        data = self._data
+        changed_mask = 0
+        bit = 1
+
+        for _, offset, mask, is_none in self.FIELDS:
+            updated_state = update[offset] & mask
+            if not is_none[updated_state] and updated_state != data[offset] & mask:
+                data[offset] = data[offset] & ~mask | updated_state
+                changed_mask |= bit
+            bit <<= 1
+
+        return changed_mask
+
+    def update(self, hex_state: str) -> t.FrozenSet[str]:
+        return self.changed_fields(self.update_mask(hex_state))
+
+    def update_from_hbt(self, hb_data: t.Any) -> t.FrozenSet[str]:
+        return self.update_temperatures(hb_data.get("iTemp"), hb_data.get("oTemp"))
+
+    def update_temperatures(self, indoor: t.Optional[int], outdoor: t.Optional[int]) -> t.FrozenSet[str]:
+        # Temperatures reported by heartbeat, None when missing in it
+        data = self._data
+        changed_mask = 0
+
+        if indoor is not None and indoor & 0xFF != data[self.INDOOR_TEMPERATURE_OFFSET]:
+            data[self.INDOOR_TEMPERATURE_OFFSET] = indoor & 0xFF
+            changed_mask |= self.INDOOR_TEMPERATURE_BIT
+
+        if outdoor is not None and outdoor & 0xFF != data[self.OUTDOOR_TEMPERATURE_OFFSET]:
+            data[self.OUTDOOR_TEMPERATURE_OFFSET] = outdoor & 0xFF
+            changed_mask |= self.OUTDOOR_TEMPERATURE_BIT
+
+        return self.changed_fields(changed_mask)
 
     @property
     def ac_status(self) -> ToshibaAcStatus:
-        return ToshibaAcFcuState.AcStatus.from_raw(self._ac_status)
+        return ToshibaAcFcuState.AcStatus.from_raw(self._data[self.STATUS_OFFSET])
 
     @ac_status.setter
     def ac_status(self, val: ToshibaAcStatus) -> None:
-        self._ac_status = ToshibaAcFcuState.AcStatus.to_raw(val)
+        self._data[self.STATUS_OFFSET] = ToshibaAcFcuState.AcStatus.to_raw(val)
 
     @property
     def ac_mode(self) -> ToshibaAcMode:
-        return ToshibaAcFcuState.AcMode.from_raw(self._ac_mode)
+        return ToshibaAcFcuState.AcMode.from_raw(self._data[self.MODE_OFFSET])
 
     @ac_mode.setter
     def ac_mode(self, val: ToshibaAcMode) -> None:
-        self._ac_mode = ToshibaAcFcuState.AcMode.to_raw(val)
+        self._data[self.MODE_OFFSET] = ToshibaAcFcuState.AcMode.to_raw(val)
 
     @property
     def ac_temperature(self) -> t.Optional[int]:
-        return ToshibaAcFcuState.AcTemperature.from_raw(self._ac_temperature)
+        return ToshibaAcFcuState.AcTemperature.from_raw(self._data[self.TEMPERATURE_OFFSET])
 
     @ac_temperature.setter
     def ac_temperature(self, val: t.Optional[int]) -> None:
-        self._ac_temperature = ToshibaAcFcuState.AcTemperature.to_raw(val)
+        self._data[self.TEMPERATURE_OFFSET] = ToshibaAcFcuState.AcTemperature.to_raw(val) & 0xFF
 
     @property
     def ac_fan_mode(self) -> ToshibaAcFanMode:
-        return ToshibaAcFcuState.AcFanMode.from_raw(self._ac_fan_mode)
+        return ToshibaAcFcuState.AcFanMode.from_raw(self._data[self.FAN_MODE_OFFSET])
 
     @ac_fan_mode.setter
     def ac_fan_mode(self, val: ToshibaAcFanMode) -> None:
-        self._ac_fan_mode = ToshibaAcFcuState.AcFanMode.to_raw(val)
+        self._data[self.FAN_MODE_OFFSET] = ToshibaAcFcuState.AcFanMode.to_raw(val)
 
     @property
     def ac_swing_mode(self) -> ToshibaAcSwingMode:
-        return ToshibaAcFcuState.AcSwingMode.from_raw(self._ac_swing_mode)
+        return ToshibaAcFcuState.AcSwingMode.from_raw(self._data[self.SWING_MODE_OFFSET])
 
     @ac_swing_mode.setter
     def ac_swing_mode(self, val: ToshibaAcSwingMode) -> None:
-        self._ac_swing_mode = ToshibaAcFcuState.AcSwingMode.to_raw(val)
+        self._data[self.SWING_MODE_OFFSET] = ToshibaAcFcuState.AcSwingMode.to_raw(val)
 
     @property
     def ac_power_selection(self) -> ToshibaAcPowerSelection:
-        return ToshibaAcFcuState.AcPowerSelection.from_raw(self._ac_power_selection)
+        return ToshibaAcFcuState.AcPowerSelection.from_raw(self._data[self.POWER_SELECTION_OFFSET])
 
     @ac_power_selection.setter
     def ac_power_selection(self, val: ToshibaAcPowerSelection) -> None:
-        self._ac_power_selection = ToshibaAcFcuState.AcPowerSelection.to_raw(val)
+        self._data[self.POWER_SELECTION_OFFSET] = ToshibaAcFcuState.AcPowerSelection.to_raw(val)
 
     @property
     def ac_merit_b(self) -> ToshibaAcMeritB:
-        return ToshibaAcFcuState.AcMeritB.from_raw(self._ac_merit_b)
+        return ToshibaAcFcuState.AcMeritB.from_raw(self._data[self.MERIT_OFFSET] >> 4)
 
     @ac_merit_b.setter
     def ac_merit_b(self, val: ToshibaAcMeritB) -> None:
-        self._ac_merit_b = ToshibaAcFcuState.AcMeritB.to_raw(val)
+        raw = ToshibaAcFcuState.AcMeritB.to_raw(val)
+        self._data[self.MERIT_OFFSET] = (raw & 0x0F) << 4 | self._data[self.MERIT_OFFSET] & 0x0F
 
     @property
     def ac_merit_a(self) -> ToshibaAcMeritA:
-        return ToshibaAcFcuState.AcMeritA.from_raw(self._ac_merit_a)
+        return ToshibaAcFcuState.AcMeritA.from_raw(self._data[self.MERIT_OFFSET] & 0x0F)
 
     @ac_merit_a.setter
     def ac_merit_a(self, val: ToshibaAcMeritA) -> None:
-        self._ac_merit_a = ToshibaAcFcuState.AcMeritA.to_raw(val)
+        raw = ToshibaAcFcuState.AcMeritA.to_raw(val)
+        self._data[self.MERIT_OFFSET] = self._data[self.MERIT_OFFSET] & 0xF0 | raw & 0x0F
 
     @property
     def ac_air_pure_ion(self) -> ToshibaAcAirPureIon:
-        return ToshibaAcFcuState.AcAirPureIon.from_raw(self._ac_air_pure_ion)
+        return ToshibaAcFcuState.AcAirPureIon.from_raw(self._data[self.AIR_PURE_ION_OFFSET])
 
     @ac_air_pure_ion.setter
     def ac_air_pure_ion(self, val: ToshibaAcAirPureIon) -> None:
-        self._ac_air_pure_ion = ToshibaAcFcuState.AcAirPureIon.to_raw(val)
+        self._data[self.AIR_PURE_ION_OFFSET] = ToshibaAcFcuState.AcAirPureIon.to_raw(val)
 
     @property
     def ac_indoor_temperature(self) -> t.Optional[int]:
-        return ToshibaAcFcuState.AcTemperature.from_raw(self._ac_indoor_temperature)
+        return ToshibaAcFcuState.AcTemperature.from_raw(self._data[self.INDOOR_TEMPERATURE_OFFSET])
 
     @ac_indoor_temperature.setter
     def ac_indoor_temperature(self, val: t.Optional[int]) -> None:
-        self._ac_indoor_temperature = ToshibaAcFcuState.AcTemperature.to_raw(val)
+        self._data[self.INDOOR_TEMPERATURE_OFFSET] = ToshibaAcFcuState.AcTemperature.to_raw(val) & 0xFF
 
     @property
     def ac_outdoor_temperature(self) -> t.Optional[int]:
-        return ToshibaAcFcuState.AcTemperature.from_raw(self._ac_outdoor_temperature)
+        return ToshibaAcFcuState.AcTemperature.from_raw(self._data[self.OUTDOOR_TEMPERATURE_OFFSET])
 
     @ac_outdoor_temperature.setter
     def ac_outdoor_temperature(self, val: t.Optional[int]) -> None:
-        self._ac_outdoor_temperature = ToshibaAcFcuState.AcTemperature.to_raw(val)
+        self._data[self.OUTDOOR_TEMPERATURE_OFFSET] = ToshibaAcFcuState.AcTemperature.to_raw(val) & 0xFF
 
     @property
     def ac_self_cleaning(self) -> ToshibaAcSelfCleaning:
-        return ToshibaAcFcuState.AcSelfCleaning.from_raw(self._ac_self_cleaning)
+        return ToshibaAcFcuState.AcSelfCleaning.from_raw(self._data[self.SELF_CLEANING_OFFSET])
 
     @ac_self_cleaning.setter
     def ac_self_cleaning(self, val: ToshibaAcSelfCleaning) -> None:
-        self._ac_self_cleaning = ToshibaAcFcuState.AcSelfCleaning.to_raw(val)
+        self._data[self.SELF_CLEANING_OFFSET] = ToshibaAcFcuState.AcSelfCleaning.to_raw(val)
 
     def __str__(self) -> str:
         res = f"AcStatus: {self.ac_status.name}"
@@ -493,3 +460,7 @@ class ToshibaAcFcuState:
         res += f", AcSelfCleaning: {self.ac_self_cleaning.name}"
 
         return res
+
+
+# Changed field sets are shared between all states, there are only few distinct combinations in practice
+_CHANGED_FIELDS: t.Dict[int, t.FrozenSet[str]] = {0: frozenset()}
@@ -14,10 +14,12 @@
 
 from __future__ import annotations
 
+import itertools
 import logging
-import struct
 import typing as t
+from enum import Enum
 
+from toshiba_ac.device.codec import merit_bits_from_hexstring
 from toshiba_ac.device.properties import (
     ToshibaAcAirPureIon,
     ToshibaAcFanMode,
@@ -33,105 +35,354 @@ from toshiba_ac.utils import pretty_enum_name
 
 logger = logging.getLogger(__name__)
 
+E = t.TypeVar("E", bound=Enum)
+
+_PROPERTY_ENUMS: t.Tuple[t.Type[Enum], ...] = (
+    ToshibaAcStatus,
+    ToshibaAcMode,
+    ToshibaAcFanMode,
+    ToshibaAcSwingMode,
+    ToshibaAcPowerSelection,
+    ToshibaAcMeritB,
+    ToshibaAcMeritA,
+    ToshibaAcAirPureIon,
+    ToshibaAcSelfCleaning,
+)
+# (member, bit) pairs of every property enum in definition order, iterating enum class itself is slow. Bits are
+# unique across all enums, so members of other enums are never reported as contained in a set.
+_MEMBER_BITS: t.Dict[t.Type[Enum], t.Tuple[t.Tuple[Enum, int], ...]] = {
+    enum: tuple((member, 1 << index) for index, member in enumerate(enum, start))
+    for enum, start in zip(_PROPERTY_ENUMS, itertools.accumulate((len(enum) for enum in _PROPERTY_ENUMS), initial=0))
+}
+
+# Same by enum name and member value, so members are found by what they are and not by object identity, e.g. after
+# the enums module was reloaded. Enum.__hash__ is implemented in Python, member values hash in C.
+_BITS: t.Dict[str, t.Dict[t.Any, int]] = {
+    enum.__name__: {member._value_: bit for member, bit in member_bits} for enum, member_bits in _MEMBER_BITS.items()
+}
+_MEMBERS: t.Dict[t.Type[Enum], t.Tuple[Enum, ...]] = {
+    enum: tuple(member for member, _ in member_bits) for enum, member_bits in _MEMBER_BITS.items()
+}
+
+
+def _all_members(enum: t.Type[E]) -> t.Tuple[E, ...]:
+    return t.cast(t.Tuple[E, ...], _MEMBERS[enum])
+
+
+class ToshibaAcFeatureSet(t.Sequence[E]):
+    # Immutable set of enum members kept as integer bitmask, so membership test, intersection and masking are
+    # single integer operations. It is also a sequence of members in the order they were given (repeated members
+    # are dropped), so it can be indexed and compares equal to a list or tuple of the same members in the same
+    # order. Set operations keep order of the left operand. Hot paths combine bits() of requested values and
+    # check them against mask with single &.
+    __slots__ = ("enum", "mask", "_members", "_bits")
+
+    def __init__(self, enum: t.Type[E], members: t.Tuple[E, ...], bits: t.Tuple[int, ...]) -> None:
+        # Use of() to create sets, bits are bits of members in the same order
+        self.enum = enum
+        self.mask = sum(bits)
+        self._members = members
+        self._bits = bits
+
+    @classmethod
+    def of(cls, enum: t.Type[E], members: t.Iterable[E]) -> ToshibaAcFeatureSet[E]:
+        # Plain type checks, isinstance() goes through ABC machinery of Sequence and slows parsing down
+        if type(members) is cls:
+            return t.cast(ToshibaAcFeatureSet[E], members)
+
+        enum_bits = _BITS[enum.__name__]
+        mask = 0
+        unique_members = []
+        bits = []
+
+        for member in members:
+            if type(member) is not enum:
+                raise ValueError(f"{member!r} is not a member of {enum.__name__}")
+
+            bit = enum_bits[member._value_]
+
+            if not mask & bit:
+                mask |= bit
+                unique_members.append(member)
+                bits.append(bit)
+
+        return cls(enum, tuple(unique_members), tuple(bits))
+
+    def _filter(self, mask: int) -> ToshibaAcFeatureSet[E]:
+        # Members within mask in the same order
+        if self.mask & mask == self.mask:
+            return self
+
+        pairs = [(member, bit) for member, bit in zip(self._members, self._bits) if mask & bit]
+
+        return ToshibaAcFeatureSet(self.enum, tuple(member for member, _ in pairs), tuple(bit for _, bit in pairs))
+
+    @staticmethod
+    def bits(*members: t.Any) -> int:
+        # Combined bits of given property enum members, values which are not members have no bit
+        mask = 0
+
+        for member in members:
+            try:
+                mask |= _BITS[type(member).__name__][member._value_]
+            except (KeyError, AttributeError):
+                pass
+
+        return mask
+
+    @property
+    def members(self) -> t.Tuple[E, ...]:
+        return self._members
+
+    def __contains__(self, member: object) -> bool:
+        try:
+            return self.mask & _BITS[type(member).__name__][member._value_] != 0  # type: ignore[attr-defined]
+        except (KeyError, AttributeError):
+            return False
+
+    def __iter__(self) -> t.Iterator[E]:
+        return iter(self._members)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __bool__(self) -> bool:
+        return bool(self.mask)
+
+    @t.overload
+    def __getitem__(self, index: int) -> E: ...
+
+    @t.overload
+    def __getitem__(self, index: slice) -> t.Sequence[E]: ...
+
+    def __getitem__(self, index: t.Union[int, slice]) -> t.Union[E, t.Sequence[E]]:
+        return self._members[index]
+
+    def __and__(self, other: ToshibaAcFeatureSet[E]) -> ToshibaAcFeatureSet[E]:
+        return self._filter(other.mask)
+
+    def __or__(self, other: ToshibaAcFeatureSet[E]) -> ToshibaAcFeatureSet[E]:
+        added = other._filter(~self.mask)
+
+        if not added:
+            return self
+
+        return ToshibaAcFeatureSet(self.enum, self._members + added._members, self._bits + added._bits)
+
+    def __sub__(self, other: ToshibaAcFeatureSet[E]) -> ToshibaAcFeatureSet[E]:
+        return self._filter(~other.mask)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ToshibaAcFeatureSet):
+            return self.enum is other.enum and self._bits == other._bits
+
+        if isinstance(other, (list, tuple)):
+            return self._members == tuple(other)
+
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        # Same as hash of tuple of the members, which compares equal
+        return hash(self._members)
+
+    def as_list(self) -> t.List[E]:
+        return list(self._members)
+
+    def as_set(self) -> t.Set[E]:
+        return set(self._members)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.enum.__name__}, {{{', '.join(member.name for member in self)}}})"
+
+
+# Interned features by (merit feature, model id) and by content, fleets have only a handful of distinct ones
+_FEATURES_BY_MERIT: t.Dict[t.Tuple[str, str], ToshibaAcFeatures] = {}
+_FEATURES_BY_CONTENT: t.Dict[t.Tuple[t.Any, ...], ToshibaAcFeatures] = {}
+_MAX_INTERNED_FEATURES = 1024
+
 
 class ToshibaAcFeatures:
-    MERIT_BITS_STRUCT = struct.Struct("????????????????")
-
-    DISABLED_AC_MERIT_B_FOR_MODE: t.Dict[ToshibaAcMode, t.List[ToshibaAcMeritB]] = {
-        ToshibaAcMode.AUTO: [
-            ToshibaAcMeritB.FIREPLACE_1,
-            ToshibaAcMeritB.FIREPLACE_2,
-        ],
-        ToshibaAcMode.COOL: [
-            ToshibaAcMeritB.FIREPLACE_1,
-            ToshibaAcMeritB.FIREPLACE_2,
-        ],
-        ToshibaAcMode.DRY: [
-            ToshibaAcMeritB.FIREPLACE_1,
-            ToshibaAcMeritB.FIREPLACE_2,
-        ],
-        ToshibaAcMode.HEAT: [],
-        ToshibaAcMode.FAN: [
-            ToshibaAcMeritB.FIREPLACE_1,
-            ToshibaAcMeritB.FIREPLACE_2,
-        ],
+    # Immutable, supported values are kept in bitmask sets. Instances created by from_merit_string_and_model() and
+    # from_dict() are interned, so devices with the same features share one instance and its per AC mode views,
+    # which are built once on first use.
+    __slots__ = (
+        "_ac_status",
+        "_ac_mode",
+        "_ac_fan_mode",
+        "_ac_swing_mode",
+        "_ac_power_selection",
+        "_ac_merit_b",
+        "_ac_merit_a",
+        "_ac_air_pure_ion",
+        "_ac_self_cleaning",
+        "_ac_energy_report",
+        "_key",
+        "_mask",
+        "_for_ac_mode",
+    )
+
+    DISABLED_AC_MERIT_B_FOR_MODE: t.Dict[ToshibaAcMode, ToshibaAcFeatureSet[ToshibaAcMeritB]] = {
+        ToshibaAcMode.AUTO: ToshibaAcFeatureSet.of(
+            ToshibaAcMeritB,
+            [
+                ToshibaAcMeritB.FIREPLACE_1,
+                ToshibaAcMeritB.FIREPLACE_2,
+            ],
+        ),
+        ToshibaAcMode.COOL: ToshibaAcFeatureSet.of(
+            ToshibaAcMeritB,
+            [
+                ToshibaAcMeritB.FIREPLACE_1,
+                ToshibaAcMeritB.FIREPLACE_2,
+            ],
+        ),
+        ToshibaAcMode.DRY: ToshibaAcFeatureSet.of(
+            ToshibaAcMeritB,
+            [
+                ToshibaAcMeritB.FIREPLACE_1,
+                ToshibaAcMeritB.FIREPLACE_2,
+            ],
+        ),
+        ToshibaAcMode.HEAT: ToshibaAcFeatureSet.of(ToshibaAcMeritB, []),
+        ToshibaAcMode.FAN: ToshibaAcFeatureSet.of(
+            ToshibaAcMeritB,
+            [
+                ToshibaAcMeritB.FIREPLACE_1,
+                ToshibaAcMeritB.FIREPLACE_2,
+            ],
+        ),
     }
 
-    DISABLED_AC_MERIT_A_FOR_MODE: t.Dict[ToshibaAcMode, t.List[ToshibaAcMeritA]] = {
-        ToshibaAcMode.AUTO: [
-            ToshibaAcMeritA.HEATING_8C,
-            ToshibaAcMeritA.SLEEP_CARE,
-            ToshibaAcMeritA.FLOOR,
-        ],
-        ToshibaAcMode.COOL: [
-            ToshibaAcMeritA.HEATING_8C,
-            ToshibaAcMeritA.SLEEP_CARE,
-            ToshibaAcMeritA.FLOOR,
-        ],
-        ToshibaAcMode.DRY: [
-            ToshibaAcMeritA.HIGH_POWER,
-            ToshibaAcMeritA.ECO,
-            ToshibaAcMeritA.CDU_SILENT_1,
-            ToshibaAcMeritA.CDU_SILENT_2,
-            ToshibaAcMeritA.HEATING_8C,
-            ToshibaAcMeritA.SLEEP_CARE,
-            ToshibaAcMeritA.FLOOR,
-        ],
-        ToshibaAcMode.HEAT: [],
-        ToshibaAcMode.FAN: [
-            ToshibaAcMeritA.HIGH_POWER,
-            ToshibaAcMeritA.ECO,
-            ToshibaAcMeritA.CDU_SILENT_1,
-            ToshibaAcMeritA.CDU_SILENT_2,
-            ToshibaAcMeritA.HEATING_8C,
-            ToshibaAcMeritA.SLEEP_CARE,
-            ToshibaAcMeritA.FLOOR,
-        ],
+    DISABLED_AC_MERIT_A_FOR_MODE: t.Dict[ToshibaAcMode, ToshibaAcFeatureSet[ToshibaAcMeritA]] = {
+        ToshibaAcMode.AUTO: ToshibaAcFeatureSet.of(
+            ToshibaAcMeritA,
+            [
+                ToshibaAcMeritA.HEATING_8C,
+                ToshibaAcMeritA.SLEEP_CARE,
+                ToshibaAcMeritA.FLOOR,
+            ],
+        ),
+        ToshibaAcMode.COOL: ToshibaAcFeatureSet.of(
+            ToshibaAcMeritA,
+            [
+                ToshibaAcMeritA.HEATING_8C,
+                ToshibaAcMeritA.SLEEP_CARE,
+                ToshibaAcMeritA.FLOOR,
+            ],
+        ),
+        ToshibaAcMode.DRY: ToshibaAcFeatureSet.of(
+            ToshibaAcMeritA,
+            [
+                ToshibaAcMeritA.HIGH_POWER,
+                ToshibaAcMeritA.ECO,
+                ToshibaAcMeritA.CDU_SILENT_1,
+                ToshibaAcMeritA.CDU_SILENT_2,
+                ToshibaAcMeritA.HEATING_8C,
+                ToshibaAcMeritA.SLEEP_CARE,
+                ToshibaAcMeritA.FLOOR,
+            ],
+        ),
+        ToshibaAcMode.HEAT: ToshibaAcFeatureSet.of(ToshibaAcMeritA, []),
+        ToshibaAcMode.FAN: ToshibaAcFeatureSet.of(
+            ToshibaAcMeritA,
+            [
+                ToshibaAcMeritA.HIGH_POWER,
+                ToshibaAcMeritA.ECO,
+                ToshibaAcMeritA.CDU_SILENT_1,
+                ToshibaAcMeritA.CDU_SILENT_2,
+                ToshibaAcMeritA.HEATING_8C,
+                ToshibaAcMeritA.SLEEP_CARE,
+                ToshibaAcMeritA.FLOOR,
+            ],
+        ),
     }
 
     def __init__(
         self,
-        ac_status: t.List[ToshibaAcStatus],
-        ac_mode: t.List[ToshibaAcMode],
-        ac_fan_mode: t.List[ToshibaAcFanMode],
-        ac_swing_mode: t.List[ToshibaAcSwingMode],
-        ac_power_selection: t.List[ToshibaAcPowerSelection],
-        ac_merit_b: t.List[ToshibaAcMeritB],
-        ac_merit_a: t.List[ToshibaAcMeritA],
-        ac_air_pure_ion: t.List[ToshibaAcAirPureIon],
-        ac_self_cleaning: t.List[ToshibaAcSelfCleaning],
+        ac_status: t.Iterable[ToshibaAcStatus],
+        ac_mode: t.Iterable[ToshibaAcMode],
+        ac_fan_mode: t.Iterable[ToshibaAcFanMode],
+        ac_swing_mode: t.Iterable[ToshibaAcSwingMode],
+        ac_power_selection: t.Iterable[ToshibaAcPowerSelection],
+        ac_merit_b: t.Iterable[ToshibaAcMeritB],
+        ac_merit_a: t.Iterable[ToshibaAcMeritA],
+        ac_air_pure_ion: t.Iterable[ToshibaAcAirPureIon],
+        ac_self_cleaning: t.Iterable[ToshibaAcSelfCleaning],
         ac_energy_report: bool,
     ) -> None:
-        self._ac_status = ac_status
-        self._ac_mode = ac_mode
-        self._ac_fan_mode = ac_fan_mode
-        self._ac_swing_mode = ac_swing_mode
-        self._ac_power_selection = ac_power_selection
-        self._ac_merit_b = ac_merit_b
-        self._ac_merit_a = ac_merit_a
-        self._ac_air_pure_ion = ac_air_pure_ion
-        self._ac_self_cleaning = ac_self_cleaning
+        self._ac_status = ToshibaAcFeatureSet.of(ToshibaAcStatus, ac_status)
+        self._ac_mode = ToshibaAcFeatureSet.of(ToshibaAcMode, ac_mode)
+        self._ac_fan_mode = ToshibaAcFeatureSet.of(ToshibaAcFanMode, ac_fan_mode)
+        self._ac_swing_mode = ToshibaAcFeatureSet.of(ToshibaAcSwingMode, ac_swing_mode)
+        self._ac_power_selection = ToshibaAcFeatureSet.of(ToshibaAcPowerSelection, ac_power_selection)
+        self._ac_merit_b = ToshibaAcFeatureSet.of(ToshibaAcMeritB, ac_merit_b)
+        self._ac_merit_a = ToshibaAcFeatureSet.of(ToshibaAcMeritA, ac_merit_a)
+        self._ac_air_pure_ion = ToshibaAcFeatureSet.of(ToshibaAcAirPureIon, ac_air_pure_ion)
+        self._ac_self_cleaning = ToshibaAcFeatureSet.of(ToshibaAcSelfCleaning, ac_self_cleaning)
         self._ac_energy_report = ac_energy_report
+        # Bits of members in order, features listing the same members in different order are not interchangeable
+        self._key = (
+            self._ac_status._bits,
+            self._ac_mode._bits,
+            self._ac_fan_mode._bits,
+            self._ac_swing_mode._bits,
+            self._ac_power_selection._bits,
+            self._ac_merit_b._bits,
+            self._ac_merit_a._bits,
+            self._ac_air_pure_ion._bits,
+            self._ac_self_cleaning._bits,
+            self._ac_energy_report,
+        )
+        self._mask = (
+            self._ac_status.mask
+            | self._ac_mode.mask
+            | self._ac_fan_mode.mask
+            | self._ac_swing_mode.mask
+            | self._ac_power_selection.mask
+            | self._ac_merit_b.mask
+            | self._ac_merit_a.mask
+            | self._ac_air_pure_ion.mask
+            | self._ac_self_cleaning.mask
+        )
+        self._for_ac_mode: t.Dict[ToshibaAcMode, ToshibaAcFeatures] = {}
+
+    @classmethod
+    def intern(cls, features: ToshibaAcFeatures) -> ToshibaAcFeatures:
+        # Returns already known instance with the same content, if there is one
+        try:
+            return _FEATURES_BY_CONTENT[features._key]
+        except KeyError:
+            if len(_FEATURES_BY_CONTENT) < _MAX_INTERNED_FEATURES:
+                _FEATURES_BY_CONTENT[features._key] = features
+
+            return features
 
     @classmethod
     def from_merit_string_and_model(cls, merit_feature_hexstring: str, ac_model_id: str) -> ToshibaAcFeatures:
-        s_ac_status = list(ToshibaAcStatus)
+        try:
+            return _FEATURES_BY_MERIT[(merit_feature_hexstring, ac_model_id)]
+        except KeyError:
+            features = cls.intern(cls._parse_merit_string_and_model(merit_feature_hexstring, ac_model_id))
+
+            if len(_FEATURES_BY_MERIT) < _MAX_INTERNED_FEATURES:
+                _FEATURES_BY_MERIT[(merit_feature_hexstring, ac_model_id)] = features
+
+            return features
+
+    @classmethod
+    def _parse_merit_string_and_model(cls, merit_feature_hexstring: str, ac_model_id: str) -> ToshibaAcFeatures:
+        s_ac_status = _all_members(ToshibaAcStatus)
         s_ac_mode = [ToshibaAcMode.NONE]
-        s_ac_fan_mode = list(ToshibaAcFanMode)
+        s_ac_fan_mode = _all_members(ToshibaAcFanMode)
         s_ac_swing_mode = [ToshibaAcSwingMode.NONE, ToshibaAcSwingMode.OFF, ToshibaAcSwingMode.SWING_VERTICAL]
-        s_ac_power_selection = list(ToshibaAcPowerSelection)
+        s_ac_power_selection = _all_members(ToshibaAcPowerSelection)
         s_ac_merit_b = [ToshibaAcMeritB.NONE, ToshibaAcMeritB.OFF]
         s_ac_merit_a = [ToshibaAcMeritA.NONE, ToshibaAcMeritA.OFF, ToshibaAcMeritA.SLEEP_CARE, ToshibaAcMeritA.COMFORT]
         s_ac_pure_ion = [ToshibaAcAirPureIon.NONE, ToshibaAcAirPureIon.OFF]
-        s_ac_self_cleaning = list(ToshibaAcSelfCleaning)
+        s_ac_self_cleaning = _all_members(ToshibaAcSelfCleaning)
         s_ac_energy_report = False
 
-        # Make sure merit feature string has 4 characters
-        merit_feature_hexstring = f"{merit_feature_hexstring:<04.4}"
-
-        merit_bits = ToshibaAcFeatures.MERIT_BITS_STRUCT.unpack(
-            bytes.fromhex("0" + "0".join(f"{int(merit_feature_hexstring, base=16):016b}"))
-        )
+        merit_bits = merit_bits_from_hexstring(merit_feature_hexstring)
 
         s_ac_mode.extend(
             {
@@ -208,67 +459,120 @@ class ToshibaAcFeatures:
             s_ac_energy_report,
         )
 
+    @classmethod
+    def from_dict(cls, data: t.Mapping[str, t.Any]) -> ToshibaAcFeatures:
+        return cls.intern(
+            cls(
+                [ToshibaAcStatus[name] for name in data["ac_status"]],
+                [ToshibaAcMode[name] for name in data["ac_mode"]],
+                [ToshibaAcFanMode[name] for name in data["ac_fan_mode"]],
+                [ToshibaAcSwingMode[name] for name in data["ac_swing_mode"]],
+                [ToshibaAcPowerSelection[name] for name in data["ac_power_selection"]],
+                [ToshibaAcMeritB[name] for name in data["ac_merit_b"]],
+                [ToshibaAcMeritA[name] for name in data["ac_merit_a"]],
+                [ToshibaAcAirPureIon[name] for name in data["ac_air_pure_ion"]],
+                [ToshibaAcSelfCleaning[name] for name in data["ac_self_cleaning"]],
+                bool(data["ac_energy_report"]),
+            )
+        )
+
+    def as_dict(self) -> t.Dict[str, t.Any]:
+        # Enum members are stored by name, so the result can be serialized to JSON
+        return {
+            "ac_status": [val.name for val in self.ac_status],
+            "ac_mode": [val.name for val in self.ac_mode],
+            "ac_fan_mode": [val.name for val in self.ac_fan_mode],
+            "ac_swing_mode": [val.name for val in self.ac_swing_mode],
+            "ac_power_selection": [val.name for val in self.ac_power_selection],
+            "ac_merit_b": [val.name for val in self.ac_merit_b],
+            "ac_merit_a": [val.name for val in self.ac_merit_a],
+            "ac_air_pure_ion": [val.name for val in self.ac_air_pure_ion],
+            "ac_self_cleaning": [val.name for val in self.ac_self_cleaning],
+            "ac_energy_report": self.ac_energy_report,
+        }
+
     def for_ac_mode(self, ac_mode: ToshibaAcMode) -> ToshibaAcFeatures:
-        filtered_ac_merit_b = [
-            merit_b for merit_b in self.ac_merit_b if merit_b not in self.DISABLED_AC_MERIT_B_FOR_MODE[ac_mode]
-        ]
-        filtered_ac_merit_a = [
-            merit_a for merit_a in self.ac_merit_a if merit_a not in self.DISABLED_AC_MERIT_A_FOR_MODE[ac_mode]
-        ]
-
-        return ToshibaAcFeatures(
-            self.ac_status,
-            self.ac_mode,
-            self.ac_fan_mode,
-            self.ac_swing_mode,
-            self.ac_power_selection,
-            filtered_ac_merit_b,
-            filtered_ac_merit_a,
-            self.ac_air_pure_ion,
-            self.ac_self_cleaning,
-            self.ac_energy_report,
+        try:
+            return self._for_ac_mode[ac_mode]
+        except KeyError:
+            pass
+
+        features = self.intern(
+            ToshibaAcFeatures(
+                self.ac_status,
+                self.ac_mode,
+                self.ac_fan_mode,
+                self.ac_swing_mode,
+                self.ac_power_selection,
+                self.ac_merit_b - self.DISABLED_AC_MERIT_B_FOR_MODE[ac_mode],
+                self.ac_merit_a - self.DISABLED_AC_MERIT_A_FOR_MODE[ac_mode],
+                self.ac_air_pure_ion,
+                self.ac_self_cleaning,
+                self.ac_energy_report,
+            )
         )
+        self._for_ac_mode[ac_mode] = features
+
+        return features
 
     @property
-    def ac_status(self) -> t.List[ToshibaAcStatus]:
+    def ac_status(self) -> ToshibaAcFeatureSet[ToshibaAcStatus]:
         return self._ac_status
 
     @property
-    def ac_mode(self) -> t.List[ToshibaAcMode]:
+    def ac_mode(self) -> ToshibaAcFeatureSet[ToshibaAcMode]:
         return self._ac_mode
 
     @property
-    def ac_fan_mode(self) -> t.List[ToshibaAcFanMode]:
+    def ac_fan_mode(self) -> ToshibaAcFeatureSet[ToshibaAcFanMode]:
         return self._ac_fan_mode
 
     @property
-    def ac_swing_mode(self) -> t.List[ToshibaAcSwingMode]:
+    def ac_swing_mode(self) -> ToshibaAcFeatureSet[ToshibaAcSwingMode]:
         return self._ac_swing_mode
 
     @property
-    def ac_power_selection(self) -> t.List[ToshibaAcPowerSelection]:
+    def ac_power_selection(self) -> ToshibaAcFeatureSet[ToshibaAcPowerSelection]:
         return self._ac_power_selection
 
     @property
-    def ac_merit_b(self) -> t.List[ToshibaAcMeritB]:
+    def ac_merit_b(self) -> ToshibaAcFeatureSet[ToshibaAcMeritB]:
         return self._ac_merit_b
 
     @property
-    def ac_merit_a(self) -> t.List[ToshibaAcMeritA]:
+    def ac_merit_a(self) -> ToshibaAcFeatureSet[ToshibaAcMeritA]:
         return self._ac_merit_a
 
     @property
-    def ac_air_pure_ion(self) -> t.List[ToshibaAcAirPureIon]:
+    def ac_air_pure_ion(self) -> ToshibaAcFeatureSet[ToshibaAcAirPureIon]:
         return self._ac_air_pure_ion
 
     @property
-    def ac_self_cleaning(self) -> t.List[ToshibaAcSelfCleaning]:
+    def ac_self_cleaning(self) -> ToshibaAcFeatureSet[ToshibaAcSelfCleaning]:
         return self._ac_self_cleaning
 
     @property
     def ac_energy_report(self) -> bool:
         return self._ac_energy_report
 
+    @property
+    def mask(self) -> int:
+        # Bits of all supported values, values are supported when ToshibaAcFeatureSet.bits() of them is within it
+        return self._mask
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ToshibaAcFeatures):
+            return NotImplemented
+
+        return self is other or self._key == other._key
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    def __reduce__(self) -> t.Tuple[t.Any, ...]:
+        # Unpickled features (e.g. sent to worker processes) are interned too
+        return (ToshibaAcFeatures.from_dict, (self.as_dict(),))
+
     def __str__(self) -> str:
         return ", ".join(
             (
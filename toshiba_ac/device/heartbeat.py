@@ -0,0 +1,141 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import struct
+import typing as t
+
+
+class _ToshibaAcHeartbeatValueCodec:
+    # Heartbeat values are single bytes in hex. Lowercase two digit values, as sent by the cloud, are decoded with
+    # a lookup table, anything else goes through precompiled struct (and raises on malformed values).
+    __slots__ = ("struct", "table")
+
+    def __init__(self, fmt: str) -> None:
+        self.struct = struct.Struct(fmt)
+        self.table: t.Dict[str, int] = {f"{raw:02x}": self.struct.unpack(bytes((raw,)))[0] for raw in range(256)}
+
+    def decode(self, value: str) -> int:
+        try:
+            return self.table[value]
+        except (KeyError, TypeError):
+            return t.cast(int, self.struct.unpack(bytes.fromhex(value))[0])
+
+
+_SIGNED = _ToshibaAcHeartbeatValueCodec("b")
+_UNSIGNED = _ToshibaAcHeartbeatValueCodec("B")
+
+# Temperatures are signed, everything else unsigned
+_KNOWN_KEYS = (
+    "iTemp",
+    "oTemp",
+    "fcuTcTemp",
+    "fcuTcjTemp",
+    "fcuFanRpm",
+    "cduTdTemp",
+    "cduTsTemp",
+    "cduTeTemp",
+    "cduCompHz",
+    "cduFanRpm",
+    "cduPmvPulse",
+    "cduIac",
+)
+# Codecs of every key seen so far, unknown keys follow the same naming rule as known ones
+_KEY_CODECS = {key: _SIGNED if "Temp" in key else _UNSIGNED for key in _KNOWN_KEYS}
+_MAX_KEY_CODECS = 256
+
+
+def _codec_for_key(key: str) -> _ToshibaAcHeartbeatValueCodec:
+    try:
+        return _KEY_CODECS[key]
+    except KeyError:
+        codec = _SIGNED if "Temp" in key else _UNSIGNED
+
+        # Keys come from the cloud, do not let unexpected ones grow the cache without limit
+        if len(_KEY_CODECS) < _MAX_KEY_CODECS:
+            _KEY_CODECS[key] = codec
+
+        return codec
+
+
+class ToshibaAcHeartbeat:
+    # Decoded CMD_HEARTBEAT payload. Indoor and outdoor temperatures, the only values used by the library, are
+    # decoded right away. Remaining values are decoded on access, fields missing in payload are None.
+    __slots__ = ("payload", "indoor_temperature", "outdoor_temperature", "_decoded")
+
+    def __init__(self, payload: t.Mapping[str, str]) -> None:
+        self.payload = payload
+        i_temp = payload.get("iTemp")
+        o_temp = payload.get("oTemp")
+        self.indoor_temperature: t.Optional[int] = None if i_temp is None else _SIGNED.decode(i_temp)
+        self.outdoor_temperature: t.Optional[int] = None if o_temp is None else _SIGNED.decode(o_temp)
+        self._decoded: t.Optional[t.Dict[str, int]] = None
+
+    def get(self, key: str) -> t.Optional[int]:
+        if self._decoded is not None:
+            return self._decoded.get(key)
+
+        value = self.payload.get(key)
+        return None if value is None else _codec_for_key(key).decode(value)
+
+    def as_dict(self) -> t.Dict[str, int]:
+        # All values, including keys unknown to this library, by payload key
+        if self._decoded is None:
+            self._decoded = {key: _codec_for_key(key).decode(value) for key, value in self.payload.items()}
+
+        return self._decoded
+
+    @property
+    def fcu_tc_temperature(self) -> t.Optional[int]:
+        return self.get("fcuTcTemp")
+
+    @property
+    def fcu_tcj_temperature(self) -> t.Optional[int]:
+        return self.get("fcuTcjTemp")
+
+    @property
+    def fcu_fan_rpm(self) -> t.Optional[int]:
+        return self.get("fcuFanRpm")
+
+    @property
+    def cdu_td_temperature(self) -> t.Optional[int]:
+        return self.get("cduTdTemp")
+
+    @property
+    def cdu_ts_temperature(self) -> t.Optional[int]:
+        return self.get("cduTsTemp")
+
+    @property
+    def cdu_te_temperature(self) -> t.Optional[int]:
+        return self.get("cduTeTemp")
+
+    @property
+    def cdu_comp_hz(self) -> t.Optional[int]:
+        return self.get("cduCompHz")
+
+    @property
+    def cdu_fan_rpm(self) -> t.Optional[int]:
+        return self.get("cduFanRpm")
+
+    @property
+    def cdu_pmv_pulse(self) -> t.Optional[int]:
+        return self.get("cduPmvPulse")
+
+    @property
+    def cdu_iac(self) -> t.Optional[int]:
+        return self.get("cduIac")
+
+    def __repr__(self) -> str:
+        return f"ToshibaAcHeartbeat({self.as_dict()})"
@@ -12,14 +12,33 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from __future__ import annotations
+
 import asyncio
+import dataclasses
 import logging
+import time
 import typing as t
 
-from toshiba_ac.device import ToshibaAcDevice
-from toshiba_ac.utils import async_sleep_until_next_multiply_of_minutes, ToshibaAcCallback
-from toshiba_ac.utils.amqp_api import ToshibaAcAmqpApi, JSONSerializable
-from toshiba_ac.utils.http_api import ToshibaAcHttpApi
+from toshiba_ac.device import ToshibaAcDevice, ToshibaAcDeviceError
+from toshiba_ac.device.command_tracker import ToshibaAcCommand, ToshibaAcCommandTracker
+from toshiba_ac.device.fcu_state import ToshibaAcFcuState
+from toshiba_ac.device.features import ToshibaAcFeatures
+from toshiba_ac.utils import ToshibaAcCallback
+from toshiba_ac.utils.amqp_api import ToshibaAcAmqpApi
+from toshiba_ac.utils.amqp_transport import ToshibaAcAmqpTransport
+from toshiba_ac.utils.http_api import ToshibaAcDeviceInfo, ToshibaAcHttpApi
+from toshiba_ac.utils.json_codec import ToshibaAcMessageTemplate
+from toshiba_ac.utils.metrics import ToshibaAcMetrics, get_metrics
+from toshiba_ac.utils.rate_limiter import ToshibaAcRateLimiter
+from toshiba_ac.utils.scheduler import ToshibaAcPeriodicScheduler
+from toshiba_ac.utils.tracing import span
+from toshiba_ac.warm_start_cache import ToshibaAcCachedAccount, ToshibaAcCachedDevice, ToshibaAcWarmStartCache
+
+if t.TYPE_CHECKING:
+    import aiohttp
+
+    from toshiba_ac.utils.amqp_api import JSONSerializable
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +53,7 @@ class ToshibaAcSasTokenUpdatedCallback(ToshibaAcCallback[str]):
 
 class ToshibaAcDeviceManager:
     FETCH_ENERGY_CONSUMPTION_PERIOD_MINUTES = 10
+    STATE_RELOAD_PERIOD_MINUTES = 30
 
     def __init__(
         self,
@@ -42,17 +62,35 @@ class ToshibaAcDeviceManager:
         device_id: t.Optional[str] = None,
         sas_token: t.Optional[str] = None,
         brand_id: t.Optional[str] = None,
+        rate_limiter: t.Optional[ToshibaAcRateLimiter] = None,
+        http_session: t.Optional[aiohttp.ClientSession] = None,
+        scheduler: t.Optional[ToshibaAcPeriodicScheduler] = None,
+        warm_start_cache: t.Optional[ToshibaAcWarmStartCache] = None,
+        http_base_url: t.Optional[str] = None,
+        amqp_transport_factory: t.Optional[t.Callable[[str], ToshibaAcAmqpTransport]] = None,
+        command_coalescing_window_s: float = 0.0,
     ):
         self.username = username
         self.password = password
         self.brand_id = brand_id
+        self.rate_limiter = rate_limiter
+        self.http_session = http_session
+        self.http_base_url = http_base_url
+        # Called with SAS token, Azure IoT Hub client is used when not given
+        self.amqp_transport_factory = amqp_transport_factory
+        # Passed to devices, see ToshibaAcDevice
+        self.command_coalescing_window_s = command_coalescing_window_s
+        self.scheduler = scheduler or ToshibaAcPeriodicScheduler()
+        self._owns_scheduler = scheduler is None
         self.http_api: t.Optional[ToshibaAcHttpApi] = None
         self.reg_info = None
         self.amqp_api: t.Optional[ToshibaAcAmqpApi] = None
         self.device_id = self.username + "_" + (device_id or "3e6e4eb5f0e5aa46")
         self.sas_token = sas_token
         self.devices: t.Dict[str, ToshibaAcDevice] = {}
-        self.periodic_fetch_energy_consumption_task: t.Optional[asyncio.Task[None]] = None
+        self.devices_info: t.Dict[str, ToshibaAcDeviceInfo] = {}
+        self.warm_start_cache = warm_start_cache
+        self.warm_start_refresh_task: t.Optional[asyncio.Task[None]] = None
         self.lock = asyncio.Lock()
         self.loop = asyncio.get_running_loop()
         self._on_sas_token_updated_callback = ToshibaAcSasTokenUpdatedCallback()
@@ -60,19 +98,39 @@ class ToshibaAcDeviceManager:
     async def connect(self) -> str:
         try:
             async with self.lock:
+                cached = await self._load_warm_start_cache()
+
                 if not self.http_api:
-                    self.http_api = ToshibaAcHttpApi(self.username, self.password, self.brand_id)
-                    await self.http_api.connect()
+                    self.http_api = ToshibaAcHttpApi(
+                        self.username,
+                        self.password,
+                        self.brand_id,
+                        self.rate_limiter,
+                        self.http_session,
+                        self.http_base_url,
+                    )
+
+                    if cached:
+                        self.http_api.restore_auth(cached.access_token, cached.access_token_type, cached.consumer_id)
+                    else:
+                        await self.http_api.connect()
+
+                if not self.sas_token and cached and cached.device_id == self.device_id and cached.sas_token:
+                    if ToshibaAcWarmStartCache.is_sas_token_usable(cached.sas_token):
+                        self.sas_token = cached.sas_token
 
                 if not self.sas_token:
                     self.sas_token = await self.http_api.register_client(self.device_id)
 
                 if not self.amqp_api:
-                    self.amqp_api = ToshibaAcAmqpApi(self.sas_token, self.renew_sas_token)
+                    transport = self.amqp_transport_factory(self.sas_token) if self.amqp_transport_factory else None
+                    self.amqp_api = ToshibaAcAmqpApi(self.sas_token, self.renew_sas_token, transport)
                     self.amqp_api.register_command_handler("CMD_FCU_FROM_AC", self.handle_cmd_fcu_from_ac)
                     self.amqp_api.register_command_handler("CMD_HEARTBEAT", self.handle_cmd_heartbeat)
                     await self.amqp_api.connect()
 
+                await self._save_warm_start_cache()
+
                 return self.sas_token
 
         except:
@@ -83,9 +141,16 @@ class ToshibaAcDeviceManager:
         async with self.lock:
             tasks: t.List[t.Awaitable[None]] = []
 
-            if self.periodic_fetch_energy_consumption_task:
-                self.periodic_fetch_energy_consumption_task.cancel()
-                tasks.append(self.periodic_fetch_energy_consumption_task)
+            self.scheduler.remove(self.FETCH_ENERGY_CONSUMPTION_PERIOD_MINUTES, self.periodic_fetch_energy_consumption)
+            self.scheduler.remove(self.STATE_RELOAD_PERIOD_MINUTES, self.periodic_state_reload)
+
+            if self._owns_scheduler:
+                tasks.append(self.scheduler.shutdown())
+
+            if self.warm_start_refresh_task:
+                self.warm_start_refresh_task.cancel()
+                tasks.append(self._wait_for_cancelled(self.warm_start_refresh_task))
+                self.warm_start_refresh_task = None
 
             tasks.extend(device.shutdown() for device in self.devices.values())
 
@@ -99,31 +164,92 @@ class ToshibaAcDeviceManager:
                 if tasks:
                     results = await asyncio.gather(*tasks, return_exceptions=True)
 
-                    def raise_all_errors(res: t.Any, *args: t.Any) -> None:
-                        try:
-                            if isinstance(res, Exception):
-                                raise res
-                        finally:
-                            if args:
-                                raise_all_errors(*args)
+                    # Last error is raised with earlier ones chained as its context. Not done recursively,
+                    # accounts with thousands of devices would exceed recursion limit.
+                    error: t.Optional[Exception] = None
+
+                    for result in results:
+                        if isinstance(result, Exception):
+                            if error is not None:
+                                result.__context__ = error
+                            error = result
 
-                    raise_all_errors(*results)
+                    if error is not None:
+                        raise error
             finally:
-                self.periodic_fetch_energy_consumption_task = None
                 self.amqp_api = None
                 self.http_api = None
 
-    async def periodic_fetch_energy_consumption(self) -> None:
-        while True:
-            try:
-                await self.fetch_energy_consumption()
-            except asyncio.CancelledError:
-                raise
-            except Exception as e:
-                logger.error(f"Fetching energy consumption failed: {e}")
-                pass
+    @staticmethod
+    async def _wait_for_cancelled(task: asyncio.Task[None]) -> None:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _load_warm_start_cache(self) -> t.Optional[ToshibaAcCachedAccount]:
+        if not self.warm_start_cache:
+            return None
 
-            await async_sleep_until_next_multiply_of_minutes(self.FETCH_ENERGY_CONSUMPTION_PERIOD_MINUTES)
+        await self.warm_start_cache.load()
+
+        return self.warm_start_cache.get(self.username)
+
+    async def _save_warm_start_cache(self) -> None:
+        http_api = self.http_api
+
+        if not self.warm_start_cache or not http_api:
+            return
+
+        if not http_api.access_token or not http_api.access_token_type or not http_api.consumer_id:
+            return
+
+        cached = self.warm_start_cache.get(self.username)
+        cached_devices = cached.devices if cached else []
+
+        if self.devices_info:
+            cached_devices = []
+
+            for ac_unique_id, device_info in self.devices_info.items():
+                device = self.devices.get(ac_unique_id)
+
+                if device:
+                    # Last known state is used as initial state on next start
+                    device_info = dataclasses.replace(device_info, initial_ac_state=device.fcu_state.encode())
+                    cached_devices.append(ToshibaAcCachedDevice(device_info, device.supported))
+
+        self.warm_start_cache.set(
+            self.username,
+            ToshibaAcCachedAccount(
+                access_token=http_api.access_token,
+                access_token_type=http_api.access_token_type,
+                consumer_id=http_api.consumer_id,
+                device_id=self.device_id,
+                sas_token=self.sas_token,
+                devices=cached_devices,
+            ),
+        )
+
+        try:
+            await self.warm_start_cache.save()
+        except OSError as e:
+            logger.warning(f"Failed to save warm start cache: {e}")
+
+    async def _refresh_warm_started_devices(self) -> None:
+        try:
+            await self.state_reload()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Refreshing devices loaded from warm start cache failed: {e}")
+
+    async def periodic_fetch_energy_consumption(self) -> None:
+        try:
+            await self.fetch_energy_consumption()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Fetching energy consumption failed: {e}")
 
     async def fetch_energy_consumption(self) -> None:
         if not self.http_api:
@@ -150,13 +276,63 @@ class ToshibaAcDeviceManager:
 
         await asyncio.gather(*updates)
 
+    async def periodic_state_reload(self) -> None:
+        try:
+            await self.state_reload()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"State reload failed: {e}")
+
+    async def state_reload(self) -> None:
+        if not self.http_api:
+            raise ToshibaAcDeviceManagerError("Not connected")
+
+        # AC mapping carries current state of every AC, so single request refreshes all devices
+        devices_info = await self.http_api.get_devices()
+
+        updates: t.Dict[ToshibaAcDevice, t.Awaitable[None]] = {}
+
+        for device_info in devices_info:
+            device = self.devices.get(device_info.ac_unique_id)
+
+            if not device:
+                logger.info(f"Device {device_info.ac_name} was added to the account, reconnect to use it")
+                continue
+
+            self.devices_info[device_info.ac_unique_id] = device_info
+
+            if not isinstance(device_info.initial_ac_state, str):
+                logger.warning(f"[{device.name}] Malformed AC state in AC mapping: {device_info.initial_ac_state}")
+                continue
+
+            updates[device] = device.handle_state_from_http(device_info.initial_ac_state)
+
+        results = await asyncio.gather(*updates.values(), return_exceptions=True)
+
+        for device, result in zip(updates, results):
+            if isinstance(result, Exception):
+                logger.error(f"[{device.name}] State reload failed: {result}")
+
+        await self._save_warm_start_cache()
+
     async def get_devices(self) -> t.List[ToshibaAcDevice]:
         if not self.http_api or not self.amqp_api:
             raise ToshibaAcDeviceManagerError("Not connected")
 
         async with self.lock:
             if not self.devices:
-                devices_info = await self.http_api.get_devices()
+                cached = self.warm_start_cache.get(self.username) if self.warm_start_cache else None
+                cached_features: t.Dict[str, ToshibaAcFeatures] = {}
+
+                if cached and cached.devices:
+                    # Devices are brought up from cache right away, their state is refreshed in background
+                    devices_info = [cached_device.info for cached_device in cached.devices]
+                    cached_features = {
+                        cached_device.info.ac_unique_id: cached_device.features for cached_device in cached.devices
+                    }
+                else:
+                    devices_info = await self.http_api.get_devices()
 
                 logger.debug(
                     "Found devices: {"
@@ -183,6 +359,8 @@ class ToshibaAcDeviceManager:
                         device_info.ac_model_id,
                         self.amqp_api,
                         self.http_api,
+                        cached_features.get(device_info.ac_unique_id),
+                        self.command_coalescing_window_s,
                     )
 
                     connects.append(device.connect())
@@ -190,21 +368,89 @@ class ToshibaAcDeviceManager:
                     logger.debug(f"Adding device {device.name}")
 
                     self.devices[device.ac_unique_id] = device
+                    self.devices_info[device.ac_unique_id] = device_info
 
                 await asyncio.gather(*connects)
 
+                if cached_features:
+                    self.warm_start_refresh_task = asyncio.create_task(self._refresh_warm_started_devices())
+                else:
+                    await self._save_warm_start_cache()
+
+                self.scheduler.add(self.STATE_RELOAD_PERIOD_MINUTES, self.periodic_state_reload)
+
                 if any(device.supported.ac_energy_report for device in self.devices.values()):
-                    if not self.periodic_fetch_energy_consumption_task:
-                        self.periodic_fetch_energy_consumption_task = asyncio.create_task(
-                            self.periodic_fetch_energy_consumption()
-                        )
+                    self.scheduler.add(
+                        self.FETCH_ENERGY_CONSUMPTION_PERIOD_MINUTES,
+                        self.periodic_fetch_energy_consumption,
+                        run_immediately=True,
+                    )
 
             return list(self.devices.values())
 
+    async def send_state_to_devices(
+        self, devices: t.Iterable[ToshibaAcDevice], state: ToshibaAcFcuState
+    ) -> t.Dict[ToshibaAcDevice, ToshibaAcCommand]:
+        # Sends the same requested state to many ACs. State is validated against features of every AC, ACs ending
+        # up with identical command share single CMD_FCU_TO_AC message targeting all of them. If the state is not
+        # valid for even one of the ACs ToshibaAcDeviceManagerError is raised and nothing is sent to any of them.
+        # Returned commands can be awaited for confirmation per AC, only fields set in the state are waited for.
+        if not self.amqp_api:
+            raise ToshibaAcDeviceManagerError("Not connected")
+
+        requested_hex_state = state.encode()
+        buckets: t.Dict[str, t.List[ToshibaAcDevice]] = {}
+        errors: t.List[str] = []
+
+        for device in {device.ac_unique_id: device for device in devices}.values():
+            if device.amqp_api is not self.amqp_api:
+                raise ToshibaAcDeviceManagerError(f"Device {device.name} is not managed by this device manager")
+
+            try:
+                hex_state = device.prepare_state_to_ac(state).encode()
+            except ToshibaAcDeviceError as e:
+                errors.append(str(e))
+            else:
+                buckets.setdefault(hex_state, []).append(device)
+
+        if errors:
+            raise ToshibaAcDeviceManagerError(f"State not supported by all devices: {'; '.join(errors)}")
+
+        commands: t.Dict[ToshibaAcDevice, ToshibaAcCommand] = {}
+
+        with span(
+            "ToshibaAcDeviceManager.send_state_to_devices",
+            devices=sum(len(targets) for targets in buckets.values()),
+            messages=len(buckets),
+        ):
+            for hex_state, targets in buckets.items():
+                message_id = ToshibaAcCommandTracker.new_message_id()
+                sent = {
+                    device: device.command_tracker.track(hex_state, message_id, requested_hex_state)
+                    for device in targets
+                }
+                template = ToshibaAcMessageTemplate(
+                    self.device_id, [device.ac_unique_id for device in targets], "CMD_FCU_TO_AC"
+                )
+
+                logger.debug(f"Sending command {message_id} to {len(targets)} devices: {hex_state}")
+
+                try:
+                    await self.amqp_api.send_message(template.render(message_id, hex_state))
+                except BaseException:
+                    for device, command in sent.items():
+                        device.command_tracker.discard(command)
+                    raise
+
+                commands.update(sent)
+
+        return commands
+
     async def renew_sas_token(self) -> str:
         if self.http_api:
             self.sas_token = await self.http_api.register_client(self.device_id)
             await self.on_sas_token_updated_callback(self.sas_token)
+            await self._save_warm_start_cache()
             return self.sas_token
 
         raise ToshibaAcDeviceManagerError("Not connected")
@@ -215,6 +461,13 @@ class ToshibaAcDeviceManager:
         command_name: str,
         handler_coroutine: t.Coroutine[t.Any, t.Any, None],
     ) -> None:
+        metrics = get_metrics()
+
+        if metrics:
+            handler_coroutine = self._measure_device_handler(
+                metrics, command_name, handler_coroutine, time.perf_counter()
+            )
+
         future = asyncio.run_coroutine_threadsafe(handler_coroutine, self.loop)
 
         def _on_done(f: t.Any) -> None:
@@ -225,6 +478,21 @@ class ToshibaAcDeviceManager:
 
         future.add_done_callback(_on_done)
 
+    @staticmethod
+    async def _measure_device_handler(
+        metrics: ToshibaAcMetrics,
+        command_name: str,
+        handler_coroutine: t.Coroutine[t.Any, t.Any, None],
+        scheduled_at: float,
+    ) -> None:
+        start = time.perf_counter()
+        metrics.amqp_dispatch_latency.labels(command_name).observe(start - scheduled_at)
+
+        try:
+            await handler_coroutine
+        finally:
+            metrics.amqp_handler_duration.labels(command_name).observe(time.perf_counter() - start)
+
     def handle_cmd_fcu_from_ac(
         self,
         source_id: str,
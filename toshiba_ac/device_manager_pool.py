@@ -0,0 +1,142 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import ssl
+import typing as t
+
+from toshiba_ac.device_manager import ToshibaAcDeviceManager
+from toshiba_ac.utils.amqp_transport import ToshibaAcAmqpTransport
+from toshiba_ac.utils.http_api import ToshibaAcHttpApi
+from toshiba_ac.utils.rate_limiter import ToshibaAcRateLimiter
+from toshiba_ac.utils.scheduler import ToshibaAcPeriodicScheduler
+from toshiba_ac.warm_start_cache import ToshibaAcWarmStartCache
+
+if t.TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class ToshibaAcDeviceManagerPoolError(Exception):
+    pass
+
+
+class ToshibaAcDeviceManagerPool:
+    # Hosts device managers of many accounts in a single event loop. All of them share one HTTP session
+    # (connection pool with keep-alive, DNS cache and TLS context), one rate limiter and one scheduler for
+    # periodic jobs.
+    CONNECTION_LIMIT = 100
+    DNS_CACHE_TTL_S = 300
+    KEEPALIVE_TIMEOUT_S = 60
+
+    def __init__(
+        self,
+        rate_limiter: t.Optional[ToshibaAcRateLimiter] = None,
+        max_concurrent_jobs: int = 16,
+        warm_start_cache: t.Optional[ToshibaAcWarmStartCache] = None,
+        http_base_url: t.Optional[str] = None,
+        amqp_transport_factory: t.Optional[t.Callable[[str], ToshibaAcAmqpTransport]] = None,
+        command_coalescing_window_s: float = 0.0,
+    ) -> None:
+        # Without shared limiter every account would get the full request rate
+        self.rate_limiter = rate_limiter or ToshibaAcHttpApi.create_rate_limiter()
+        self.warm_start_cache = warm_start_cache
+        self.http_base_url = http_base_url
+        self.amqp_transport_factory = amqp_transport_factory
+        self.command_coalescing_window_s = command_coalescing_window_s
+        self.managers: t.Dict[str, ToshibaAcDeviceManager] = {}
+        self.scheduler = ToshibaAcPeriodicScheduler(max_concurrent_jobs)
+        self.session: t.Optional[aiohttp.ClientSession] = None
+        self.lock = asyncio.Lock()
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        if not self.session or self.session.closed:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(
+                limit=self.CONNECTION_LIMIT,
+                ttl_dns_cache=self.DNS_CACHE_TTL_S,
+                keepalive_timeout=self.KEEPALIVE_TIMEOUT_S,
+                ssl=ssl.create_default_context(),
+            )
+            self.session = ToshibaAcHttpApi.create_session(connector)
+
+        return self.session
+
+    async def add_account(
+        self,
+        username: str,
+        password: str,
+        device_id: t.Optional[str] = None,
+        sas_token: t.Optional[str] = None,
+        brand_id: t.Optional[str] = None,
+    ) -> ToshibaAcDeviceManager:
+        async with self.lock:
+            if username in self.managers:
+                raise ToshibaAcDeviceManagerPoolError(f"Account {username} already added")
+
+            manager = ToshibaAcDeviceManager(
+                username,
+                password,
+                device_id,
+                sas_token,
+                brand_id,
+                rate_limiter=self.rate_limiter,
+                http_session=self._ensure_session(),
+                scheduler=self.scheduler,
+                warm_start_cache=self.warm_start_cache,
+                http_base_url=self.http_base_url,
+                amqp_transport_factory=self.amqp_transport_factory,
+                command_coalescing_window_s=self.command_coalescing_window_s,
+            )
+            self.managers[username] = manager
+
+        try:
+            await manager.connect()
+        except:
+            async with self.lock:
+                self.managers.pop(username, None)
+            raise
+
+        return manager
+
+    async def remove_account(self, username: str) -> None:
+        async with self.lock:
+            manager = self.managers.pop(username, None)
+
+        if not manager:
+            raise ToshibaAcDeviceManagerPoolError(f"Unknown account {username}")
+
+        await manager.shutdown()
+
+    async def shutdown(self) -> None:
+        async with self.lock:
+            managers = list(self.managers.values())
+            self.managers.clear()
+
+        results = await asyncio.gather(*(manager.shutdown() for manager in managers), return_exceptions=True)
+
+        for manager, result in zip(managers, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to shutdown account {manager.username}: {result}")
+
+        await self.scheduler.shutdown()
+
+        if self.session:
+            await self.session.close()
+            self.session = None
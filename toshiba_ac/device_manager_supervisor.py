@@ -0,0 +1,626 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import typing as t
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+
+from toshiba_ac.device import ToshibaAcDevice, ToshibaAcDeviceStateChange
+from toshiba_ac.device.fcu_state import ToshibaAcFcuState
+from toshiba_ac.device.features import ToshibaAcFeatures
+from toshiba_ac.device.properties import ToshibaAcDeviceEnergyConsumption
+from toshiba_ac.device_manager_pool import ToshibaAcDeviceManagerPool
+from toshiba_ac.utils import ToshibaAcCallback
+from toshiba_ac.utils.http_api import ToshibaAcHttpApi
+
+logger = logging.getLogger(__name__)
+
+# IPC messages are plain tuples starting with an opcode. Device state travels as raw state bytes with a bitmask
+# of changed fields and all events produced by a worker in one loop iteration are sent together as one list.
+_CMD_ADD_ACCOUNT = 0
+_CMD_REMOVE_ACCOUNT = 1
+_CMD_SEND_STATE = 2
+_CMD_SHUTDOWN = 3
+
+_EVENT_REPLY = 0
+_EVENT_STATE = 1
+_EVENT_ENERGY = 2
+_EVENT_SAS_TOKEN = 3
+
+_FIELD_BITS = {fcu_field[0]: 1 << bit for bit, fcu_field in enumerate(ToshibaAcFcuState.FIELDS)}
+
+
+class ToshibaAcDeviceManagerSupervisorError(Exception):
+    pass
+
+
+@dataclass
+class ToshibaAcRemoteDevice:
+    # Parent process mirror of a device handled by one of the workers
+    username: str
+    name: str
+    ac_id: str
+    ac_unique_id: str
+    firmware_version: str
+    supported: ToshibaAcFeatures
+    fcu_state: ToshibaAcFcuState
+    ac_energy_consumption: t.Optional[ToshibaAcDeviceEnergyConsumption] = None
+
+    @property
+    def ac_temperature(self) -> t.Optional[int]:
+        return ToshibaAcDevice.ac_temperature_from_fcu_state(self.fcu_state)
+
+
+@dataclass(frozen=True)
+class ToshibaAcRemoteDeviceStateChange:
+    device: ToshibaAcRemoteDevice
+    fields: t.FrozenSet[str]
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.fields
+
+
+class ToshibaAcRemoteDeviceCallback(ToshibaAcCallback[ToshibaAcRemoteDevice]):
+    pass
+
+
+class ToshibaAcRemoteDeviceStateChangeCallback(ToshibaAcCallback[ToshibaAcRemoteDeviceStateChange]):
+    pass
+
+
+class ToshibaAcAccountSasTokenUpdatedCallback(ToshibaAcCallback[t.Tuple[str, str]]):
+    pass
+
+
+@dataclass
+class _ToshibaAcAccount:
+    username: str
+    password: str
+    device_id: t.Optional[str]
+    sas_token: t.Optional[str]
+    brand_id: t.Optional[str]
+
+
+@dataclass
+class _ToshibaAcWorkerProcess:
+    index: int
+    process: BaseProcess
+    commands: Connection
+    events: Connection
+    reader: t.Optional[threading.Thread] = None
+    accounts: t.Dict[str, _ToshibaAcAccount] = field(default_factory=dict)
+    requests: t.Dict[int, asyncio.Future[t.Any]] = field(default_factory=dict)
+
+
+class _ToshibaAcWorker:
+    # Runs in worker process. Executes commands from the supervisor on ToshibaAcDeviceManagerPool
+    # and reports back replies and device events.
+
+    def __init__(
+        self,
+        commands: Connection,
+        events: Connection,
+        requests_per_second: float,
+        http_base_url: t.Optional[str],
+    ) -> None:
+        self.commands = commands
+        self.events = events
+        self.requests_per_second = requests_per_second
+        self.http_base_url = http_base_url
+        self.devices: t.Dict[str, ToshibaAcDevice] = {}
+        self._pending_events: t.List[t.Tuple[t.Any, ...]] = []
+        self._flush_scheduled = False
+
+    def run(self) -> None:
+        asyncio.run(self._run())
+
+    async def _run(self) -> None:
+        self.loop = asyncio.get_running_loop()
+
+        # All accounts of the worker share its part of the host request rate
+        rate_limiter = ToshibaAcHttpApi.create_rate_limiter(self.requests_per_second)
+        self.pool = ToshibaAcDeviceManagerPool(rate_limiter, http_base_url=self.http_base_url)
+        tasks: t.Set[asyncio.Task[None]] = set()
+
+        try:
+            while True:
+                try:
+                    command = await self.loop.run_in_executor(None, self.commands.recv)
+                except EOFError:
+                    # Supervisor is gone
+                    break
+
+                if command[0] == _CMD_SHUTDOWN:
+                    break
+
+                task = asyncio.create_task(self._handle_command(command))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.pool.shutdown()
+            self._flush_events()
+
+    async def _handle_command(self, command: t.Tuple[t.Any, ...]) -> None:
+        opcode, request_id, *args = command
+
+        result: t.Any = None
+
+        try:
+            if opcode == _CMD_ADD_ACCOUNT:
+                result = await self._add_account(*args)
+            elif opcode == _CMD_REMOVE_ACCOUNT:
+                await self._remove_account(*args)
+            elif opcode == _CMD_SEND_STATE:
+                await self._send_state(*args)
+            else:
+                raise ToshibaAcDeviceManagerSupervisorError(f"Unknown command {opcode}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._emit((_EVENT_REPLY, request_id, f"{type(e).__name__}: {e}", None))
+        else:
+            self._emit((_EVENT_REPLY, request_id, None, result))
+
+    async def _add_account(
+        self,
+        username: str,
+        password: str,
+        device_id: t.Optional[str],
+        sas_token: t.Optional[str],
+        brand_id: t.Optional[str],
+    ) -> t.Tuple[str, t.List[t.Tuple[t.Any, ...]]]:
+        manager = await self.pool.add_account(username, password, device_id, sas_token, brand_id)
+        manager.on_sas_token_updated_callback.add(functools.partial(self._on_sas_token_updated, username))
+
+        try:
+            devices = await manager.get_devices()
+        except:
+            await self.pool.remove_account(username)
+            raise
+
+        for device in devices:
+            self.devices[device.ac_unique_id] = device
+            device.on_state_change_set_callback.add(self._on_state_change)
+            device.on_energy_consumption_changed_callback.add(self._on_energy_consumption_changed)
+
+        devices_info = [
+            (
+                device.name,
+                device.ac_id,
+                device.ac_unique_id,
+                device.firmware_version,
+                device.supported,
+                device.fcu_state.raw.tobytes(),
+            )
+            for device in devices
+        ]
+
+        return manager.sas_token or "", devices_info
+
+    async def _remove_account(self, username: str) -> None:
+        manager = self.pool.managers.get(username)
+
+        if manager:
+            for ac_unique_id in manager.devices:
+                self.devices.pop(ac_unique_id, None)
+
+        await self.pool.remove_account(username)
+
+    async def _send_state(self, ac_unique_id: str, raw_state: bytes) -> None:
+        device = self.devices.get(ac_unique_id)
+
+        if not device:
+            raise ToshibaAcDeviceManagerSupervisorError(f"Unknown device {ac_unique_id}")
+
+        await device.send_state_to_ac(ToshibaAcFcuState.from_raw(raw_state))
+
+    def _on_state_change(self, change: ToshibaAcDeviceStateChange) -> None:
+        changed_mask = 0
+
+        for name in change.fields:
+            changed_mask |= _FIELD_BITS.get(name, 0)
+
+        if changed_mask:
+            device = change.device
+            self._emit((_EVENT_STATE, device.ac_unique_id, device.fcu_state.raw.tobytes(), changed_mask))
+
+    def _on_energy_consumption_changed(self, device: ToshibaAcDevice) -> None:
+        self._emit((_EVENT_ENERGY, device.ac_unique_id, device.ac_energy_consumption))
+
+    def _on_sas_token_updated(self, username: str, sas_token: str) -> None:
+        self._emit((_EVENT_SAS_TOKEN, username, sas_token))
+
+    def _emit(self, event: t.Tuple[t.Any, ...]) -> None:
+        self._pending_events.append(event)
+
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.loop.call_soon(self._flush_events)
+
+    def _flush_events(self) -> None:
+        self._flush_scheduled = False
+
+        if not self._pending_events:
+            return
+
+        events, self._pending_events = self._pending_events, []
+
+        try:
+            self.events.send(events)
+        except OSError as e:
+            logger.debug(f"Dropping {len(events)} events, supervisor is gone: {e}")
+
+
+def _worker_main(
+    commands: Connection,
+    events: Connection,
+    requests_per_second: float,
+    http_base_url: t.Optional[str],
+    log_level: int,
+) -> None:
+    logging.basicConfig(level=log_level, format="[%(asctime)s] %(levelname)-8s %(processName)s %(name)s: %(message)s")
+    logging.getLogger("toshiba_ac").setLevel(log_level)
+
+    try:
+        _ToshibaAcWorker(commands, events, requests_per_second, http_base_url).run()
+    except KeyboardInterrupt:
+        pass
+
+
+class ToshibaAcDeviceManagerSupervisor:
+    # Shards accounts across worker processes, each running own event loop with a ToshibaAcDeviceManagerPool,
+    # so AMQP decoding and device callbacks of many accounts are spread across CPU cores. Device state and
+    # events are mirrored to the parent process and callbacks are called in the parent event loop.
+    # Worker which exits unexpectedly is restarted and its accounts are added again.
+    SHUTDOWN_TIMEOUT_S = 30
+
+    def __init__(
+        self,
+        workers: t.Optional[int] = None,
+        requests_per_second: t.Optional[float] = None,
+        start_method: str = "spawn",
+        http_base_url: t.Optional[str] = None,
+    ) -> None:
+        self.workers_count = workers or os.cpu_count() or 1
+        # Request rate is shared between all accounts on the host, so each worker gets its part of it
+        self.requests_per_second = requests_per_second or 1 / ToshibaAcHttpApi.REQUEST_MIN_INTERVAL_S
+        self.http_base_url = http_base_url
+        self.devices: t.Dict[str, ToshibaAcRemoteDevice] = {}
+        self._context = multiprocessing.get_context(start_method)
+        self._workers: t.List[_ToshibaAcWorkerProcess] = []
+        self._request_ids = itertools.count()
+        self._callback_tasks: t.Set[asyncio.Task[None]] = set()
+        self._running = False
+        self._on_state_changed_callback = ToshibaAcRemoteDeviceStateChangeCallback()
+        self._on_energy_consumption_changed_callback = ToshibaAcRemoteDeviceCallback()
+        self._on_sas_token_updated_callback = ToshibaAcAccountSasTokenUpdatedCallback()
+
+    async def start(self) -> None:
+        if self._running:
+            return
+
+        self.loop = asyncio.get_running_loop()
+        self._running = True
+        self._workers = [self._start_worker(index) for index in range(self.workers_count)]
+
+    async def shutdown(self) -> None:
+        if not self._running:
+            return
+
+        self._running = False
+        workers, self._workers = self._workers, []
+
+        for worker in workers:
+            try:
+                worker.commands.send((_CMD_SHUTDOWN, None))
+            except OSError:
+                pass
+
+        await self.loop.run_in_executor(None, self._join_workers, workers)
+
+        for worker in workers:
+            self._fail_requests(worker, "Supervisor is shut down")
+            worker.commands.close()
+            worker.events.close()
+
+        await asyncio.gather(*self._callback_tasks, return_exceptions=True)
+
+        self.devices.clear()
+
+    def _join_workers(self, workers: t.List[_ToshibaAcWorkerProcess]) -> None:
+        for worker in workers:
+            worker.process.join(self.SHUTDOWN_TIMEOUT_S)
+
+            if worker.process.is_alive():
+                logger.warning(f"Worker {worker.index} did not shut down in time, terminating")
+                worker.process.terminate()
+                worker.process.join()
+
+            if worker.reader:
+                worker.reader.join()
+
+    def _start_worker(self, index: int) -> _ToshibaAcWorkerProcess:
+        commands_recv, commands_send = self._context.Pipe(duplex=False)
+        events_recv, events_send = self._context.Pipe(duplex=False)
+
+        requests_per_second = self.requests_per_second / self.workers_count
+
+        process: BaseProcess = self._context.Process(  # type: ignore[attr-defined]
+            target=_worker_main,
+            args=(
+                commands_recv,
+                events_send,
+                requests_per_second,
+                self.http_base_url,
+                logging.getLogger("toshiba_ac").getEffectiveLevel(),
+            ),
+            name=f"toshiba_ac_worker_{index}",
+            daemon=True,
+        )
+        process.start()
+
+        # Only the worker keeps these ends open, so reader gets EOF as soon as the worker exits
+        commands_recv.close()
+        events_send.close()
+
+        worker = _ToshibaAcWorkerProcess(index, process, commands_send, events_recv)
+        worker.reader = threading.Thread(
+            target=self._read_events, args=(worker,), name=f"toshiba_ac_worker_{index}_reader", daemon=True
+        )
+        worker.reader.start()
+
+        return worker
+
+    def _read_events(self, worker: _ToshibaAcWorkerProcess) -> None:
+        while True:
+            try:
+                events = worker.events.recv()
+            except (EOFError, OSError):
+                break
+
+            try:
+                self.loop.call_soon_threadsafe(self._handle_events, worker, events)
+            except RuntimeError:
+                # Event loop is closed
+                return
+
+        try:
+            self.loop.call_soon_threadsafe(self._handle_worker_exit, worker)
+        except RuntimeError:
+            pass
+
+    def _handle_events(self, worker: _ToshibaAcWorkerProcess, events: t.List[t.Tuple[t.Any, ...]]) -> None:
+        for event in events:
+            opcode = event[0]
+
+            if opcode == _EVENT_STATE:
+                _, ac_unique_id, raw_state, changed_mask = event
+                device = self.devices.get(ac_unique_id)
+
+                if device:
+                    device.fcu_state = ToshibaAcFcuState.from_raw(raw_state)
+                    change = ToshibaAcRemoteDeviceStateChange(device, ToshibaAcFcuState.changed_fields(changed_mask))
+                    self._call_callback(self.on_state_changed_callback(change))
+
+            elif opcode == _EVENT_REPLY:
+                _, request_id, error, result = event
+                future = worker.requests.pop(request_id, None)
+
+                if future and not future.done():
+                    if error is not None:
+                        future.set_exception(ToshibaAcDeviceManagerSupervisorError(error))
+                    else:
+                        future.set_result(result)
+
+            elif opcode == _EVENT_ENERGY:
+                _, ac_unique_id, energy_consumption = event
+                device = self.devices.get(ac_unique_id)
+
+                if device:
+                    device.ac_energy_consumption = energy_consumption
+                    self._call_callback(self.on_energy_consumption_changed_callback(device))
+
+            elif opcode == _EVENT_SAS_TOKEN:
+                _, username, sas_token = event
+                account = worker.accounts.get(username)
+
+                if account:
+                    account.sas_token = sas_token
+                    self._call_callback(self.on_sas_token_updated_callback((username, sas_token)))
+
+            else:
+                logger.warning(f"Ignoring unknown event {opcode} from worker {worker.index}")
+
+    def _handle_worker_exit(self, worker: _ToshibaAcWorkerProcess) -> None:
+        if not self._running or self._workers[worker.index] is not worker:
+            return
+
+        logger.error(f"Worker {worker.index} exited unexpectedly, restarting it")
+
+        self._fail_requests(worker, f"Worker {worker.index} exited")
+        worker.commands.close()
+        worker.events.close()
+
+        new_worker = self._start_worker(worker.index)
+        self._workers[worker.index] = new_worker
+
+        for account in worker.accounts.values():
+            new_worker.accounts[account.username] = account
+            self._call_callback(self._restore_account(new_worker, account))
+
+    async def _restore_account(self, worker: _ToshibaAcWorkerProcess, account: _ToshibaAcAccount) -> None:
+        try:
+            await self._add_account_to_worker(worker, account)
+        except Exception as e:
+            logger.error(f"Failed to restore account {account.username} in worker {worker.index}: {e}")
+
+    def _fail_requests(self, worker: _ToshibaAcWorkerProcess, reason: str) -> None:
+        requests, worker.requests = worker.requests, {}
+
+        for future in requests.values():
+            if not future.done():
+                future.set_exception(ToshibaAcDeviceManagerSupervisorError(reason))
+
+    def _call_callback(self, coro: t.Coroutine[t.Any, t.Any, None]) -> None:
+        task = asyncio.create_task(coro)
+        self._callback_tasks.add(task)
+
+        def _on_done(done: asyncio.Task[None]) -> None:
+            self._callback_tasks.discard(done)
+
+            if not done.cancelled() and done.exception():
+                logger.error(f"Supervisor callback failed: {done.exception()}", exc_info=done.exception())
+
+        task.add_done_callback(_on_done)
+
+    async def _request(self, worker: _ToshibaAcWorkerProcess, opcode: int, *args: t.Any) -> t.Any:
+        if not self._running:
+            raise ToshibaAcDeviceManagerSupervisorError("Supervisor is not running")
+
+        request_id = next(self._request_ids)
+        future = self.loop.create_future()
+        worker.requests[request_id] = future
+
+        try:
+            worker.commands.send((opcode, request_id, *args))
+        except OSError as e:
+            worker.requests.pop(request_id, None)
+            raise ToshibaAcDeviceManagerSupervisorError(f"Worker {worker.index} is not available: {e}") from e
+
+        return await future
+
+    def _worker_of_account(self, username: str) -> t.Optional[_ToshibaAcWorkerProcess]:
+        for worker in self._workers:
+            if username in worker.accounts:
+                return worker
+
+        return None
+
+    async def add_account(
+        self,
+        username: str,
+        password: str,
+        device_id: t.Optional[str] = None,
+        sas_token: t.Optional[str] = None,
+        brand_id: t.Optional[str] = None,
+    ) -> t.List[ToshibaAcRemoteDevice]:
+        if not self._running:
+            raise ToshibaAcDeviceManagerSupervisorError("Supervisor is not running")
+
+        if self._worker_of_account(username):
+            raise ToshibaAcDeviceManagerSupervisorError(f"Account {username} already added")
+
+        account = _ToshibaAcAccount(username, password, device_id, sas_token, brand_id)
+
+        # Account is assigned right away, so accounts added concurrently are spread between workers
+        worker = min(self._workers, key=lambda worker: len(worker.accounts))
+        worker.accounts[username] = account
+
+        try:
+            return await self._add_account_to_worker(worker, account)
+        except:
+            worker.accounts.pop(username, None)
+            raise
+
+    async def _add_account_to_worker(
+        self, worker: _ToshibaAcWorkerProcess, account: _ToshibaAcAccount
+    ) -> t.List[ToshibaAcRemoteDevice]:
+        sas_token, devices_info = await self._request(
+            worker,
+            _CMD_ADD_ACCOUNT,
+            account.username,
+            account.password,
+            account.device_id,
+            account.sas_token,
+            account.brand_id,
+        )
+
+        if sas_token != account.sas_token:
+            account.sas_token = sas_token
+            self._call_callback(self.on_sas_token_updated_callback((account.username, sas_token)))
+
+        devices = []
+
+        for name, ac_id, ac_unique_id, firmware_version, supported, raw_state in devices_info:
+            device = self.devices.get(ac_unique_id)
+
+            if device:
+                device.name = name
+                device.firmware_version = firmware_version
+                device.supported = supported
+                device.fcu_state = ToshibaAcFcuState.from_raw(raw_state)
+            else:
+                device = ToshibaAcRemoteDevice(
+                    account.username,
+                    name,
+                    ac_id,
+                    ac_unique_id,
+                    firmware_version,
+                    supported,
+                    ToshibaAcFcuState.from_raw(raw_state),
+                )
+                self.devices[ac_unique_id] = device
+
+            devices.append(device)
+
+        return devices
+
+    async def remove_account(self, username: str) -> None:
+        worker = self._worker_of_account(username)
+
+        if not worker:
+            raise ToshibaAcDeviceManagerSupervisorError(f"Unknown account {username}")
+
+        try:
+            await self._request(worker, _CMD_REMOVE_ACCOUNT, username)
+        finally:
+            worker.accounts.pop(username, None)
+
+            for ac_unique_id in [key for key, device in self.devices.items() if device.username == username]:
+                del self.devices[ac_unique_id]
+
+    async def send_state_to_ac(self, ac_unique_id: str, state: ToshibaAcFcuState) -> None:
+        device = self.devices.get(ac_unique_id)
+        worker = self._worker_of_account(device.username) if device else None
+
+        if not worker:
+            raise ToshibaAcDeviceManagerSupervisorError(f"Unknown device {ac_unique_id}")
+
+        await self._request(worker, _CMD_SEND_STATE, ac_unique_id, state.raw.tobytes())
+
+    @property
+    def on_state_changed_callback(self) -> ToshibaAcRemoteDeviceStateChangeCallback:
+        return self._on_state_changed_callback
+
+    @property
+    def on_energy_consumption_changed_callback(self) -> ToshibaAcRemoteDeviceCallback:
+        return self._on_energy_consumption_changed_callback
+
+    @property
+    def on_sas_token_updated_callback(self) -> ToshibaAcAccountSasTokenUpdatedCallback:
+        return self._on_sas_token_updated_callback
@@ -0,0 +1,383 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import itertools
+import logging
+import random
+import secrets
+import time
+import typing as t
+import uuid
+from dataclasses import dataclass, field
+from types import TracebackType
+
+from aiohttp import web
+
+from toshiba_ac.device.fcu_state import ToshibaAcFcuState
+from toshiba_ac.device.properties import ToshibaAcFanMode, ToshibaAcMode, ToshibaAcStatus
+from toshiba_ac.utils.http_api import ToshibaAcHttpApi
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ToshibaAcFakeCloudAc:
+    ac_id: str
+    ac_unique_id: str
+    name: str
+    ac_state: str
+    firmware_version: str = "02.05.00"
+    merit_feature: str = "0b71"
+    ac_model_id: str = "3"
+    energy_wh: int = 0
+
+
+@dataclass
+class ToshibaAcFakeCloudAccount:
+    username: str
+    password: str
+    consumer_id: str
+    # Group name -> ACs in the group
+    groups: t.Dict[str, t.List[ToshibaAcFakeCloudAc]] = field(default_factory=dict)
+
+
+@dataclass
+class ToshibaAcFakeCloudStats:
+    # (path, status) -> number of responses
+    responses: t.Counter[t.Tuple[str, int]] = field(default_factory=collections.Counter)
+    max_in_flight: int = 0
+
+    def count(self, path: t.Optional[str] = None, status: t.Optional[int] = None) -> int:
+        return sum(
+            n
+            for (res_path, res_status), n in self.responses.items()
+            if (path is None or res_path == path) and (status is None or res_status == status)
+        )
+
+
+class ToshibaAcFakeCloud:
+    # Local aiohttp server mimicking Toshiba mobile API. Point ToshibaAcHttpApi to it with base_url.
+    # Every response can be delayed by latency_s (+ random latency_jitter_s). Authenticated requests
+    # are answered with 401 with unauthorized_rate probability, any request with 403 with rate_limited_rate
+    # probability or when more than max_requests_per_second requests come in.
+    TOKEN_TYPE = "Bearer"
+    SAS_TOKEN_VALIDITY_S = 24 * 60 * 60
+
+    def __init__(
+        self,
+        latency_s: float = 0.0,
+        latency_jitter_s: float = 0.0,
+        unauthorized_rate: float = 0.0,
+        rate_limited_rate: float = 0.0,
+        max_requests_per_second: t.Optional[float] = None,
+        seed: t.Optional[int] = None,
+    ) -> None:
+        self.latency_s = latency_s
+        self.latency_jitter_s = latency_jitter_s
+        self.unauthorized_rate = unauthorized_rate
+        self.rate_limited_rate = rate_limited_rate
+        self.max_requests_per_second = max_requests_per_second
+        self.accounts: t.Dict[str, ToshibaAcFakeCloudAccount] = {}
+        self.stats = ToshibaAcFakeCloudStats()
+        self._random = random.Random(seed)
+        self._ac_ids = itertools.count(1)
+        self._tokens: t.Dict[str, ToshibaAcFakeCloudAccount] = {}
+        self._acs: t.Dict[str, t.Tuple[ToshibaAcFakeCloudAccount, ToshibaAcFakeCloudAc]] = {}
+        self._acs_by_unique_id: t.Dict[str, ToshibaAcFakeCloudAc] = {}
+        self._request_times: t.Deque[float] = collections.deque()
+        self._in_flight = 0
+        self._runner: t.Optional[web.AppRunner] = None
+        self.base_url: t.Optional[str] = None
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_post(ToshibaAcHttpApi.LOGIN_PATH, self._login)
+        self.app.router.add_post(ToshibaAcHttpApi.REGISTER_PATH, self._register_mobile_device)
+        self.app.router.add_get(ToshibaAcHttpApi.AC_MAPPING_PATH, self._get_consumer_ac_mapping)
+        self.app.router.add_get(ToshibaAcHttpApi.AC_STATE_PATH, self._get_current_ac_state)
+        self.app.router.add_post(ToshibaAcHttpApi.AC_ENERGY_CONSUMPTION_PATH, self._get_group_ac_energy_consumption)
+
+    def add_account(
+        self, username: str, password: str, ac_count: int = 1, group_size: int = 10
+    ) -> ToshibaAcFakeCloudAccount:
+        account = ToshibaAcFakeCloudAccount(username, password, str(uuid.UUID(int=self._random.getrandbits(128))))
+        self.accounts[username] = account
+
+        for index in range(ac_count):
+            self.add_ac(account, f"Group {index // group_size + 1}")
+
+        return account
+
+    def add_ac(self, account: ToshibaAcFakeCloudAccount, group: str = "Group 1") -> ToshibaAcFakeCloudAc:
+        ac_number = next(self._ac_ids)
+        ac = ToshibaAcFakeCloudAc(
+            ac_id=str(uuid.UUID(int=self._random.getrandbits(128))),
+            ac_unique_id=str(uuid.UUID(int=self._random.getrandbits(128))),
+            name=f"AC {ac_number}",
+            ac_state=self._random_ac_state(),
+            energy_wh=self._random.randrange(0, 2000000),
+        )
+
+        account.groups.setdefault(group, []).append(ac)
+        self._acs[ac.ac_id] = (account, ac)
+        self._acs_by_unique_id[ac.ac_unique_id] = ac
+
+        return ac
+
+    def expire_tokens(self) -> None:
+        # All issued access tokens become invalid, clients have to log in again
+        self._tokens.clear()
+
+    def _random_ac_state(self) -> str:
+        state = ToshibaAcFcuState.from_hex_state("3042164131640010160effffffff10ffffffff")
+        state.ac_status = self._random.choice([ToshibaAcStatus.ON, ToshibaAcStatus.OFF])
+        state.ac_mode = self._random.choice([ToshibaAcMode.AUTO, ToshibaAcMode.COOL, ToshibaAcMode.HEAT])
+        state.ac_temperature = self._random.randint(17, 30)
+        state.ac_fan_mode = self._random.choice([ToshibaAcFanMode.AUTO, ToshibaAcFanMode.LOW, ToshibaAcFanMode.HIGH])
+        state.ac_indoor_temperature = self._random.randint(15, 30)
+        state.ac_outdoor_temperature = self._random.randint(-10, 35)
+        return state.encode()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        # With port 0 system picks a free port
+        self.base_url = f"http://{host}:{self._runner.addresses[0][1]}"
+
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+            self.base_url = None
+
+    async def __aenter__(self) -> ToshibaAcFakeCloud:
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: t.Optional[t.Type[BaseException]],
+        exc: t.Optional[BaseException],
+        tb: t.Optional[TracebackType],
+    ) -> None:
+        await self.stop()
+
+    @staticmethod
+    def _success(res_obj: t.Any) -> web.Response:
+        return web.json_response({"IsSuccess": True, "ResObj": res_obj, "StatusCode": "Success", "Message": ""})
+
+    @staticmethod
+    def _failure(status_code: str, message: str) -> web.Response:
+        return web.json_response({"IsSuccess": False, "ResObj": None, "StatusCode": status_code, "Message": message})
+
+    def _is_rate_limited(self) -> bool:
+        if self.rate_limited_rate and self._random.random() < self.rate_limited_rate:
+            return True
+
+        if self.max_requests_per_second is None:
+            return False
+
+        now = time.monotonic()
+
+        while self._request_times and self._request_times[0] <= now - 1.0:
+            self._request_times.popleft()
+
+        if len(self._request_times) >= self.max_requests_per_second:
+            return True
+
+        self._request_times.append(now)
+        return False
+
+    @web.middleware
+    async def _middleware(
+        self, request: web.Request, handler: t.Callable[[web.Request], t.Awaitable[web.StreamResponse]]
+    ) -> web.StreamResponse:
+        self._in_flight += 1
+        self.stats.max_in_flight = max(self.stats.max_in_flight, self._in_flight)
+
+        try:
+            if self.latency_s or self.latency_jitter_s:
+                await asyncio.sleep(self.latency_s + self._random.uniform(0, self.latency_jitter_s))
+
+            account = self._authorized_account(request) if request.path != ToshibaAcHttpApi.LOGIN_PATH else None
+
+            if self._is_rate_limited():
+                response: web.StreamResponse = web.Response(status=403, text="Forbidden")
+            elif request.path != ToshibaAcHttpApi.LOGIN_PATH and not account:
+                response = web.Response(status=401, text="Unauthorized")
+            else:
+                request["account"] = account
+                response = await handler(request)
+        finally:
+            self._in_flight -= 1
+
+        self.stats.responses[(request.path, response.status)] += 1
+
+        return response
+
+    def _authorized_account(self, request: web.Request) -> t.Optional[ToshibaAcFakeCloudAccount]:
+        if self.unauthorized_rate and self._random.random() < self.unauthorized_rate:
+            return None
+
+        token_type, _, token = request.headers.get("Authorization", "").partition(" ")
+
+        if token_type != self.TOKEN_TYPE:
+            return None
+
+        return self._tokens.get(token)
+
+    @staticmethod
+    def _account(request: web.Request) -> ToshibaAcFakeCloudAccount:
+        return t.cast(ToshibaAcFakeCloudAccount, request["account"])
+
+    async def _login(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        account = self.accounts.get(data.get("Username"))
+
+        if not account or account.password != data.get("Password"):
+            return self._failure("InvalidUserNameorPassword", "Invalid username or password")
+
+        token = secrets.token_hex(16)
+        self._tokens[token] = account
+
+        return self._success(
+            {
+                "access_token": token,
+                "token_type": self.TOKEN_TYPE,
+                "expires_in": 3600,
+                "consumerId": account.consumer_id,
+                "countryId": 1,
+            }
+        )
+
+    async def _register_mobile_device(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        expiry = int(time.time()) + self.SAS_TOKEN_VALIDITY_S
+        sas_token = (
+            f"SharedAccessSignature sr=toshiba-fake.azure-devices.net%2Fdevices%2F{data['DeviceID']}"
+            f"&sig={secrets.token_urlsafe(32)}&se={expiry}"
+        )
+
+        return self._success({"SasToken": sas_token, "DeviceId": data["DeviceID"], "HostName": "toshiba-fake"})
+
+    async def _get_consumer_ac_mapping(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+
+        if request.query.get("consumerId") != account.consumer_id:
+            return self._failure("Unauthorized", "Consumer id does not match")
+
+        groups = [
+            {
+                "GroupId": str(group_index),
+                "GroupName": group_name,
+                "ConsumerId": account.consumer_id,
+                "ACList": [
+                    {
+                        "Id": ac.ac_id,
+                        "DeviceUniqueId": ac.ac_unique_id,
+                        "Name": ac.name,
+                        "ACModelId": ac.ac_model_id,
+                        "ACStateData": ac.ac_state,
+                        "FirmwareVersion": ac.firmware_version,
+                        "MeritFeature": ac.merit_feature,
+                    }
+                    for ac in acs
+                ],
+            }
+            for group_index, (group_name, acs) in enumerate(account.groups.items())
+        ]
+
+        return self._success(groups)
+
+    async def _get_current_ac_state(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        owner, ac = self._acs.get(request.query.get("ACId", ""), (None, None))
+
+        if not ac or owner is not account:
+            return self._failure("NotFound", "AC not found")
+
+        return self._success(
+            {
+                "Id": ac.ac_id,
+                "ACStateData": ac.ac_state,
+                "Cdu": {"model_name": "RAS-FAKE-CDU"},
+                "Fcu": {"model_name": "RAS-FAKE-FCU"},
+            }
+        )
+
+    async def _get_group_ac_energy_consumption(self, request: web.Request) -> web.Response:
+        self._account(request)
+        data = await request.json()
+
+        res = [
+            {
+                "ACDeviceUniqueId": ac_unique_id,
+                "EnergyConsumption": [{"Energy": str(self._acs_by_unique_id[ac_unique_id].energy_wh)}],
+            }
+            for ac_unique_id in data.get("ACDeviceUniqueIdList", [])
+            if ac_unique_id in self._acs_by_unique_id
+        ]
+
+        return self._success(res)
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    cloud = ToshibaAcFakeCloud(
+        latency_s=args.latency,
+        unauthorized_rate=args.unauthorized_rate,
+        rate_limited_rate=args.rate_limited_rate,
+        max_requests_per_second=args.max_requests_per_second,
+    )
+
+    for index in range(args.accounts):
+        cloud.add_account(f"user{index}", "password", ac_count=args.acs)
+
+    base_url = await cloud.start(args.host, args.port)
+    print(f"Serving {args.accounts} accounts (user0..user{args.accounts - 1}, password 'password') at {base_url}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await cloud.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run local fake of Toshiba mobile API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--acs", type=int, default=1, help="number of ACs per account")
+    parser.add_argument("--latency", type=float, default=0.0, help="response delay in seconds")
+    parser.add_argument("--unauthorized-rate", type=float, default=0.0, help="probability of 401 response")
+    parser.add_argument("--rate-limited-rate", type=float, default=0.0, help="probability of 403 response")
+    parser.add_argument("--max-requests-per-second", type=float, default=None)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
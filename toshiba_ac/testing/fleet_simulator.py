@@ -0,0 +1,302 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import heapq
+import json
+import logging
+import math
+import random
+import time
+import typing as t
+from dataclasses import dataclass, field
+
+from toshiba_ac.device import ToshibaAcDevice
+from toshiba_ac.device.fcu_state import ToshibaAcFcuState
+from toshiba_ac.device.properties import ToshibaAcFanMode, ToshibaAcMode, ToshibaAcStatus
+from toshiba_ac.testing.fake_cloud import ToshibaAcFakeCloudAc, ToshibaAcFakeCloudAccount
+from toshiba_ac.testing.loopback_transport import (
+    ToshibaAcLoopbackAmqpTransport,
+    create_fcu_from_ac,
+    create_heartbeat,
+)
+
+logger = logging.getLogger(__name__)
+
+_STATE = "state"
+_HEARTBEAT = "heartbeat"
+
+
+class ToshibaAcFleetSimulatorError(Exception):
+    pass
+
+
+class ToshibaAcSimulatedAc:
+    # Single room modelled as one thermal mass. It leaks heat towards outdoor temperature and is pushed towards
+    # the setpoint by the AC with power depending on fan mode. Outdoor temperature follows a daily sine.
+    LEAK_RATE_PER_S = 1 / 3600
+    HVAC_RATE_C_PER_S = 1 / 300
+    OUTDOOR_DAILY_AMPLITUDE_C = 5.0
+    MAX_STEP_S = 60.0
+    FAN_POWER = {
+        ToshibaAcFanMode.QUIET: 0.4,
+        ToshibaAcFanMode.LOW: 0.6,
+        ToshibaAcFanMode.MEDIUM_LOW: 0.8,
+        ToshibaAcFanMode.MEDIUM: 1.0,
+        ToshibaAcFanMode.MEDIUM_HIGH: 1.2,
+        ToshibaAcFanMode.HIGH: 1.4,
+    }
+
+    def __init__(self, cloud_ac: ToshibaAcFakeCloudAc, sim_time_s: float = 0.0) -> None:
+        self.cloud_ac = cloud_ac
+        self.fcu_state = ToshibaAcFcuState.from_hex_state(cloud_ac.ac_state)
+        self.indoor_temperature = float(self.fcu_state.ac_indoor_temperature or 20)
+        self.outdoor_base_temperature = float(self.fcu_state.ac_outdoor_temperature or 10)
+        self.outdoor_temperature = self.outdoor_base_temperature
+        self.sim_time_s = sim_time_s
+
+    @property
+    def ac_unique_id(self) -> str:
+        return self.cloud_ac.ac_unique_id
+
+    def _hvac_rate(self) -> float:
+        state = self.fcu_state
+        setpoint = ToshibaAcDevice.ac_temperature_from_fcu_state(state)
+
+        if state.ac_status != ToshibaAcStatus.ON or setpoint is None:
+            return 0.0
+
+        error = setpoint - self.indoor_temperature
+
+        if state.ac_mode == ToshibaAcMode.HEAT:
+            error = max(error, 0.0)
+        elif state.ac_mode in (ToshibaAcMode.COOL, ToshibaAcMode.DRY):
+            error = min(error, 0.0)
+        elif state.ac_mode != ToshibaAcMode.AUTO:
+            return 0.0
+
+        # Power goes down close to the setpoint, as inverter units do
+        return self.HVAC_RATE_C_PER_S * self.FAN_POWER.get(state.ac_fan_mode, 1.0) * max(-1.0, min(1.0, error))
+
+    def advance(self, sim_time_s: float) -> None:
+        while self.sim_time_s < sim_time_s:
+            dt = min(self.MAX_STEP_S, sim_time_s - self.sim_time_s)
+            self.sim_time_s += dt
+            self.outdoor_temperature = self.outdoor_base_temperature + self.OUTDOOR_DAILY_AMPLITUDE_C * math.sin(
+                2 * math.pi * self.sim_time_s / 86400
+            )
+            leak = self.LEAK_RATE_PER_S * (self.outdoor_temperature - self.indoor_temperature)
+            self.indoor_temperature += (leak + self._hvac_rate()) * dt
+
+        self.fcu_state.ac_indoor_temperature = round(self.indoor_temperature)
+        self.fcu_state.ac_outdoor_temperature = round(self.outdoor_temperature)
+        self.cloud_ac.ac_state = self.fcu_state.encode()
+
+    def apply_command(self, hex_state: str) -> t.FrozenSet[str]:
+        changed = self.fcu_state.update(hex_state)
+        self.cloud_ac.ac_state = self.fcu_state.encode()
+        return changed
+
+    def heartbeat(self) -> t.Dict[str, str]:
+        # Heartbeat carries hex encoded single byte values, temperatures are signed
+        running = self.fcu_state.ac_status == ToshibaAcStatus.ON and self._hvac_rate() != 0.0
+        return {
+            "iTemp": f"{round(self.indoor_temperature) & 0xFF:02x}",
+            "oTemp": f"{round(self.outdoor_temperature) & 0xFF:02x}",
+            "fcuTcTemp": f"{round(self.indoor_temperature) & 0xFF:02x}",
+            "fcuTcjTemp": f"{round(self.indoor_temperature) & 0xFF:02x}",
+            "fcuFanRpm": "0a" if running else "00",
+            "cduTdTemp": f"{round(self.outdoor_temperature) & 0xFF:02x}",
+            "cduTsTemp": f"{round(self.outdoor_temperature) & 0xFF:02x}",
+            "cduTeTemp": f"{round(self.outdoor_temperature) & 0xFF:02x}",
+            "cduCompHz": "1e" if running else "00",
+            "cduFanRpm": "0a" if running else "00",
+            "cduPmvPulse": "00",
+            "cduIac": "00",
+        }
+
+
+@dataclass
+class ToshibaAcFleetSimulatorStats:
+    # Command name -> number of method requests injected
+    injected: t.Counter[str] = field(default_factory=collections.Counter)
+    commands_received: int = 0
+    # How late scheduled messages were injected, grows when the device manager can not keep up
+    max_schedule_lag_s: float = 0.0
+    # Most recent latencies from message injection to device state changed callback
+    latencies_s: t.Deque[float] = field(default_factory=lambda: collections.deque(maxlen=100000))
+
+    def latency_percentile(self, p: float) -> t.Optional[float]:
+        if not self.latencies_s:
+            return None
+
+        latencies = sorted(self.latencies_s)
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+
+class ToshibaAcFleetSimulator:
+    # Virtual ACs of a single fake cloud account talking over loopback AMQP transport. Every AC sends
+    # CMD_FCU_FROM_AC every state_interval_s and CMD_HEARTBEAT every heartbeat_interval_s (both in real time,
+    # phases are spread randomly), and answers CMD_FCU_TO_AC with its full state after response_delay_s.
+    # Simulated time runs time_scale times faster than real time. Pass create_transport as
+    # amqp_transport_factory of ToshibaAcDeviceManager.
+    def __init__(
+        self,
+        account: ToshibaAcFakeCloudAccount,
+        state_interval_s: float = 60.0,
+        heartbeat_interval_s: float = 30.0,
+        response_delay_s: float = 0.0,
+        time_scale: float = 1.0,
+        seed: t.Optional[int] = None,
+    ) -> None:
+        self.state_interval_s = state_interval_s
+        self.heartbeat_interval_s = heartbeat_interval_s
+        self.response_delay_s = response_delay_s
+        self.time_scale = time_scale
+        self.acs = {
+            cloud_ac.ac_unique_id: ToshibaAcSimulatedAc(cloud_ac)
+            for cloud_acs in account.groups.values()
+            for cloud_ac in cloud_acs
+        }
+        self.stats = ToshibaAcFleetSimulatorStats()
+        self.transport: t.Optional[ToshibaAcLoopbackAmqpTransport] = None
+        self._random = random.Random(seed)
+        self._sent_at: t.Dict[str, float] = {}
+        self._responses: t.Set[asyncio.Task[None]] = set()
+        self._task: t.Optional[asyncio.Task[None]] = None
+        self._started_at = time.monotonic()
+
+    def create_transport(self, sas_token: str) -> ToshibaAcLoopbackAmqpTransport:
+        self.transport = ToshibaAcLoopbackAmqpTransport(sas_token)
+        self.transport.on_message_sent = self._on_message_sent
+        return self.transport
+
+    def watch(self, devices: t.Iterable[ToshibaAcDevice]) -> None:
+        # Latency is measured from last message injected for the AC to the next state changed callback
+        for device in devices:
+            device.on_state_changed_callback.add(self._on_state_changed)
+
+    def start(self) -> None:
+        if self._task:
+            raise ToshibaAcFleetSimulatorError("Already started")
+
+        self._started_at = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [*self._responses]
+
+        if self._task:
+            tasks.append(self._task)
+            self._task = None
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def sim_time_s(self) -> float:
+        return (time.monotonic() - self._started_at) * self.time_scale
+
+    async def _run(self) -> None:
+        # (due time, sequence, ac unique id, message kind), sequence keeps ordering stable for equal due times
+        schedule: t.List[t.Tuple[float, int, str, str]] = []
+        sequence = 0
+
+        for ac_unique_id in self.acs:
+            for kind, interval in ((_STATE, self.state_interval_s), (_HEARTBEAT, self.heartbeat_interval_s)):
+                schedule.append((self._started_at + self._random.uniform(0, interval), sequence, ac_unique_id, kind))
+                sequence += 1
+
+        heapq.heapify(schedule)
+
+        while schedule:
+            now = time.monotonic()
+
+            if schedule[0][0] > now:
+                await asyncio.sleep(schedule[0][0] - now)
+                continue
+
+            due, _, ac_unique_id, kind = heapq.heappop(schedule)
+            self.stats.max_schedule_lag_s = max(self.stats.max_schedule_lag_s, now - due)
+
+            if kind == _STATE:
+                await self._inject_state(self.acs[ac_unique_id])
+                interval = self.state_interval_s
+            else:
+                await self._inject_heartbeat(self.acs[ac_unique_id])
+                interval = self.heartbeat_interval_s
+
+            heapq.heappush(schedule, (due + interval, sequence, ac_unique_id, kind))
+            sequence += 1
+
+    async def _inject(self, ac: ToshibaAcSimulatedAc, command: str, request: t.Dict[str, t.Any]) -> None:
+        if not self.transport or not self.transport.connected:
+            return
+
+        self._sent_at[ac.ac_unique_id] = time.perf_counter()
+        self.stats.injected[command] += 1
+        await self.transport.inject_method_request(request)
+
+    async def _inject_state(self, ac: ToshibaAcSimulatedAc) -> None:
+        ac.advance(self.sim_time_s())
+        await self._inject(ac, "CMD_FCU_FROM_AC", create_fcu_from_ac(ac.ac_unique_id, ac.fcu_state.encode()))
+
+    async def _inject_heartbeat(self, ac: ToshibaAcSimulatedAc) -> None:
+        ac.advance(self.sim_time_s())
+        await self._inject(ac, "CMD_HEARTBEAT", create_heartbeat(ac.ac_unique_id, ac.heartbeat()))
+
+    async def _respond(self, ac: ToshibaAcSimulatedAc) -> None:
+        if self.response_delay_s:
+            await asyncio.sleep(self.response_delay_s)
+
+        await self._inject_state(ac)
+
+    def _on_message_sent(self, message: str) -> None:
+        try:
+            data = json.loads(message)
+            command = data["cmd"]
+            target_ids = data["targetId"]
+            hex_state = data["payload"]["data"]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Malformed message sent to simulated ACs: {message}: {e}")
+            return
+
+        if command != "CMD_FCU_TO_AC":
+            logger.info(f"Unsupported command sent to simulated ACs: {command}")
+            return
+
+        for ac_unique_id in target_ids:
+            ac = self.acs.get(ac_unique_id)
+
+            if not ac:
+                logger.warning(f"Command sent to unknown AC {ac_unique_id}")
+                continue
+
+            self.stats.commands_received += 1
+            ac.advance(self.sim_time_s())
+            ac.apply_command(hex_state)
+
+            task = asyncio.create_task(self._respond(ac))
+            self._responses.add(task)
+            task.add_done_callback(self._responses.discard)
+
+    def _on_state_changed(self, device: ToshibaAcDevice) -> None:
+        sent_at = self._sent_at.pop(device.ac_unique_id, None)
+
+        if sent_at is not None:
+            self.stats.latencies_s.append(time.perf_counter() - sent_at)
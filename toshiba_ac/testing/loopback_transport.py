@@ -0,0 +1,118 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import collections
+import itertools
+import logging
+import time
+import typing as t
+
+from toshiba_ac.utils.amqp_transport import ToshibaAcAmqpTransport
+
+logger = logging.getLogger(__name__)
+
+_message_ids = itertools.count()
+
+
+class ToshibaAcLoopbackAmqpTransportError(Exception):
+    pass
+
+
+def create_method_request(
+    command: str,
+    source_id: str,
+    payload: t.Dict[str, t.Any],
+    target_id: t.Optional[t.List[str]] = None,
+    message_id: t.Optional[str] = None,
+    time_stamp: t.Optional[str] = None,
+) -> t.Dict[str, t.Any]:
+    # Method request payload in the format sent by Toshiba cloud on behalf of AC
+    return {
+        "sourceId": source_id,
+        "messageId": message_id or f"{next(_message_ids):07x}",
+        "targetId": target_id or [],
+        "cmd": command,
+        "payload": payload,
+        "timeStamp": time_stamp or time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+    }
+
+
+def create_fcu_from_ac(source_id: str, hex_state: str, **kwargs: t.Any) -> t.Dict[str, t.Any]:
+    return create_method_request("CMD_FCU_FROM_AC", source_id, {"data": hex_state}, **kwargs)
+
+
+def create_heartbeat(source_id: str, payload: t.Dict[str, str], **kwargs: t.Any) -> t.Dict[str, t.Any]:
+    return create_method_request("CMD_HEARTBEAT", source_id, payload, **kwargs)
+
+
+class ToshibaAcLoopbackAmqpTransport(ToshibaAcAmqpTransport):
+    # In-process transport, method requests are injected directly into ToshibaAcAmqpApi and sent messages
+    # are handed to on_message_sent. Use it with ToshibaAcDeviceManager(amqp_transport_factory=...) to
+    # exercise the whole receive path without IoT Hub. Last max_recorded sent messages are kept in sent_messages.
+    def __init__(self, sas_token: str = "", max_recorded: int = 1000) -> None:
+        super().__init__()
+        self.sas_token = sas_token
+        self.connected = False
+        self.sent_messages: t.Deque[str] = collections.deque(maxlen=max_recorded)
+        self.on_message_sent: t.Optional[t.Callable[[str], None]] = None
+        self.messages_sent = 0
+        self.method_requests_acked = 0
+        self.sas_token_updates = 0
+
+    async def connect(self) -> None:
+        self.connected = True
+
+    async def shutdown(self) -> None:
+        self.connected = False
+
+    async def send_message(self, message: str) -> None:
+        if not self.connected:
+            raise ToshibaAcLoopbackAmqpTransportError("Not connected")
+
+        self.messages_sent += 1
+        self.sent_messages.append(message)
+
+        if self.on_message_sent:
+            self.on_message_sent(message)
+
+    async def update_sas_token(self, sas_token: str) -> None:
+        self.sas_token = sas_token
+        self.sas_token_updates += 1
+
+    async def inject_method_request(self, data: t.Any, name: str = "smmobile") -> None:
+        # Returns once the request is handled and acknowledged, device handlers run later on the event loop
+        if not self.connected:
+            raise ToshibaAcLoopbackAmqpTransportError("Not connected")
+
+        try:
+            if self.on_method_request:
+                await self.on_method_request(name, data)
+        finally:
+            self.method_requests_acked += 1
+
+    async def inject_method_requests(self, requests: t.Iterable[t.Any], name: str = "smmobile") -> int:
+        count = 0
+
+        for data in requests:
+            await self.inject_method_request(data, name)
+            count += 1
+
+        return count
+
+    async def expire_sas_token(self) -> None:
+        # Behaves like IoT Hub client when SAS token is about to expire
+        if self.on_new_sas_token_required:
+            await self.on_new_sas_token_required()
@@ -17,9 +17,13 @@ import datetime
 import functools
 import logging
 import random
+import time
 import typing as t
 from enum import Enum
 
+from toshiba_ac.utils.metrics import get_metrics
+from toshiba_ac.utils.tracing import span
+
 logger = logging.getLogger(__name__)
 
 
@@ -103,7 +107,13 @@ def retry_with_timeout(
                             growth_factor=growth_factor,
                             jitter_mode=jitter_mode,
                         )
-                        await asyncio.sleep(bk)
+                        metrics = get_metrics()
+                        if metrics:
+                            metrics.retries.labels(func.__qualname__, "TimeoutError").inc()
+                        with span(
+                            "retry_backoff", function=func.__qualname__, attempt=attempt, exception="TimeoutError"
+                        ):
+                            await asyncio.sleep(bk)
                     else:
                         raise
 
@@ -149,7 +159,13 @@ def retry_on_exception(
                             f"Known exception occurred ({type(e).__name__}: {error_preview}). "
                             f"Retry {attempt}/{retries} after backoff {bk:.2f}s."
                         )
-                        await asyncio.sleep(bk)
+                        metrics = get_metrics()
+                        if metrics:
+                            metrics.retries.labels(func.__qualname__, type(e).__name__).inc()
+                        with span(
+                            "retry_backoff", function=func.__qualname__, attempt=attempt, exception=type(e).__name__
+                        ):
+                            await asyncio.sleep(bk)
                     else:
                         raise
 
@@ -180,12 +196,22 @@ class ToshibaAcCallback(t.Generic[T]):
         return False
 
     async def __call__(self, device: T) -> None:
+        # Nothing to measure or trace, awaiting empty gather would not yield to the loop either
+        if not self.callbacks:
+            return
+
+        metrics = get_metrics()
+        start = time.perf_counter() if metrics else 0.0
         asyncs = []
 
-        for callback in self.callbacks:
-            if asyncio.iscoroutinefunction(callback):
-                asyncs.append(t.cast(t.Awaitable[None], callback(device)))
-            else:
-                callback(device)
+        with span("ToshibaAcCallback", callback=type(self).__name__):
+            for callback in self.callbacks:
+                if asyncio.iscoroutinefunction(callback):
+                    asyncs.append(t.cast(t.Awaitable[None], callback(device)))
+                else:
+                    callback(device)
+
+            await asyncio.gather(*asyncs)
 
-        await asyncio.gather(*asyncs)
+        if metrics:
+            metrics.callback_duration.labels(type(self).__name__).observe(time.perf_counter() - start)
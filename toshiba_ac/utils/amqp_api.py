@@ -17,31 +17,45 @@ from __future__ import annotations
 import logging
 import typing as t
 
-from azure.iot.device import Message, MethodRequest, MethodResponse
-from azure.iot.device.aio import IoTHubDeviceClient
-from azure.iot.device.custom_typing import JSONSerializable
+from toshiba_ac.utils.amqp_transport import ToshibaAcAmqpTransport
+from toshiba_ac.utils.metrics import get_metrics
+from toshiba_ac.utils.tracing import span
+
+if t.TYPE_CHECKING:
+    from azure.iot.device.custom_typing import JSONSerializable
 
 logger = logging.getLogger(__name__)
 
 
 class ToshibaAcAmqpApi:
     COMMANDS = ["CMD_FCU_FROM_AC", "CMD_HEARTBEAT"]
-    _HANDLER_TYPE = t.Callable[[str, str, list[JSONSerializable], dict[str, JSONSerializable], str], None]
-
-    def __init__(self, sas_token: str, new_sas_token_required_callback: t.Callable[[], t.Awaitable[str]]) -> None:
+    if t.TYPE_CHECKING:
+        _HANDLER_TYPE = t.Callable[[str, str, list[JSONSerializable], dict[str, JSONSerializable], str], None]
+
+    def __init__(
+        self,
+        sas_token: str,
+        new_sas_token_required_callback: t.Callable[[], t.Awaitable[str]],
+        transport: t.Optional[ToshibaAcAmqpTransport] = None,
+    ) -> None:
         self.sas_token = sas_token
         self.handlers: t.Dict[str, ToshibaAcAmqpApi._HANDLER_TYPE] = {}
 
-        self.device = IoTHubDeviceClient.create_from_sastoken(self.sas_token)
-        self.device.on_method_request_received = self.method_request_received
-        self.device.on_new_sastoken_required = self.new_sas_token_required  # type: ignore
+        if transport is None:
+            from toshiba_ac.utils.amqp_transport import ToshibaAcAzureAmqpTransport
+
+            transport = ToshibaAcAzureAmqpTransport(self.sas_token)
+
+        self.transport = transport
+        self.transport.on_method_request = self.method_request_received
+        self.transport.on_new_sas_token_required = self.new_sas_token_required
         self.on_new_sastoken_required_callback = new_sas_token_required_callback
 
     async def connect(self) -> None:
-        await self.device.connect()
+        await self.transport.connect()
 
     async def shutdown(self) -> None:
-        await self.device.shutdown()
+        await self.transport.shutdown()
 
     def register_command_handler(self, command: str, handler: ToshibaAcAmqpApi._HANDLER_TYPE) -> None:
         if command not in self.COMMANDS:
@@ -51,73 +65,69 @@ class ToshibaAcAmqpApi:
     async def new_sas_token_required(self) -> None:
         logger.info(f"SAS token is about to expire")
         new_token = await self.on_new_sastoken_required_callback()
-        await self.device.update_sastoken(new_token)
+        await self.transport.update_sas_token(new_token)
 
-    async def _ack_method_request(self, method_data: MethodRequest) -> None:
-        try:
-            await self.device.send_method_response(MethodResponse.create_from_method_request(method_data, 0))
-        except Exception:
-            logger.exception(f"Failed to send method response for {method_data.name}")
+    async def method_request_received(self, name: str, data: t.Any) -> None:
+        # Method request is acknowledged by the transport once this returns, whatever the outcome
+        if name != "smmobile":
+            logger.info(f"Unknown method name: {name} full data: {data}")
+            return
 
-    async def method_request_received(self, method_data: MethodRequest) -> None:
-        try:
-            if method_data.name != "smmobile":
-                logger.info(f"Unknown method name: {method_data.name} full data: {method_data.payload}")
-                return
+        if not isinstance(data, dict):
+            logger.info(f"Unsupported payload type for method {name}: {type(data)}")
+            return
 
-            if not isinstance(method_data.payload, dict):
-                logger.info(f"Unsupported payload type for method {method_data.name}: {type(method_data.payload)}")
-                return
+        command = data.get("cmd")
+        payload = data.get("payload")
 
-            data = method_data.payload
-            command = data.get("cmd")
-            payload = data.get("payload")
+        if not isinstance(command, str):
+            logger.error(f"Malformed command in payload: {payload}")
+            return
 
-            if not isinstance(command, str):
-                logger.error(f"Malformed command in payload: {payload}")
-                return
+        metrics = get_metrics()
+        if metrics:
+            metrics.amqp_method_requests.labels(command).inc()
 
-            handler = self.handlers.get(command)
+        handler = self.handlers.get(command)
 
-            if not handler:
-                logger.info(f"Unhandled command {command} with payload: {payload}")
-                return
+        if not handler:
+            logger.info(f"Unhandled command {command} with payload: {payload}")
+            return
 
-            source_id = data.get("sourceId")
-            message_id = data.get("messageId")
-            target_id = data.get("targetId")
-            time_stamp = data.get("timeStamp")
+        source_id = data.get("sourceId")
+        message_id = data.get("messageId")
+        target_id = data.get("targetId")
+        time_stamp = data.get("timeStamp")
 
-            if not isinstance(source_id, str):
-                logger.error(f"Malformed sourceId in command {command} with payload: {payload}")
-                return
+        if not isinstance(source_id, str):
+            logger.error(f"Malformed sourceId in command {command} with payload: {payload}")
+            return
 
-            if not isinstance(message_id, str):
-                logger.error(f"Malformed messageId in command {command} with payload: {payload}")
-                return
+        if not isinstance(message_id, str):
+            logger.error(f"Malformed messageId in command {command} with payload: {payload}")
+            return
 
-            if not isinstance(target_id, list):
-                logger.error(f"Malformed targetId in command {command} with payload: {payload}")
-                return
+        if not isinstance(target_id, list):
+            logger.error(f"Malformed targetId in command {command} with payload: {payload}")
+            return
 
-            if not isinstance(payload, dict):
-                logger.error(f"Malformed payload in command {command} with payload: {payload}")
-                return
+        if not isinstance(payload, dict):
+            logger.error(f"Malformed payload in command {command} with payload: {payload}")
+            return
 
-            if not isinstance(time_stamp, str):
-                logger.error(f"Malformed timeStamp in command {command} with payload: {payload}")
-                return
+        if not isinstance(time_stamp, str):
+            logger.error(f"Malformed timeStamp in command {command} with payload: {payload}")
+            return
 
+        # Device handlers scheduled by the handler inherit this span as their parent
+        with span(
+            "ToshibaAcAmqpApi.method_request_received", command=command, source_id=source_id, message_id=message_id
+        ):
             try:
                 handler(source_id, message_id, target_id, payload, time_stamp)
             except Exception:
                 logger.exception(f"Command handler failed for {command} with payload: {payload}")
-        finally:
-            await self._ack_method_request(method_data)
 
     async def send_message(self, message: str) -> None:
-        msg = Message(str(message))  # type: ignore
-        msg.custom_properties["type"] = "mob"
-        msg.content_type = "application/json"
-        msg.content_encoding = "utf-8"
-        await self.device.send_message(msg)
+        with span("ToshibaAcAmqpApi.send_message"):
+            await self.transport.send_message(message)
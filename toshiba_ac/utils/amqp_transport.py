@@ -0,0 +1,104 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import abc
+import logging
+import time
+import typing as t
+
+from toshiba_ac.utils.metrics import get_metrics
+
+if t.TYPE_CHECKING:
+    from azure.iot.device import MethodRequest
+
+logger = logging.getLogger(__name__)
+
+# Called with method name and its payload, request is acknowledged once it returns
+ToshibaAcMethodRequestCallback = t.Callable[[str, t.Any], t.Awaitable[None]]
+ToshibaAcSasTokenRequiredCallback = t.Callable[[], t.Awaitable[None]]
+
+
+class ToshibaAcAmqpTransport(abc.ABC):
+    # Messaging channel used by ToshibaAcAmqpApi. Callbacks are set by the API before connect.
+
+    def __init__(self) -> None:
+        self.on_method_request: t.Optional[ToshibaAcMethodRequestCallback] = None
+        self.on_new_sas_token_required: t.Optional[ToshibaAcSasTokenRequiredCallback] = None
+
+    @abc.abstractmethod
+    async def connect(self) -> None: ...
+
+    @abc.abstractmethod
+    async def shutdown(self) -> None: ...
+
+    @abc.abstractmethod
+    async def send_message(self, message: str) -> None: ...
+
+    @abc.abstractmethod
+    async def update_sas_token(self, sas_token: str) -> None: ...
+
+
+class ToshibaAcAzureAmqpTransport(ToshibaAcAmqpTransport):
+    def __init__(self, sas_token: str) -> None:
+        # Azure IoT SDK is slow to import, it is loaded only once the transport is created
+        from azure.iot.device.aio import IoTHubDeviceClient
+
+        super().__init__()
+        self.device = IoTHubDeviceClient.create_from_sastoken(sas_token)
+        self.device.on_method_request_received = self._method_request_received
+        self.device.on_new_sastoken_required = self._new_sas_token_required  # type: ignore
+
+    async def connect(self) -> None:
+        await self.device.connect()
+
+    async def shutdown(self) -> None:
+        await self.device.shutdown()
+
+    async def send_message(self, message: str) -> None:
+        from azure.iot.device import Message
+
+        # Message objects are updated by the SDK while sending, so a new one is needed every time
+        msg = Message(message, content_encoding="utf-8", content_type="application/json")  # type: ignore
+        msg.custom_properties["type"] = "mob"
+        await self.device.send_message(msg)
+
+    async def update_sas_token(self, sas_token: str) -> None:
+        await self.device.update_sastoken(sas_token)
+
+    async def _new_sas_token_required(self) -> None:
+        if self.on_new_sas_token_required:
+            await self.on_new_sas_token_required()
+
+    async def _ack_method_request(self, method_data: MethodRequest) -> None:
+        from azure.iot.device import MethodResponse
+
+        start = time.perf_counter()
+
+        try:
+            await self.device.send_method_response(MethodResponse.create_from_method_request(method_data, 0))
+        except Exception:
+            logger.exception(f"Failed to send method response for {method_data.name}")
+
+        metrics = get_metrics()
+        if metrics:
+            metrics.amqp_ack_duration.observe(time.perf_counter() - start)
+
+    async def _method_request_received(self, method_data: MethodRequest) -> None:
+        try:
+            if self.on_method_request:
+                await self.on_method_request(method_data.name, method_data.payload)
+        finally:
+            await self._ack_method_request(method_data)
@@ -12,16 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from __future__ import annotations
+
 import datetime
 import asyncio
 import logging
-import random
+import time
 import typing as t
 from dataclasses import dataclass
 
-import aiohttp
 from toshiba_ac.device.properties import ToshibaAcDeviceEnergyConsumption
 from toshiba_ac.utils import RetryJitterMode, retry_on_exception
+from toshiba_ac.utils.metrics import get_metrics
+from toshiba_ac.utils.tracing import span, traced
+from toshiba_ac.utils.rate_limiter import ToshibaAcRateLimiter
+
+# aiohttp is slow to import, it is loaded only once ToshibaAcHttpApi is created
+if t.TYPE_CHECKING:
+    import aiohttp
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +49,7 @@ class ToshibaAcDeviceInfo:
 class ToshibaAcDeviceAdditionalInfo:
     cdu: t.Optional[str]
     fcu: t.Optional[str]
+    ac_state: t.Optional[str] = None
 
 
 class ToshibaAcHttpApiError(Exception):
@@ -55,9 +64,22 @@ class ToshibaAcHttpApiRateLimitError(ToshibaAcHttpApiError):
     pass
 
 
+def _is_retryable_error(e: BaseException) -> bool:
+    import aiohttp
+
+    if isinstance(e, (ToshibaAcHttpApiAuthError, ToshibaAcHttpApiRateLimitError)):
+        return False
+
+    return isinstance(e, (ToshibaAcHttpApiError, aiohttp.ClientError, asyncio.TimeoutError))
+
+
 class ToshibaAcHttpApi:
     REQUEST_MIN_INTERVAL_S = 0.15
     REQUEST_JITTER_S = 0.25
+    REQUEST_MAX_CONCURRENCY = 4
+    REQUEST_BURST = 4
+    REQUEST_MIN_RATE = 0.1
+    RESPONSE_CACHE_TTL_S = 10.0
     BASE_URL = "https://mobileapi.toshibahomeaccontrols.com"
     USER_AGENT = (
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
@@ -69,38 +91,63 @@ class ToshibaAcHttpApi:
     AC_STATE_PATH = "/api/AC/GetCurrentACState"
     AC_ENERGY_CONSUMPTION_PATH = "/api/AC/GetGroupACEnergyConsumption"
 
-    def __init__(self, username: str, password: str, brand_id: t.Optional[str] = None) -> None:
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        brand_id: t.Optional[str] = None,
+        rate_limiter: t.Optional[ToshibaAcRateLimiter] = None,
+        session: t.Optional[aiohttp.ClientSession] = None,
+        base_url: t.Optional[str] = None,
+    ) -> None:
+        # Transport is imported here, so failure to import it surfaces when the API is created
+        import aiohttp
+
         self.username = username
         self.password = password
         self.brand_id = brand_id
+        # Allows pointing the API to another server, e.g. toshiba_ac.testing.fake_cloud
+        self.base_url = base_url or self.BASE_URL
         self.access_token: t.Optional[str] = None
         self.access_token_type: t.Optional[str] = None
         self.consumer_id: t.Optional[str] = None
-        self.session: t.Optional[aiohttp.ClientSession] = None
+        # Session passed by the caller may be shared with other instances, it is never closed here
+        self.session = session
+        self._owns_session = session is None
         self._session_lock = asyncio.Lock()
         self._auth_lock = asyncio.Lock()
         self._auth_generation = 0
-        self._request_pacing_lock = asyncio.Lock()
-        self._next_request_not_before = 0.0
-
-    async def _pace_requests(self) -> None:
-        async with self._request_pacing_lock:
-            loop = asyncio.get_running_loop()
-            now = loop.time()
-
-            wait_for = max(0.0, self._next_request_not_before - now)
-            if wait_for > 0:
-                await asyncio.sleep(wait_for)
-
-            self._next_request_not_before = (
-                loop.time() + self.REQUEST_MIN_INTERVAL_S + random.uniform(0.0, self.REQUEST_JITTER_S)
-            )
+        self.rate_limiter = rate_limiter or self.create_rate_limiter()
+        self._response_cache: t.Dict[t.Tuple[str, t.Tuple[t.Tuple[str, str], ...]], asyncio.Future[t.Any]] = {}
+        self._response_cache_expiry: t.Dict[t.Tuple[str, t.Tuple[t.Tuple[str, str], ...]], float] = {}
+
+    @classmethod
+    def create_rate_limiter(cls, rate: t.Optional[float] = None) -> ToshibaAcRateLimiter:
+        # Limiter with library defaults, to be shared by all APIs which should be limited together
+        rate = rate or 1 / cls.REQUEST_MIN_INTERVAL_S
+
+        return ToshibaAcRateLimiter(
+            rate=rate,
+            burst=cls.REQUEST_BURST,
+            max_concurrency=cls.REQUEST_MAX_CONCURRENCY,
+            jitter_s=cls.REQUEST_JITTER_S,
+            min_rate=min(rate, cls.REQUEST_MIN_RATE),
+        )
+
+    @staticmethod
+    def create_session(connector: t.Optional[aiohttp.BaseConnector] = None) -> aiohttp.ClientSession:
+        import aiohttp
+
+        timeout = aiohttp.ClientTimeout(total=20, connect=10, sock_read=15)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
 
     async def _ensure_session(self) -> None:
         async with self._session_lock:
             if not self.session or self.session.closed:
-                timeout = aiohttp.ClientTimeout(total=20, connect=10, sock_read=15)
-                self.session = aiohttp.ClientSession(timeout=timeout)
+                if not self._owns_session:
+                    raise ToshibaAcHttpApiError("Shared HTTP session is closed")
+
+                self.session = self.create_session()
 
     async def _refresh_auth_if_stale(self, failed_auth_generation: int) -> None:
         async with self._auth_lock:
@@ -109,23 +156,22 @@ class ToshibaAcHttpApi:
 
             await self.connect()
 
+    # Rate limiter slows down all requests after 403, so retry itself only needs a short backoff
+    @traced("ToshibaAcHttpApi.request_api")
     @retry_on_exception(
         exceptions=ToshibaAcHttpApiRateLimitError,
         retries=5,
-        backoff=10,
-        max_backoff=600,
+        backoff=2,
+        max_backoff=60,
         growth_factor=3,
         jitter_mode=RetryJitterMode.EQUAL,
     )
     @retry_on_exception(
-        exceptions=(ToshibaAcHttpApiError, aiohttp.ClientError, asyncio.TimeoutError),
+        exceptions=Exception,
         retries=2,
         backoff=5,
         max_backoff=30,
-        should_retry=lambda e: not isinstance(
-            e,
-            (ToshibaAcHttpApiAuthError, ToshibaAcHttpApiRateLimitError),
-        ),
+        should_retry=_is_retryable_error,
     )
     async def request_api(
         self,
@@ -135,6 +181,8 @@ class ToshibaAcHttpApi:
         headers: t.Any = None,
         reauth_on_auth_error: bool = True,
     ) -> t.Any:
+        import aiohttp
+
         auth_generation = self._auth_generation
         is_authenticated_request = False
 
@@ -149,15 +197,13 @@ class ToshibaAcHttpApi:
             }
             is_authenticated_request = True
 
-        url = self.BASE_URL + path
+        url = self.base_url + path
 
         await self._ensure_session()
 
         if not self.session:
             raise ToshibaAcHttpApiError("Failed to initialize HTTP session")
 
-        await self._pace_requests()
-
         method_args = {"params": get, "headers": headers}
 
         if post:
@@ -168,51 +214,105 @@ class ToshibaAcHttpApi:
             logger.debug(f"Sending GET to {url}")
             method = self.session.get
 
-        async with method(url, **method_args) as response:
-            logger.debug(f"Response code: {response.status}")
+        with span("ToshibaAcHttpApi.request", path=path) as request_span:
+            async with self.rate_limiter:
+                request_start = time.monotonic()
+                status = "error"
 
-            if response.status == 200:
                 try:
-                    json = await response.json()
-                except (aiohttp.ContentTypeError, ValueError) as e:
-                    raise ToshibaAcHttpApiError(f"Malformed JSON response for {path}: {e}") from e
-
-                if json["IsSuccess"]:
-                    return json["ResObj"]
+                    async with method(url, **method_args) as response:
+                        logger.debug(f"Response code: {response.status}")
+                        status = str(response.status)
+                        request_span.set_attribute("http.status_code", response.status)
+
+                        if response.status == 200:
+                            self.rate_limiter.report_success()
+
+                            try:
+                                json = await response.json()
+                            except (aiohttp.ContentTypeError, ValueError) as e:
+                                raise ToshibaAcHttpApiError(f"Malformed JSON response for {path}: {e}") from e
+
+                            if json["IsSuccess"]:
+                                return json["ResObj"]
+                            else:
+                                if json["StatusCode"] == "InvalidUserNameorPassword":
+                                    raise ToshibaAcHttpApiAuthError(json["Message"])
+
+                                raise ToshibaAcHttpApiError(json["Message"])
+
+                        response_text = await response.text()
+                        logger.warning(
+                            "Non-200 response from Toshiba API "
+                            f"(status={response.status}, path={path}, content_type={response.headers.get('Content-Type')}, "
+                            f"server={response.headers.get('Server')})"
+                        )
+                        logger.debug(f"Non-200 response body for {path} (first 500 chars): {response_text[:500]}")
+
+                        if is_authenticated_request and response.status == 401:
+                            if not reauth_on_auth_error:
+                                raise ToshibaAcHttpApiAuthError(f"HTTP 401 calling {path}")
+
+                            logger.warning(
+                                f"Auth failed for endpoint {path} with status 401. "
+                                f"Refreshing auth and retrying once."
+                            )
+
+                            metrics = get_metrics()
+                            if metrics:
+                                metrics.http_reauth.labels(path).inc()
+                        elif response.status == 403:
+                            self.rate_limiter.report_rate_limited()
+                            raise ToshibaAcHttpApiRateLimitError(f"HTTP 403 calling {path}")
+                        else:
+                            raise ToshibaAcHttpApiError(f"HTTP {response.status} calling {path}")
+                finally:
+                    metrics = get_metrics()
+                    if metrics:
+                        metrics.http_request_duration.labels(path, status).observe(time.monotonic() - request_start)
+
+        # Auth is refreshed only after rate limiter slot is released as refresh sends its own request
+        await self._refresh_auth_if_stale(auth_generation)
+        return await self.request_api(
+            path,
+            get=get,
+            post=post,
+            headers=None,
+            reauth_on_auth_error=False,
+        )
+
+    async def request_api_cached(self, path: str, get: dict[str, str] | None = None) -> t.Any:
+        # Concurrent GETs of the same resource share single request and its response is reused for a short time.
+        # Returned object is shared between callers, it must not be modified.
+        key = (path, tuple(sorted(get.items())) if get else ())
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        task = self._response_cache.get(key)
+
+        if not task or (task.done() and self._response_cache_expiry.get(key, 0.0) <= now):
+            for cached_key, expiry in list(self._response_cache_expiry.items()):
+                if expiry <= now:
+                    del self._response_cache_expiry[cached_key]
+                    self._response_cache.pop(cached_key, None)
+
+            task = asyncio.ensure_future(self.request_api(path, get=get))
+
+            def _on_done(done: asyncio.Future[t.Any]) -> None:
+                if self._response_cache.get(key) is not done:
+                    return
+
+                if done.cancelled() or done.exception():
+                    # Failures are not cached, next caller will retry
+                    del self._response_cache[key]
                 else:
-                    if json["StatusCode"] == "InvalidUserNameorPassword":
-                        raise ToshibaAcHttpApiAuthError(json["Message"])
-
-                    raise ToshibaAcHttpApiError(json["Message"])
-
-            response_text = await response.text()
-            logger.warning(
-                "Non-200 response from Toshiba API "
-                f"(status={response.status}, path={path}, content_type={response.headers.get('Content-Type')}, "
-                f"server={response.headers.get('Server')})"
-            )
-            logger.debug(f"Non-200 response body for {path} (first 500 chars): {response_text[:500]}")
-
-            if is_authenticated_request and response.status == 401:
-                if reauth_on_auth_error:
-                    logger.warning(
-                        f"Auth failed for endpoint {path} with status 401. " f"Refreshing auth and retrying once."
-                    )
-                    await self._refresh_auth_if_stale(auth_generation)
-                    return await self.request_api(
-                        path,
-                        get=get,
-                        post=post,
-                        headers=None,
-                        reauth_on_auth_error=False,
-                    )
+                    self._response_cache_expiry[key] = loop.time() + self.RESPONSE_CACHE_TTL_S
 
-                raise ToshibaAcHttpApiAuthError(f"HTTP 401 calling {path}")
+            task.add_done_callback(_on_done)
+            self._response_cache[key] = task
+            self._response_cache_expiry.pop(key, None)
 
-            if response.status == 403:
-                raise ToshibaAcHttpApiRateLimitError(f"HTTP 403 calling {path}")
-
-            raise ToshibaAcHttpApiError(f"HTTP {response.status} calling {path}")
+        return await asyncio.shield(task)
 
     async def connect(self) -> None:
         headers = {
@@ -230,9 +330,16 @@ class ToshibaAcHttpApi:
         self.consumer_id = res["consumerId"]
         self._auth_generation += 1
 
+    def restore_auth(self, access_token: str, access_token_type: str, consumer_id: str) -> None:
+        # Reuses access token from previous session instead of logging in. If it is no longer valid,
+        # first request gets 401 and regular login is done.
+        self.access_token = access_token
+        self.access_token_type = access_token_type
+        self.consumer_id = consumer_id
+
     async def shutdown(self) -> None:
         async with self._session_lock:
-            if self.session:
+            if self.session and self._owns_session:
                 await self.session.close()
                 self.session = None
 
@@ -269,7 +376,7 @@ class ToshibaAcHttpApi:
         if self.consumer_id:
             get["consumerId"] = self.consumer_id
 
-        res = await self.request_api(self.AC_STATE_PATH, get=get)
+        res = await self.request_api_cached(self.AC_STATE_PATH, get=get)
 
         if "ACStateData" not in res:
             raise ToshibaAcHttpApiError("Missing ACStateData in response")
@@ -286,7 +393,7 @@ class ToshibaAcHttpApi:
         if self.consumer_id:
             get["consumerId"] = self.consumer_id
 
-        res = await self.request_api(self.AC_STATE_PATH, get=get)
+        res = await self.request_api_cached(self.AC_STATE_PATH, get=get)
 
         try:
             cdu = res["Cdu"]["model_name"]
@@ -298,7 +405,12 @@ class ToshibaAcHttpApi:
         except (KeyError, TypeError):
             fcu = None
 
-        return ToshibaAcDeviceAdditionalInfo(cdu=cdu, fcu=fcu)
+        try:
+            ac_state = res["ACStateData"] if isinstance(res["ACStateData"], str) else None
+        except (KeyError, TypeError):
+            ac_state = None
+
+        return ToshibaAcDeviceAdditionalInfo(cdu=cdu, fcu=fcu, ac_state=ac_state)
 
     async def get_devices_energy_consumption(
         self, ac_unique_ids: t.List[str]
@@ -0,0 +1,68 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import json
+import typing as t
+
+# Compact JSON encoding of messages sent over AMQP. orjson is used when installed (fast extra), standard library
+# json otherwise, both produce the same output for messages built by the library.
+
+
+def _import_orjson() -> t.Any:
+    try:
+        import orjson
+    except ImportError:
+        return None
+
+    return orjson
+
+
+_orjson = _import_orjson()
+
+
+def dumps(obj: t.Any) -> str:
+    if _orjson:
+        return t.cast(bytes, _orjson.dumps(obj)).decode()
+
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+class ToshibaAcMessageTemplate:
+    # Message envelope serialized once, per message only values of messageId and payload data are put in. Spliced
+    # values have to be JSON string safe, which holds for ids and hex states generated by the library.
+    _MESSAGE_ID = "\x00messageId\x00"
+    _DATA = "\x00data\x00"
+    # Sent by the library since its first version, the cloud does not need real time
+    TIME_STAMP = "0000000"
+
+    def __init__(self, source_id: str, target_ids: t.Sequence[str], command: str) -> None:
+        envelope = dumps(
+            {
+                "sourceId": source_id,
+                "messageId": self._MESSAGE_ID,
+                "targetId": list(target_ids),
+                "cmd": command,
+                "payload": {"data": self._DATA},
+                "timeStamp": self.TIME_STAMP,
+            }
+        )
+        # Placeholders are escaped by any JSON encoder, find them in their encoded form
+        message_id, data = (dumps(placeholder) for placeholder in (self._MESSAGE_ID, self._DATA))
+        self._head, rest = envelope.split(message_id)
+        self._after_message_id, self._tail = rest.split(data)
+
+    def render(self, message_id: str, data: str) -> str:
+        return f'{self._head}"{message_id}"{self._after_message_id}"{data}"{self._tail}'
@@ -0,0 +1,330 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import typing as t
+
+# Library metrics are collected only after enable_metrics() is called, until then every instrumented place costs
+# a single global lookup. Metrics are rendered in Prometheus text exposition format by
+# ToshibaAcMetricsRegistry.render(), serving them over HTTP is left to the application.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+
+    return repr(float(value))
+
+
+def _format_labels(names: t.Sequence[str], values: t.Sequence[str]) -> str:
+    if not names:
+        return ""
+
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: t.Tuple[float, ...]) -> None:
+        self.upper_bounds = upper_bounds
+        # Last bucket is +Inf, counts are not cumulative, they are summed up when rendering
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+
+C = t.TypeVar("C", _CounterChild, _GaugeChild, _HistogramChild)
+
+
+class _Metric(t.Generic[C]):
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: t.Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: t.Dict[t.Tuple[str, ...], C] = {}
+        self._lock = threading.Lock()
+
+    def _create_child(self) -> C:
+        raise NotImplementedError
+
+    def labels(self, *values: t.Any) -> C:
+        # Children are updated without locking, library updates metrics from event loop threads only
+        key = tuple(str(value) for value in values)
+
+        try:
+            return self._children[key]
+        except KeyError:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {values}")
+
+            with self._lock:
+                return self._children.setdefault(key, self._create_child())
+
+    def remove(self, *values: t.Any) -> None:
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in values), None)
+
+    def _render_samples(self, labels: t.Tuple[str, ...], child: C) -> t.Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> t.Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+
+        with self._lock:
+            children = list(self._children.items())
+
+        for labels, child in children:
+            yield from self._render_samples(labels, child)
+
+
+class ToshibaAcCounter(_Metric[_CounterChild]):
+    TYPE = "counter"
+
+    def _create_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _render_samples(self, labels: t.Tuple[str, ...], child: _CounterChild) -> t.Iterator[str]:
+        yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(child.value)}"
+
+
+class ToshibaAcGauge(_Metric[_GaugeChild]):
+    TYPE = "gauge"
+
+    def _create_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def _render_samples(self, labels: t.Tuple[str, ...], child: _GaugeChild) -> t.Iterator[str]:
+        yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(child.value)}"
+
+
+class ToshibaAcHistogram(_Metric[_HistogramChild]):
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: t.Sequence[str] = (),
+        buckets: t.Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(bucket for bucket in buckets if bucket != math.inf))
+
+    def _create_child(self) -> _HistogramChild:
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _render_samples(self, labels: t.Tuple[str, ...], child: _HistogramChild) -> t.Iterator[str]:
+        labelnames = (*self.labelnames, "le")
+        cumulative = 0
+
+        for upper_bound, count in zip((*child.upper_bounds, math.inf), child.counts):
+            cumulative += count
+            yield f"{self.name}_bucket{_format_labels(labelnames, (*labels, _format_value(upper_bound)))} {cumulative}"
+
+        yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(child.sum)}"
+        yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class ToshibaAcMetricsRegistry:
+    def __init__(self) -> None:
+        self.metrics: t.Dict[str, _Metric[t.Any]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric[C]) -> _Metric[C]:
+        with self._lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+
+            self.metrics[metric.name] = metric
+
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: t.Sequence[str] = ()) -> ToshibaAcCounter:
+        return t.cast(ToshibaAcCounter, self.register(ToshibaAcCounter(name, documentation, labelnames)))
+
+    def gauge(self, name: str, documentation: str, labelnames: t.Sequence[str] = ()) -> ToshibaAcGauge:
+        return t.cast(ToshibaAcGauge, self.register(ToshibaAcGauge(name, documentation, labelnames)))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: t.Sequence[str] = (),
+        buckets: t.Sequence[float] = DEFAULT_BUCKETS,
+    ) -> ToshibaAcHistogram:
+        return t.cast(ToshibaAcHistogram, self.register(ToshibaAcHistogram(name, documentation, labelnames, buckets)))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self.metrics.values())
+
+        return "".join(line + "\n" for metric in metrics for line in metric.render())
+
+
+class ToshibaAcMetrics:
+    # All metrics collected by the library, created in the given registry
+    def __init__(self, registry: ToshibaAcMetricsRegistry) -> None:
+        self.registry = registry
+
+        self.http_request_duration = registry.histogram(
+            "toshiba_ac_http_request_duration_seconds",
+            "Duration of single HTTP request to Toshiba API, without pacing wait",
+            ("path", "status"),
+        )
+        self.http_pacing_wait = registry.histogram(
+            "toshiba_ac_http_pacing_wait_seconds",
+            "Time HTTP requests waited for the rate limiter",
+        )
+        self.http_reauth = registry.counter(
+            "toshiba_ac_http_reauth_total",
+            "HTTP requests answered with 401 that triggered re-authentication",
+            ("path",),
+        )
+        self.retries = registry.counter(
+            "toshiba_ac_retries_total",
+            "Retries done by retry decorators",
+            ("function", "exception"),
+        )
+        self.amqp_method_requests = registry.counter(
+            "toshiba_ac_amqp_method_requests_total",
+            "AMQP method requests received",
+            ("command",),
+        )
+        self.amqp_dispatch_latency = registry.histogram(
+            "toshiba_ac_amqp_dispatch_latency_seconds",
+            "Time from scheduling device handler of AMQP method request to its start",
+            ("command",),
+        )
+        self.amqp_handler_duration = registry.histogram(
+            "toshiba_ac_amqp_handler_duration_seconds",
+            "Execution time of device handlers of AMQP method requests",
+            ("command",),
+        )
+        self.amqp_ack_duration = registry.histogram(
+            "toshiba_ac_amqp_ack_duration_seconds",
+            "Time to acknowledge AMQP method request",
+        )
+        self.callback_duration = registry.histogram(
+            "toshiba_ac_callback_duration_seconds",
+            "Execution time of all callbacks registered in a callback set",
+            ("callback",),
+        )
+        self.command_round_trip = registry.histogram(
+            "toshiba_ac_command_round_trip_seconds",
+            "Time from sending command to AC until AC reported state with requested fields",
+        )
+        self.command_timeouts = registry.counter(
+            "toshiba_ac_command_timeouts_total",
+            "Commands not confirmed by AC in time",
+        )
+        self.device_state_changes = registry.counter(
+            "toshiba_ac_device_state_changes_total",
+            "AC state changes reported by devices",
+            ("device",),
+        )
+
+
+_metrics: t.Optional[ToshibaAcMetrics] = None
+
+
+def enable_metrics(registry: t.Optional[ToshibaAcMetricsRegistry] = None) -> ToshibaAcMetricsRegistry:
+    # Library metrics can be enabled only once per process, subsequent calls return the registry in use
+    global _metrics
+
+    if _metrics is None:
+        _metrics = ToshibaAcMetrics(registry or ToshibaAcMetricsRegistry())
+
+    return _metrics.registry
+
+
+def disable_metrics() -> None:
+    global _metrics
+    _metrics = None
+
+
+def get_metrics() -> t.Optional[ToshibaAcMetrics]:
+    return _metrics
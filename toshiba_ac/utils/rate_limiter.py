@@ -0,0 +1,209 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+import typing as t
+from dataclasses import dataclass
+from types import TracebackType
+
+from toshiba_ac.utils.metrics import get_metrics
+from toshiba_ac.utils.tracing import span
+
+
+@dataclass
+class ToshibaAcRateLimiterStats:
+    rate: float
+    rate_limited: int
+    queue_depth: int
+    in_flight: int
+    acquired: int
+    total_wait_s: float
+    max_wait_s: float
+    last_wait_s: float
+
+    @property
+    def average_wait_s(self) -> float:
+        return self.total_wait_s / self.acquired if self.acquired else 0.0
+
+
+class ToshibaAcRateLimiter:
+    # Token bucket limiting request rate with a burst capacity, combined with a cap on requests in flight.
+    # Single instance can be shared by many ToshibaAcHttpApi instances to limit them together.
+    #
+    # When min_rate is given the rate adapts to server feedback (AIMD): every reported rate limit
+    # cuts the rate by decrease_factor and pauses all callers for rate_limited_pause_s,
+    # every reported success raises it by increase_step until it gets back to max rate.
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        max_concurrency: t.Optional[int] = None,
+        jitter_s: float = 0.0,
+        min_rate: t.Optional[float] = None,
+        increase_step: t.Optional[float] = None,
+        decrease_factor: float = 0.5,
+        decrease_cooldown_s: float = 2.0,
+        rate_limited_pause_s: float = 5.0,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError(f"Rate has to be positive, got {rate}")
+
+        if burst < 1:
+            raise ValueError(f"Burst has to be at least 1, got {burst}")
+
+        if min_rate is not None and not 0 < min_rate <= rate:
+            raise ValueError(f"Min rate has to be positive and not greater than rate, got {min_rate}")
+
+        if not 0 < decrease_factor < 1:
+            raise ValueError(f"Decrease factor has to be between 0 and 1, got {decrease_factor}")
+
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.increase_step = increase_step if increase_step is not None else rate / 50
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown_s = decrease_cooldown_s
+        self.rate_limited_pause_s = rate_limited_pause_s
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.jitter_s = jitter_s
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._concurrency = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._queue_depth = 0
+        self._in_flight = 0
+        self._acquired = 0
+        self._total_wait_s = 0.0
+        self._max_wait_s = 0.0
+        self._last_wait_s = 0.0
+        self._rate_limited = 0
+        self._last_decrease = -float("inf")
+        self._paused_until = -float("inf")
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    async def _take_token(self) -> None:
+        # Every caller reserves its token right away and sleeps until the token is available, so waiters
+        # are served in order and their requests can overlap once they get going
+        self._refill()
+        self._tokens -= 1.0
+
+        if self._tokens >= 0.0:
+            return
+
+        wait_for = -self._tokens / self.rate
+
+        try:
+            while wait_for > 0:
+                # Jitter only spreads throttled callers, requests within the burst go out right away
+                await asyncio.sleep(wait_for + random.uniform(0.0, self.jitter_s))
+                # Callers that reserved their token before a rate limit was reported wait out the pause too
+                wait_for = self._paused_until - time.monotonic()
+        except BaseException:
+            # Give the token back so callers queued later are not delayed by a cancelled one
+            self._tokens += 1.0
+            raise
+
+    async def acquire(self) -> None:
+        start = time.monotonic()
+        self._queue_depth += 1
+
+        with span("ToshibaAcRateLimiter.acquire", queue_depth=self._queue_depth):
+            try:
+                if self._concurrency:
+                    await self._concurrency.acquire()
+
+                try:
+                    await self._take_token()
+                except BaseException:
+                    if self._concurrency:
+                        self._concurrency.release()
+                    raise
+            finally:
+                self._queue_depth -= 1
+
+        wait = time.monotonic() - start
+        self._in_flight += 1
+        self._acquired += 1
+        self._total_wait_s += wait
+        self._max_wait_s = max(self._max_wait_s, wait)
+        self._last_wait_s = wait
+
+        metrics = get_metrics()
+        if metrics:
+            metrics.http_pacing_wait.observe(wait)
+
+    def release(self) -> None:
+        self._in_flight -= 1
+
+        if self._concurrency:
+            self._concurrency.release()
+
+    def report_success(self) -> None:
+        if self.min_rate is None or self.rate >= self.max_rate:
+            return
+
+        self._refill()
+        self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def report_rate_limited(self) -> None:
+        self._rate_limited += 1
+
+        if self.min_rate is None:
+            return
+
+        now = time.monotonic()
+
+        # Requests sent before the previous decrease are likely to be rejected as well, count them once
+        if now - self._last_decrease < self.decrease_cooldown_s:
+            return
+
+        self._last_decrease = now
+        self._paused_until = now + self.rate_limited_pause_s
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        # Negative balance makes every caller wait out the pause together instead of each one on its own
+        self._tokens = min(self._tokens, 0.0) - self.rate_limited_pause_s * self.rate
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(
+        self,
+        exc_type: t.Optional[t.Type[BaseException]],
+        exc: t.Optional[BaseException],
+        tb: t.Optional[TracebackType],
+    ) -> None:
+        self.release()
+
+    @property
+    def stats(self) -> ToshibaAcRateLimiterStats:
+        return ToshibaAcRateLimiterStats(
+            rate=self.rate,
+            rate_limited=self._rate_limited,
+            queue_depth=self._queue_depth,
+            in_flight=self._in_flight,
+            acquired=self._acquired,
+            total_wait_s=self._total_wait_s,
+            max_wait_s=self._max_wait_s,
+            last_wait_s=self._last_wait_s,
+        )
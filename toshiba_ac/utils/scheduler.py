@@ -0,0 +1,106 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import typing as t
+
+from toshiba_ac.utils import async_sleep_until_next_multiply_of_minutes
+
+logger = logging.getLogger(__name__)
+
+ToshibaAcPeriodicJob = t.Callable[[], t.Awaitable[None]]
+
+
+class ToshibaAcPeriodicScheduler:
+    # Runs periodic jobs of any number of device managers. Jobs with the same period share single task
+    # which wakes up on next multiply of the period and starts them, at most max_concurrency run at once.
+
+    def __init__(self, max_concurrency: int = 16) -> None:
+        self.max_concurrency = max_concurrency
+        self.jobs: t.Dict[int, t.List[ToshibaAcPeriodicJob]] = {}
+        self.tasks: t.Dict[int, asyncio.Task[None]] = {}
+        self._running_jobs: t.Dict[asyncio.Task[None], ToshibaAcPeriodicJob] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def add(self, period_minutes: int, job: ToshibaAcPeriodicJob, run_immediately: bool = False) -> bool:
+        jobs = self.jobs.setdefault(period_minutes, [])
+
+        if job in jobs:
+            return False
+
+        jobs.append(job)
+
+        if period_minutes not in self.tasks:
+            self.tasks[period_minutes] = asyncio.create_task(self._run_periodically(period_minutes))
+
+        if run_immediately:
+            self._start_job(job)
+
+        return True
+
+    def remove(self, period_minutes: int, job: ToshibaAcPeriodicJob) -> bool:
+        jobs = self.jobs.get(period_minutes, [])
+
+        if job not in jobs:
+            return False
+
+        jobs.remove(job)
+
+        if not jobs:
+            del self.jobs[period_minutes]
+            self.tasks.pop(period_minutes).cancel()
+
+        for task, running_job in list(self._running_jobs.items()):
+            if running_job == job:
+                task.cancel()
+
+        return True
+
+    async def shutdown(self) -> None:
+        tasks = [*self.tasks.values(), *self._running_jobs]
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.jobs.clear()
+        self.tasks.clear()
+        self._running_jobs.clear()
+
+    def _start_job(self, job: ToshibaAcPeriodicJob) -> asyncio.Task[None]:
+        task = asyncio.create_task(self._run_job(job))
+        self._running_jobs[task] = job
+        task.add_done_callback(lambda done: self._running_jobs.pop(done, None))
+        return task
+
+    async def _run_job(self, job: ToshibaAcPeriodicJob) -> None:
+        async with self._semaphore:
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Periodic job {getattr(job, '__qualname__', job)} failed: {e}", exc_info=True)
+
+    async def _run_periodically(self, period_minutes: int) -> None:
+        while True:
+            await async_sleep_until_next_multiply_of_minutes(period_minutes)
+            # Job still running since previous period is not started again
+            running = set(self._running_jobs.values())
+            jobs = [self._start_job(job) for job in self.jobs.get(period_minutes, []) if job not in running]
+            await asyncio.gather(*jobs, return_exceptions=True)
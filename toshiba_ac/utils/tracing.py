@@ -0,0 +1,167 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import contextvars
+import functools
+import time
+import typing as t
+from dataclasses import dataclass, field
+from types import TracebackType
+
+# Spans are created only after enable_tracing() is called. Any tracer with OpenTelemetry start_as_current_span()
+# API can be used, OpenTelemetry itself is optional. Parent span is tracked in context variables, so spans
+# started in tasks created while handling a message (device handlers, callbacks) are children of that message.
+
+
+class ToshibaAcSpan(t.Protocol):
+    def set_attribute(self, key: str, value: t.Any) -> t.Any: ...
+
+
+class ToshibaAcTracer(t.Protocol):
+    def start_as_current_span(
+        self, name: str, attributes: t.Optional[t.Dict[str, t.Any]] = None
+    ) -> t.ContextManager[t.Any]: ...
+
+
+class _NoopSpan:
+    # Returned when tracing is disabled, single instance is reused as both context manager and span
+    def __enter__(self) -> _NoopSpan:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: t.Optional[t.Type[BaseException]],
+        exc: t.Optional[BaseException],
+        tb: t.Optional[TracebackType],
+    ) -> None:
+        pass
+
+    def set_attribute(self, key: str, value: t.Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_tracer: t.Optional[ToshibaAcTracer] = None
+
+
+def enable_tracing(tracer: t.Optional[ToshibaAcTracer] = None) -> ToshibaAcTracer:
+    # Without explicit tracer OpenTelemetry global tracer provider is used
+    global _tracer
+
+    if tracer is None:
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError("Tracing without explicit tracer requires opentelemetry-api package") from e
+
+        tracer = t.cast(ToshibaAcTracer, trace.get_tracer("toshiba_ac"))
+
+    _tracer = tracer
+
+    return tracer
+
+
+def disable_tracing() -> None:
+    global _tracer
+    _tracer = None
+
+
+def span(name: str, **attributes: t.Any) -> t.ContextManager[ToshibaAcSpan]:
+    if _tracer is None:
+        return _NOOP_SPAN
+
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+P = t.ParamSpec("P")
+R = t.TypeVar("R")
+
+
+def traced(name: str) -> t.Callable[[t.Callable[P, t.Awaitable[R]]], t.Callable[P, t.Awaitable[R]]]:
+    # Wraps whole coroutine function call in a span, put it above retry decorators to cover all attempts
+    def decorator(func: t.Callable[P, t.Awaitable[R]]) -> t.Callable[P, t.Awaitable[R]]:
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if _tracer is None:
+                return await func(*args, **kwargs)
+
+            with _tracer.start_as_current_span(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@dataclass
+class ToshibaAcRecordedSpan:
+    name: str
+    attributes: t.Dict[str, t.Any]
+    start: float
+    end: t.Optional[float] = None
+    children: t.List[ToshibaAcRecordedSpan] = field(default_factory=list)
+
+    @property
+    def duration_s(self) -> t.Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    def set_attribute(self, key: str, value: t.Any) -> None:
+        self.attributes[key] = value
+
+    def format(self, indent: int = 0) -> str:
+        duration = "running" if self.duration_s is None else f"{self.duration_s * 1000:.3f} ms"
+        attributes = " ".join(f"{key}={value}" for key, value in self.attributes.items())
+        lines = [f"{'  ' * indent}{self.name} [{duration}] {attributes}".rstrip()]
+        lines.extend(child.format(indent + 1) for child in self.children)
+        return "\n".join(lines)
+
+
+class ToshibaAcSpanRecorder:
+    # Minimal in-process tracer keeping trees of last max_traces root spans, for use without OpenTelemetry:
+    #   recorder = ToshibaAcSpanRecorder()
+    #   enable_tracing(recorder)
+    #   ...
+    #   print(recorder.traces[-1].format())
+    def __init__(self, max_traces: int = 1000) -> None:
+        self.traces: t.Deque[ToshibaAcRecordedSpan] = collections.deque(maxlen=max_traces)
+        self._current: contextvars.ContextVar[t.Optional[ToshibaAcRecordedSpan]] = contextvars.ContextVar(
+            f"toshiba_ac_span_{id(self)}", default=None
+        )
+
+    @contextlib.contextmanager
+    def start_as_current_span(
+        self, name: str, attributes: t.Optional[t.Dict[str, t.Any]] = None
+    ) -> t.Iterator[ToshibaAcRecordedSpan]:
+        parent = self._current.get()
+        span = ToshibaAcRecordedSpan(name, dict(attributes or {}), time.perf_counter())
+
+        if parent:
+            parent.children.append(span)
+        else:
+            self.traces.append(span)
+
+        token = self._current.set(span)
+
+        try:
+            yield span
+        except BaseException as e:
+            span.set_attribute("exception", type(e).__name__)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            self._current.reset(token)
@@ -0,0 +1,184 @@
+# Copyright 2021 Kamil Sroka
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import typing as t
+import urllib.parse
+from dataclasses import dataclass, field
+
+from toshiba_ac.device.features import ToshibaAcFeatures
+from toshiba_ac.utils.http_api import ToshibaAcDeviceInfo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ToshibaAcCachedDevice:
+    info: ToshibaAcDeviceInfo
+    features: ToshibaAcFeatures
+
+
+@dataclass
+class ToshibaAcCachedAccount:
+    access_token: str
+    access_token_type: str
+    consumer_id: str
+    device_id: str
+    sas_token: t.Optional[str] = None
+    devices: t.List[ToshibaAcCachedDevice] = field(default_factory=list)
+
+
+class ToshibaAcWarmStartCache:
+    # On-disk cache of everything needed to bring devices up without waiting for the cloud: access token,
+    # consumer id, SAS token, device list and decoded features. Single file may be shared by many accounts.
+    # File is replaced atomically on save and ignored as a whole when its format version does not match.
+    # Saving content which is already on disk does not touch the file.
+    VERSION = 1
+    # SAS tokens expiring sooner than that are not used, registering new client is cheaper than failing connect
+    SAS_TOKEN_EXPIRY_MARGIN_S = 600
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        self.path = os.fspath(path)
+        self.accounts: t.Dict[str, ToshibaAcCachedAccount] = {}
+        self.loaded = False
+        self._lock = asyncio.Lock()
+        # Digest of the content last read from or written to the file
+        self._file_digest: t.Optional[bytes] = None
+
+    async def load(self) -> None:
+        async with self._lock:
+            if not self.loaded:
+                self.accounts = await asyncio.get_running_loop().run_in_executor(None, self._read)
+                self.loaded = True
+
+    async def save(self) -> None:
+        async with self._lock:
+            data = {
+                "version": self.VERSION,
+                "accounts": {username: self._account_to_dict(account) for username, account in self.accounts.items()},
+            }
+
+            await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+
+    def get(self, username: str) -> t.Optional[ToshibaAcCachedAccount]:
+        return self.accounts.get(username)
+
+    def set(self, username: str, account: ToshibaAcCachedAccount) -> None:
+        self.accounts[username] = account
+
+    def remove(self, username: str) -> None:
+        self.accounts.pop(username, None)
+
+    @classmethod
+    def is_sas_token_usable(cls, sas_token: str) -> bool:
+        # SAS token is a query string with expiry time in "se" field, in seconds since epoch
+        try:
+            query = sas_token.split(" ", 1)[-1]
+            expiry = int(urllib.parse.parse_qs(query)["se"][0])
+        except (KeyError, ValueError):
+            return False
+
+        return expiry - cls.SAS_TOKEN_EXPIRY_MARGIN_S > time.time()
+
+    def _read(self) -> t.Dict[str, ToshibaAcCachedAccount]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                content = f.read()
+
+            data = json.loads(content)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable warm start cache {self.path}: {e}")
+            return {}
+
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            logger.info(f"Ignoring warm start cache {self.path} with unsupported format version")
+            return {}
+
+        self._file_digest = hashlib.sha256(content.encode()).digest()
+        accounts = {}
+
+        for username, account in data.get("accounts", {}).items():
+            try:
+                accounts[username] = self._account_from_dict(account)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Ignoring malformed warm start cache entry for {username}: {e}")
+
+        return accounts
+
+    def _write(self, data: t.Dict[str, t.Any]) -> None:
+        content = json.dumps(data)
+        digest = hashlib.sha256(content.encode()).digest()
+
+        if digest == self._file_digest:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        # Temporary file is created readable only by the owner, cache holds access tokens
+        fd, tmp_path = tempfile.mkstemp(prefix=".toshiba_ac_cache_", dir=directory)
+
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(tmp_path, self.path)
+            self._file_digest = digest
+        except:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def _account_to_dict(account: ToshibaAcCachedAccount) -> t.Dict[str, t.Any]:
+        return {
+            "access_token": account.access_token,
+            "access_token_type": account.access_token_type,
+            "consumer_id": account.consumer_id,
+            "device_id": account.device_id,
+            "sas_token": account.sas_token,
+            "devices": [
+                {"info": dataclasses.asdict(device.info), "features": device.features.as_dict()}
+                for device in account.devices
+            ],
+        }
+
+    @staticmethod
+    def _account_from_dict(data: t.Dict[str, t.Any]) -> ToshibaAcCachedAccount:
+        return ToshibaAcCachedAccount(
+            access_token=data["access_token"],
+            access_token_type=data["access_token_type"],
+            consumer_id=data["consumer_id"],
+            device_id=data["device_id"],
+            sas_token=data["sas_token"],
+            devices=[
+                ToshibaAcCachedDevice(
+                    ToshibaAcDeviceInfo(**device["info"]), ToshibaAcFeatures.from_dict(device["features"])
+                )
+                for device in data["devices"]
+            ],
+        )